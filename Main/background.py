@@ -0,0 +1,119 @@
+# background.py
+"""
+Background task execution for the GUI.
+
+Tk is single-threaded, so anything that touches disk, the database or
+matplotlib/fpdf rendering is run on a worker pool instead of the event loop.
+Workers never touch widgets: results and progress updates are put on a queue
+that the Tk thread drains with root.after.
+"""
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+class BackgroundTasks:
+    """Run slow jobs on worker threads and hand their results back to the Tk thread."""
+
+    POLL_MS = 50  # How often the Tk thread checks for finished jobs
+
+    def __init__(self, root, max_workers: int = 2, on_status=None):
+        """
+        Args:
+            root: The Tk root window (used for root.after).
+            max_workers (int): Worker threads.
+            on_status (callable): Called on the Tk thread as on_status(message, fraction, active_jobs)
+                whenever progress changes. fraction is None when progress is unknown.
+        """
+        self.root = root
+        self.on_status = on_status
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self._events = queue.SimpleQueue()
+        self._active = 0
+        self._busy_widgets = {}  # Widget -> number of running jobs that disabled it
+        self._polling = False
+
+    @property
+    def active(self) -> int:
+        """Number of jobs submitted but not yet finished."""
+        return self._active
+
+    def submit(self, func, *args, on_success=None, on_error=None, widgets=(), description="Working...",
+               report_progress: bool = False):
+        """
+        Run func(*args) on a worker thread. Must be called from the Tk thread.
+
+        Args:
+            func (callable): The job. It must not touch any widgets.
+            on_success (callable): Called on the Tk thread with the job's return value.
+            on_error (callable): Called on the Tk thread with the exception if the job raised.
+            widgets: Widgets (e.g. buttons) to disable while the job runs.
+            description (str): Status text shown while the job runs.
+            report_progress (bool): If True, func is also passed progress=callable, which it may
+                call as progress(message, fraction) from the worker thread.
+        """
+        for widget in widgets:
+            if self._busy_widgets.get(widget, 0) == 0:
+                widget.configure(state="disabled")
+            self._busy_widgets[widget] = self._busy_widgets.get(widget, 0) + 1
+        self._active += 1
+        self._status(description, None)
+
+        def progress(message, fraction=None):
+            self._events.put(("progress", message, fraction))
+
+        def run():
+            try:
+                result = func(*args, progress=progress) if report_progress else func(*args)
+            except Exception as error:
+                self._events.put(("done", (on_success, on_error, widgets), None, error))
+            else:
+                self._events.put(("done", (on_success, on_error, widgets), result, None))
+
+        self._executor.submit(run)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def shutdown(self):
+        """Wait for running jobs to finish (so no report is left half-written) and stop the workers."""
+        self._executor.shutdown(wait=True)
+
+    def _poll(self):
+        """Tk thread: deliver progress updates and finished jobs."""
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                self._status(event[1], event[2])
+                continue
+
+            (on_success, on_error, widgets), result, error = event[1:]
+            self._active -= 1
+            for widget in widgets:
+                self._busy_widgets[widget] -= 1
+                if self._busy_widgets[widget] == 0:
+                    del self._busy_widgets[widget]
+                    widget.configure(state="normal")
+            try:
+                if error is not None:
+                    if on_error:
+                        on_error(error)
+                    else:
+                        logging.error(f"Background task error: {error}")
+                elif on_success:
+                    on_success(result)
+            except Exception as callback_error:
+                logging.error(f"Background task callback error: {callback_error}")
+            if self._active == 0:
+                self._status("", 1.0)
+
+        if self._active:
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _status(self, message, fraction):
+        if self.on_status:
+            self.on_status(message, fraction, self._active)
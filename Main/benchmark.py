@@ -0,0 +1,255 @@
+# benchmark.py
+"""
+Benchmark suite for every stage of the footprint pipeline.
+
+Each benchmark runs on a fixed synthetic dataset (seeded, so every run does
+the same work) against a throw-away database, headless. Results are saved as
+JSON and can be compared with a saved baseline; any benchmark that got slower
+than the baseline by more than the threshold is reported as a regression and
+the run exits with status 1.
+
+Usage:
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline baseline.json --threshold 0.25
+    python benchmark.py --only calculate_scalar --only calculate_batch --repeat 10
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")  # Headless: never needs a display
+
+import database
+from calculations import calculate_footprint, calculate_footprint_batch
+
+SEED = 1234
+USERS = 50
+
+def synthetic_rows(count: int, seed: int = SEED) -> list:
+    """Return count reproducible input rows (electricity ... efficiency, recycling as a decimal)."""
+    rng = random.Random(seed)
+    return [(rng.uniform(20, 400), rng.uniform(10, 300), rng.uniform(0, 300), rng.uniform(0, 200),
+             rng.uniform(0, 1), rng.uniform(0, 20000), rng.uniform(3, 15)) for _ in range(count)]
+
+def bench_calculate_scalar(count: int = 20000):
+    """calculate_footprint called once per row."""
+    rows = synthetic_rows(count)
+    def run():
+        for row in rows:
+            calculate_footprint(*row)
+    return run, count
+
+def bench_calculate_batch(count: int = 200000):
+    """calculate_footprint_batch over whole columns."""
+    columns = list(zip(*synthetic_rows(count)))
+    import numpy as np
+    columns = [np.array(column) for column in columns]
+    def run():
+        calculate_footprint_batch(*columns)
+    return run, count
+
+def bench_recommend_batch(count: int = 200000):
+    """recommend_batch tagging whole columns with the recommendation rules."""
+    import numpy as np
+    from recommendations import recommend_batch
+    columns = [np.array(column) for column in zip(*synthetic_rows(count))]
+    def run():
+        recommend_batch(*columns)
+    return run, count
+
+def bench_save_to_db(count: int = 5000):
+    """Batched inserts, committed once per batch and shard (as the CLI and write queue do)."""
+    rows = [(f"user{index % USERS}", *row, 1000.0) for index, row in enumerate(synthetic_rows(count))]
+    def run():
+        database.save_footprints(rows)
+    return run, count
+
+def bench_save_to_db_single(count: int = 200):
+    """save_to_db inserts with one commit per row (as the GUI's Calculate button does)."""
+    rows = synthetic_rows(count)
+    def run():
+        for index, row in enumerate(rows):
+            database.save_to_db(f"user{index % USERS}", *row, 1000.0)
+    return run, count
+
+def bench_history_query(count: int = USERS):
+    """Full history of every user, read through keyset pagination and the range query."""
+    _load_history(20000)
+    def run():
+        for user in range(count):
+            after = None
+            while True:
+                rows, after = database.get_footprint_page(f"user{user}", after=after, limit=100)
+                if after is None:
+                    break
+            database.get_footprint_range(f"user{user}", 0, (1 << 63) - 1)
+    return run, count
+
+def bench_monthly_rollups(count: int = USERS):
+    """Monthly rollup and annual total lookups per user."""
+    _load_history(20000)
+    def run():
+        for user in range(count):
+            database.get_monthly_rollups(f"user{user}")
+            database.get_annual_totals(f"user{user}")
+    return run, count
+
+def bench_history_columns(count: int = USERS):
+    """Every user's history loaded into columns and aggregated per month."""
+    from history import load_history
+    _load_history(20000)
+    users = [f"user{user}" for user in range(count)]
+    def run():
+        history = load_history(users)
+        history.by_month("footprint", "sum")
+        history.by_user("footprint", "mean")
+    return run, count
+
+def bench_plot_charts(count: int = 10):
+    """charts.plot_charts render to PNG."""
+    import matplotlib.pyplot as plt
+    from charts import plot_charts
+    rows = [calculate_footprint(*row) for row in synthetic_rows(count)]
+    def run():
+        for result in rows:
+            fig, ax = plot_charts(result["energy_emissions"], result["waste_emissions"], result["travel_emissions"])
+            fig.savefig(io.BytesIO(), format="png")
+            plt.close(fig)
+    return run, count
+
+def bench_generate_pdf(count: int = 10):
+    """generate_pdf latency, chart rendering included."""
+    from charts import render_breakdown_png
+    from pdf_generator import generate_pdf
+    from recommendations import provide_recommendations
+    rows = synthetic_rows(count)
+    directory = os.path.dirname(database.DATABASE_PATH)  # The benchmark's temporary directory
+    def run():
+        for index, row in enumerate(rows):
+            result = calculate_footprint(*row)
+            image = render_breakdown_png(result["energy_emissions"], result["waste_emissions"],
+                                         result["travel_emissions"])
+            generate_pdf(f"user{index}", *row, result["total_emissions"], result["energy_emissions"],
+                         result["waste_emissions"], result["travel_emissions"],
+                         provide_recommendations(*row, result),
+                         os.path.join(directory, f"report{index}.pdf"), image)
+    return run, count
+
+BENCHMARKS = {
+    "calculate_scalar": bench_calculate_scalar,
+    "calculate_batch": bench_calculate_batch,
+    "recommend_batch": bench_recommend_batch,
+    "save_to_db": bench_save_to_db,
+    "save_to_db_single": bench_save_to_db_single,
+    "history_query": bench_history_query,
+    "monthly_rollups": bench_monthly_rollups,
+    "history_columns": bench_history_columns,
+    "plot_charts": bench_plot_charts,
+    "generate_pdf": bench_generate_pdf,
+}
+
+def _load_history(count: int):
+    """Fill the benchmark database with count footprint rows spread over USERS users."""
+    database.save_footprints((f"user{index % USERS}", *row, 1000.0)
+                             for index, row in enumerate(synthetic_rows(count, seed=SEED + 1)))
+
+def run_benchmarks(names: list = None, repeat: int = 5, progress=None) -> dict:
+    """
+    Run benchmarks, each against its own fresh temporary database.
+
+    Each benchmark is set up once and timed repeat times.
+
+    Returns:
+        dict: meta (environment details) and benchmarks, mapping each name to its
+        median, min and max seconds per run, operations per run and operations per second.
+    """
+    names = names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "repeat": repeat},
+        "benchmarks": {},
+    }
+    saved_path = database.DATABASE_PATH
+    for name in names:
+        with tempfile.TemporaryDirectory(prefix="benchmark-") as directory:
+            database.DATABASE_PATH = os.path.join(directory, "benchmark.db")
+            try:
+                database.setup_database()
+                run, operations = BENCHMARKS[name]()
+                times = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    run()
+                    times.append(time.perf_counter() - started)
+            finally:
+                database.close_all_connections()
+                database.DATABASE_PATH = saved_path
+
+        median = statistics.median(times)
+        results["benchmarks"][name] = {
+            "median": median, "min": min(times), "max": max(times), "operations": operations,
+            "ops_per_second": operations / median if median else 0.0,
+        }
+        if progress:
+            progress(name, results["benchmarks"][name])
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> list:
+    """
+    Compare median times with a baseline.
+
+    Returns:
+        list: (name, baseline seconds, current seconds, ratio, regressed) for every
+        benchmark present in both, where regressed means the ratio exceeds 1 + threshold.
+    """
+    rows = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous:
+            continue
+        ratio = current["median"] / previous["median"] if previous["median"] else float("inf")
+        rows.append((name, previous["median"], current["median"], ratio, ratio > 1 + threshold))
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the footprint pipeline.")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline, as a fraction (default: 0.2)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--only", action="append", choices=list(BENCHMARKS), help="Run only this benchmark (repeatable)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.repeat, progress=lambda name, r: print(
+        f"{name:<20}{r['median'] * 1000:10.2f} ms  {r['ops_per_second']:14.1f} ops/s"))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    regressions = 0
+    print(f"\nCompared with {args.baseline} (threshold {args.threshold:.0%}):")
+    for name, previous, current, ratio, regressed in compare(results, baseline, args.threshold):
+        regressions += regressed
+        print(f"{name:<20}{previous * 1000:10.2f} ms -> {current * 1000:10.2f} ms  {ratio:6.2f}x"
+              f"{'  REGRESSION' if regressed else ''}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
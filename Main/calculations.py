@@ -1,7 +1,7 @@
 # calculations.py
 
 # Import necessary modules
-from config import CO2_PER_KWH, CO2_PER_GAS, CO2_PER_LITER_FUEL
+from config import CO2_PER_KWH, CO2_PER_GAS, CO2_PER_LITER_FUEL, CO2_PER_KG_WASTE, CO2_PER_LITER_TRAVEL
 
 def calculate_footprint(electricity: float, gas: float, fuel: float, waste: float, recycling: float, travel: float, efficiency: float) -> dict:
     """
@@ -36,10 +36,10 @@ def calculate_footprint(electricity: float, gas: float, fuel: float, waste: floa
     energy_emissions = (electricity * 12 * CO2_PER_KWH) + (gas * 12 * CO2_PER_GAS) + (fuel * 12 * CO2_PER_LITER_FUEL)
 
     # Calculate waste-related emissions
-    waste_emissions = waste * 12 * (0.57 - (recycling / 100))
+    waste_emissions = waste * 12 * (CO2_PER_KG_WASTE - (recycling / 100))
 
     # Calculate travel-related emissions
-    travel_emissions = travel * (1 / efficiency) * 2.31
+    travel_emissions = travel * (1 / efficiency) * CO2_PER_LITER_TRAVEL
 
     # Calculate total emissions
     total_emissions = energy_emissions + waste_emissions + travel_emissions
@@ -51,6 +51,108 @@ def calculate_footprint(electricity: float, gas: float, fuel: float, waste: floa
         "travel_emissions": travel_emissions
     }
 
+class FootprintResult:
+    """
+    The results of one calculation, as a compact record.
+
+    Holds the same four values as the dictionary calculate_footprint returns,
+    as attributes in __slots__ (64 bytes plus the floats, against 184 for
+    the dictionary), for code that keeps many results in memory. Results
+    can still be read by key, like the dictionary.
+    """
+
+    __slots__ = ("total_emissions", "energy_emissions", "waste_emissions", "travel_emissions")
+
+    def __init__(self, total_emissions: float, energy_emissions: float, waste_emissions: float,
+                 travel_emissions: float):
+        self.total_emissions = total_emissions
+        self.energy_emissions = energy_emissions
+        self.waste_emissions = waste_emissions
+        self.travel_emissions = travel_emissions
+
+    @classmethod
+    def calculate(cls, electricity: float, gas: float, fuel: float, waste: float, recycling: float,
+                  travel: float, efficiency: float) -> "FootprintResult":
+        """Run calculate_footprint and return its results as a record."""
+        return cls(**calculate_footprint(electricity, gas, fuel, waste, recycling, travel, efficiency))
+
+    def __getitem__(self, key: str) -> float:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def as_dict(self) -> dict:
+        """Return the results as calculate_footprint's dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, FootprintResult):
+            return self.as_dict() == other.as_dict()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"FootprintResult({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+def calculate_footprint_batch(electricity, gas, fuel, waste, recycling, travel, efficiency) -> dict:
+    """
+    Calculate carbon footprints for many records at once.
+
+    Each argument is a column (NumPy array, array.array or any sequence of
+    numbers) with one entry per record. The arithmetic mirrors
+    calculate_footprint operation for operation, so every valid row gives
+    exactly the same floats as the scalar function.
+
+    Args:
+        electricity, gas, fuel, waste, recycling, travel, efficiency:
+            Equal-length columns with the same meaning as in calculate_footprint.
+
+    Returns:
+        dict: A dictionary containing:
+            - total_emissions (np.ndarray): Total carbon footprint per row in kgCO2.
+            - energy_emissions (np.ndarray): Energy emissions per row in kgCO2.
+            - waste_emissions (np.ndarray): Waste emissions per row in kgCO2.
+            - travel_emissions (np.ndarray): Travel emissions per row in kgCO2.
+            - invalid_rows (np.ndarray): Indices of rows that failed validation.
+              Their emissions are set to NaN.
+
+    Raises:
+        ValueError: If the columns are not one-dimensional or differ in length.
+    """
+    # NumPy is imported here so the scalar path (and GUI start-up) does not pay for it
+    import numpy as np
+
+    columns = [np.asarray(column, dtype=np.float64)
+               for column in (electricity, gas, fuel, waste, recycling, travel, efficiency)]
+    size = len(columns[0])
+    if any(column.ndim != 1 or len(column) != size for column in columns):
+        raise ValueError("All input columns must be one-dimensional and of equal length.")
+    electricity, gas, fuel, waste, recycling, travel, efficiency = columns
+
+    # Validate inputs (same rules as calculate_footprint, applied to every row)
+    invalid = (efficiency <= 0) | (recycling < 0) | (recycling > 100)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        energy_emissions = (electricity * 12 * CO2_PER_KWH) + (gas * 12 * CO2_PER_GAS) + (fuel * 12 * CO2_PER_LITER_FUEL)
+        waste_emissions = waste * 12 * (CO2_PER_KG_WASTE - (recycling / 100))
+        travel_emissions = travel * (1 / efficiency) * CO2_PER_LITER_TRAVEL
+        total_emissions = energy_emissions + waste_emissions + travel_emissions
+
+    for column in (energy_emissions, waste_emissions, travel_emissions, total_emissions):
+        column[invalid] = np.nan
+
+    return {
+        "total_emissions": total_emissions,
+        "energy_emissions": energy_emissions,
+        "waste_emissions": waste_emissions,
+        "travel_emissions": travel_emissions,
+        "invalid_rows": np.flatnonzero(invalid)
+    }
+
+def emission_factors() -> dict:
+    """Return the emission factors the model uses, keyed by their config.py names."""
+    return {"CO2_PER_KWH": CO2_PER_KWH, "CO2_PER_GAS": CO2_PER_GAS, "CO2_PER_LITER_FUEL": CO2_PER_LITER_FUEL,
+            "CO2_PER_KG_WASTE": CO2_PER_KG_WASTE, "CO2_PER_LITER_TRAVEL": CO2_PER_LITER_TRAVEL}
+
 def calculate_offset(footprint: float) -> float:
     """
     Calculate the carbon offset required.
@@ -1,4 +1,11 @@
+import io
+import math
+from functools import lru_cache
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.patches import Shadow
+import metrics
+from config import CHART_CACHE_SIZE
 
 def plot_charts(energy: float, waste: float, travel: float):
     """
@@ -13,14 +20,18 @@ def plot_charts(energy: float, waste: float, travel: float):
         fig (matplotlib.figure.Figure): The figure object.
         ax (matplotlib.axes.Axes): The axes object.
     """
+    # Create the pie chart
+    fig, ax = plt.subplots(figsize=(8, 6))
+    _draw_breakdown(ax, [energy, waste, travel])
+    return fig, ax
+
+def _draw_breakdown(ax, sizes: list):
+    """Draw the breakdown pie chart, legend and title on ax."""
     # Labels and sizes for the pie chart
     labels = ['Energy', 'Waste', 'Travel']
-    sizes = [energy, waste, travel]
     colors = ['#ff9999', '#66b3ff', '#99ff99']  # Custom colors for each category
     explode = (0.1, 0, 0)  # "Explode" the first slice (Energy) for emphasis
 
-    # Create the pie chart
-    fig, ax = plt.subplots(figsize=(8, 6))
     wedges, texts, autotexts = ax.pie(
         sizes,
         explode=explode,
@@ -38,4 +49,84 @@ def plot_charts(energy: float, waste: float, travel: float):
     # Add a title
     ax.set_title('Carbon Footprint Breakdown', fontsize=16, color='black')
 
-    return fig, ax
\ No newline at end of file
+def update_breakdown_pie(wedges, texts, autotexts, sizes: list, startangle: float = 140, explode=None,
+                         labeldistance: float = 1.1, pctdistance: float = 0.6, autopct: str = '%1.1f%%'):
+    """
+    Update an existing pie chart (as returned by Axes.pie) to new sizes in place.
+
+    Wedge angles, label and percentage positions are recomputed exactly as
+    Axes.pie lays them out (radius 1, centred on the origin, counter-clockwise),
+    so the axes do not have to be cleared and rebuilt. Shadows follow their
+    wedges' shapes automatically. If every size is zero the pie is hidden,
+    shadows included.
+
+    Returns:
+        bool: True if the pie is visible.
+    """
+    total = sum(sizes)
+    visible = total > 0
+    shadows = [patch for patch in (wedges[0].axes.patches if wedges and wedges[0].axes else [])
+               if isinstance(patch, Shadow) and any(patch.patch is wedge for wedge in wedges)]
+    for artist in (*wedges, *shadows, *texts, *autotexts):
+        artist.set_visible(visible)
+    if not visible:
+        return False
+
+    explode = explode or [0] * len(sizes)
+    theta1 = startangle / 360
+    for index, (size, wedge) in enumerate(zip(sizes, wedges)):
+        theta2 = theta1 + size / total
+        thetam = math.pi * (theta1 + theta2)
+        x, y = explode[index] * math.cos(thetam), explode[index] * math.sin(thetam)
+        wedge.set_center((x, y))
+        wedge.set_theta1(360 * theta1)
+        wedge.set_theta2(360 * theta2)
+        if index < len(texts):
+            xt = x + labeldistance * math.cos(thetam)
+            texts[index].set_position((xt, y + labeldistance * math.sin(thetam)))
+            texts[index].set_horizontalalignment('left' if xt > 0 else 'right')
+        if index < len(autotexts):
+            autotexts[index].set_position((x + pctdistance * math.cos(thetam), y + pctdistance * math.sin(thetam)))
+            autotexts[index].set_text(autopct % (100 * size / total))
+        theta1 = theta2
+    return True
+
+def breakdown_shares(energy: float, waste: float, travel: float) -> tuple:
+    """
+    Return the (energy, waste, travel) percentage shares rounded to 0.1%.
+
+    Negative components are drawn as empty slices, as in the GUI.
+
+    Raises:
+        ValueError: If there is nothing to plot (all components are zero or negative).
+    """
+    sizes = [max(size, 0) for size in (energy, waste, travel)]
+    total = sum(sizes)
+    if total <= 0:
+        raise ValueError("There are no positive emissions to plot.")
+    return tuple(round(size * 100 / total, 1) for size in sizes)
+
+def render_breakdown_png(energy: float, waste: float, travel: float) -> bytes:
+    """
+    Render the breakdown pie chart to PNG bytes in memory.
+
+    A pie chart only depends on the shares of its slices, and the labels show
+    them to 0.1%, so images are cached on the rounded shares: repeated or
+    identical breakdowns are returned from the cache without touching
+    matplotlib.
+
+    Returns:
+        bytes: The PNG image. Wrap it in io.BytesIO to pass it to generate_pdf.
+    """
+    return _render_shares_png(breakdown_shares(energy, waste, travel))
+
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+def _render_shares_png(shares: tuple) -> bytes:
+    """Render (and cache) the pie chart for one set of rounded shares."""
+    # A bare Figure needs no pyplot state or GUI backend, so this is safe headless
+    fig = Figure(figsize=(8, 6))
+    _draw_breakdown(fig.add_subplot(111), list(shares))
+    buffer = io.BytesIO()
+    with metrics.timed("savefig"):
+        fig.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
+    return buffer.getvalue()
@@ -0,0 +1,196 @@
+# cli.py
+"""
+Headless command-line mode for bulk footprint calculation.
+
+Reads rows from a CSV or JSONL file (or stdin), runs them through the
+calculation model in fixed-size chunks and writes each chunk out before the
+next one is read, so memory use does not grow with the input size. This
+module must never import the GUI, charting or PDF stacks.
+
+Each input row uses the same fields as the saved-inputs JSON files:
+electricity, gas, fuel, waste, recycling (percentage, 0-100), travel and
+efficiency, plus a user_id (optional unless --save is given without --user).
+
+Usage:
+    python cli.py inputs.csv -o results.csv
+    cat inputs.jsonl | python cli.py --format jsonl --save --user admin
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from itertools import islice
+
+from calculations import calculate_footprint_batch, calculate_offset
+from database import save_footprints, setup_database
+
+INPUT_FIELDS = ["electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency"]
+RESULT_FIELDS = ["total_emissions", "energy_emissions", "waste_emissions", "travel_emissions", "trees_needed"]
+OUTPUT_FIELDS = ["user_id"] + INPUT_FIELDS + RESULT_FIELDS
+
+def read_rows(stream, input_format: str):
+    """
+    Yield input rows from a CSV or JSONL stream as dictionaries.
+
+    A JSONL line that is not a JSON object is yielded as an error message
+    instead, so process_chunk rejects it and the rest of the stream goes on.
+    """
+    if input_format == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    row = f"Invalid JSON: {error}"
+                yield row if isinstance(row, (dict, str)) else "Expected a JSON object."
+
+def parse_row(row: dict, default_user: str):
+    """
+    Convert a raw input row into the values passed to the calculation model.
+
+    Recycling is converted from a percentage to a decimal, exactly as the GUI
+    does before calling calculate_footprint.
+
+    Raises:
+        ValueError: If a field is missing, not a number or out of range.
+    """
+    try:
+        values = [float(row[field]) for field in INPUT_FIELDS]
+    except KeyError as error:
+        raise ValueError(f"Missing field {error}.")
+    if values[4] < 0 or values[4] > 100:
+        raise ValueError("Recycling percentage must be between 0 and 100.")
+    values[4] = values[4] / 100
+    return (row.get("user_id") or default_user, values)
+
+def process_chunk(rows: list, default_user: str, first_line: int, errors, require_user: bool = False):
+    """
+    Calculate footprints for one chunk of raw rows.
+
+    Rows that are strings (error messages from read_rows) are rejected, and so
+    are rows without a user ID when require_user is set.
+
+    Returns:
+        list: Output records (dictionaries) for every valid row, in input order.
+    """
+    users, parsed = [], []
+    for offset, row in enumerate(rows):
+        try:
+            if isinstance(row, str):
+                raise ValueError(row)
+            user_id, values = parse_row(row, default_user)
+            if require_user and not user_id:
+                raise ValueError("A user_id (or --user) is required to save.")
+        except (ValueError, TypeError) as error:
+            errors.write(f"row {first_line + offset}: {error}\n")
+            continue
+        users.append((first_line + offset, user_id))
+        parsed.append(values)
+    if not parsed:
+        return []
+
+    results = calculate_footprint_batch(*zip(*parsed))
+    trees_needed = calculate_offset(results["total_emissions"])
+    invalid = set(results["invalid_rows"].tolist())
+
+    records = []
+    for index, ((line, user_id), values) in enumerate(zip(users, parsed)):
+        if index in invalid:
+            errors.write(f"row {line}: Fuel efficiency must be greater than 0.\n")
+            continue
+        record = {"user_id": user_id}
+        record.update(zip(INPUT_FIELDS, values))
+        for field in RESULT_FIELDS[:-1]:
+            record[field] = float(results[field][index])
+        record["trees_needed"] = float(trees_needed[index])
+        records.append(record)
+    return records
+
+def save_records(records: list):
+    """Persist one chunk of records, in a single transaction per database shard."""
+    save_footprints((record["user_id"], *(record[field] for field in INPUT_FIELDS), record["total_emissions"])
+                    for record in records)
+
+def run(source, sink, input_format: str, output_format: str, chunk_size: int = 1000,
+        default_user: str = None, save: bool = False, errors=sys.stderr) -> tuple:
+    """
+    Stream rows from source to sink in chunks of chunk_size rows.
+
+    Returns:
+        tuple: (rows written, rows rejected)
+    """
+    rows = read_rows(source, input_format)
+    writer = None
+    if output_format == "csv":
+        writer = csv.DictWriter(sink, fieldnames=OUTPUT_FIELDS)
+        writer.writeheader()
+
+    written = rejected = 0
+    # Data starts on line 2 of a CSV file because of the header row
+    line = 2 if input_format == "csv" else 1
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        records = process_chunk(chunk, default_user, line, errors, require_user=save)
+        line += len(chunk)
+        rejected += len(chunk) - len(records)
+
+        if save:
+            save_records(records)
+        if writer is not None:
+            writer.writerows(records)
+        else:
+            sink.writelines(json.dumps(record) + "\n" for record in records)
+        sink.flush()
+        written += len(records)
+    return written, rejected
+
+def _detect_format(path: str, default: str = "csv") -> str:
+    """Guess the file format from its extension."""
+    if path and path.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    if path and path.lower().endswith(".csv"):
+        return "csv"
+    return default
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Calculate carbon footprints in bulk without the GUI.")
+    parser.add_argument("input", nargs="?", default="-", help="CSV or JSONL input file (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from file extension, else csv)")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"], help="Output format (default: same as input)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows processed and committed per chunk")
+    parser.add_argument("--user", help="User ID for rows without a user_id field")
+    parser.add_argument("--save", action="store_true", help="Also save every result to the database")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    input_format = args.format or _detect_format(args.input if args.input != "-" else None)
+    output_format = args.output_format or _detect_format(args.output if args.output != "-" else None, input_format)
+
+    if args.save:
+        setup_database()
+
+    source = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        written, rejected = run(source, sink, input_format, output_format, args.chunk_size, args.user, args.save)
+    except sqlite3.Error as error:
+        sys.stderr.write(f"Database error: {error}\n")
+        return 2
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    sys.stderr.write(f"{written} rows written, {rejected} rows rejected\n")
+    return 1 if rejected else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,4 +2,80 @@
 DATABASE_PATH = 'carbon_footprint.db'
 CO2_PER_KWH = 0.0005  # kgCO2 per kWh
 CO2_PER_GAS = 0.0053  # kgCO2 per m³ of natural gas
-CO2_PER_LITER_FUEL = 2.32  # kgCO2 per liter of fuel
\ No newline at end of file
+CO2_PER_LITER_FUEL = 2.32  # kgCO2 per liter of fuel
+CO2_PER_KG_WASTE = 0.57  # kgCO2 per kg of waste (before recycling)
+CO2_PER_LITER_TRAVEL = 2.31  # kgCO2 per liter burned on business travel
+
+# SQLite connection tuning (applied to every pooled connection)
+SQLITE_JOURNAL_MODE = 'WAL'
+SQLITE_SYNCHRONOUS = 'NORMAL'  # FULL fsyncs every commit; NORMAL is crash-safe in WAL mode
+SQLITE_CACHE_SIZE = -20000  # Negative values are in KiB (about 20 MB)
+SQLITE_MMAP_SIZE = 268435456  # 256 MB of memory-mapped I/O
+SQLITE_BUSY_TIMEOUT = 5.0  # Seconds to wait for a lock held by another connection
+
+# Write-behind queue for footprint inserts
+WRITE_QUEUE_BATCH_SIZE = 500  # Commit once this many rows are pending
+WRITE_QUEUE_FLUSH_MS = 200  # ...or once the oldest pending row is this old
+WRITE_QUEUE_MAX_PENDING = 10000  # Producers block when this many rows are queued
+
+# Rendered breakdown charts kept in memory (keyed on rounded shares)
+CHART_CACHE_SIZE = 256
+
+# Live update: recalculate this long after the last input change
+LIVE_UPDATE_DEBOUNCE_MS = 300
+
+# Monte Carlo uncertainty analysis (see uncertainty.py for the distribution specs)
+UNCERTAINTY_SAMPLES = 100000
+UNCERTAINTY_PERCENTILES = (5, 50, 95)
+UNCERTAINTY_FACTORS = {
+    "co2_per_kwh": ("normal", CO2_PER_KWH, CO2_PER_KWH * 0.10),
+    "co2_per_gas": ("normal", CO2_PER_GAS, CO2_PER_GAS * 0.10),
+    "co2_per_liter_fuel": ("normal", CO2_PER_LITER_FUEL, CO2_PER_LITER_FUEL * 0.05),
+    "co2_per_kg_waste": ("triangular", 0.45, CO2_PER_KG_WASTE, 0.70),
+    "co2_per_liter_travel": ("normal", CO2_PER_LITER_TRAVEL, CO2_PER_LITER_TRAVEL * 0.05),
+}
+
+# Scenario optimizer: lever -> (largest change, effort per unit of change)
+SCENARIO_LEVERS = {
+    "efficiency": (40, 1.0),  # % better fuel efficiency
+    "recycling": (50, 0.5),  # Percentage points more recycling
+    "travel": (50, 0.8),  # % less business travel
+}
+SCENARIO_STEPS = 21  # Grid points per lever
+SCENARIO_TARGET_REDUCTION = 0.2  # Recommendations aim for this fraction below the current footprint
+
+# Metrics (see metrics.py); collection can also be switched on with CARBON_METRICS=1 or Ctrl+M in the app
+METRICS_EXPORT_PATH = 'metrics.prom'  # A .json path writes JSON instead of Prometheus text
+METRICS_EXPORT_INTERVAL_MS = 10000  # How often the app rewrites the file while metrics are on
+METRICS_PROFILE_DIR = 'profiles'  # Where --profile dumps the slowest requests
+METRICS_PROFILE_KEEP = 5  # Slowest requests kept by the sampling profiler
+METRICS_PROFILE_INTERVAL = 0.005  # Seconds between profiler samples
+
+# Local HTTP service (server.py)
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8080
+SERVER_MAX_CONNECTIONS = 256  # Connections served at once; more wait to be accepted
+SERVER_WORKERS = 4  # Threads for database queries, batch chunks and PDF rendering
+SERVER_MAX_PDF_JOBS = 2  # PDFs rendered at once; more requests wait for a slot
+SERVER_MAX_BODY = 1048576  # Largest single-object request body in bytes (batch bodies are streamed)
+SERVER_BATCH_CHUNK_SIZE = 1000  # Batch rows calculated per worker task
+
+# Columnar export (export.py)
+EXPORT_CHUNK_SIZE = 100000  # Rows read and written per chunk
+
+# Footprint sharding. New databases spread footprints over SHARD_COUNT files
+# (0 keeps everything in DATABASE_PATH); existing ones keep the layout they
+# were created with until rebalanced (python manage.py rebalance-shards).
+SHARD_COUNT = 0
+SHARD_PATH_TEMPLATE = '{stem}.shard{index:02d}{suffix}'  # Built from DATABASE_PATH's stem and suffix
+SHARD_QUERY_WORKERS = 8  # Threads for queries that fan out over every shard
+
+# Percentile ranking sketches (sketch.py)
+SKETCH_RELATIVE_ACCURACY = 0.01  # Quantiles are within this relative error of the exact value
+SKETCH_MIN_VALUE = 1.0  # kgCO2; totals closer to zero than this share one bucket
+
+# History panel in the main window (history_view.py)
+HISTORY_PAGE_SIZE = 100  # Rows read per keyset query
+HISTORY_PREFETCH_PAGES = 1  # Pages loaded ahead of and behind the visible rows
+HISTORY_CACHE_PAGES = 20  # Pages kept in memory; older ones are read again when scrolled back to
+HISTORY_ROW_HEIGHT = 22  # Pixels per history row
@@ -1,39 +1,951 @@
 import sqlite3
 import logging
+import threading
 import traceback
-from datetime import datetime
-from config import DATABASE_PATH
+import atexit
+import heapq
+import json
+import os
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import metrics
+import sketch
+from calculations import calculate_footprint_batch, emission_factors
+from config import (DATABASE_PATH, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE,
+                    SQLITE_MMAP_SIZE, SQLITE_BUSY_TIMEOUT, WRITE_QUEUE_BATCH_SIZE,
+                    WRITE_QUEUE_FLUSH_MS, WRITE_QUEUE_MAX_PENDING, SHARD_COUNT, SHARD_PATH_TEMPLATE,
+                    SHARD_QUERY_WORKERS)
+
+# SQL used on hot paths. Keeping the text identical on every call lets each
+# connection's statement cache reuse the compiled statement.
+INSERT_FOOTPRINT_SQL = '''INSERT INTO footprints
+                          (user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, footprint, date, ts,
+                           factor_version)
+                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+FOOTPRINT_COLUMNS = ["id", "user_id", "electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency",
+                     "footprint", "date", "ts", "factor_version"]
+_TS = FOOTPRINT_COLUMNS.index("ts")
+SELECT_USER_SQL = "SELECT * FROM users WHERE id = ? AND password = ?"
+INSERT_USER_SQL = "INSERT INTO users (id, password) VALUES (?, ?)"
+
+# Per-user, per-month rollups of the footprints table. Every column listed
+# here gets a _sum, _min and _max column in footprint_monthly, kept up to date
+# by a trigger on every insert, so history views read one row per month.
+ROLLUP_COLUMNS = ["footprint", "electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency"]
+_ROLLUP_STATS = [(column, stat) for column in ROLLUP_COLUMNS for stat in ("sum", "min", "max")]
+_ROLLUP_AGGREGATES = {"sum": "SUM", "min": "MIN", "max": "MAX"}
+_ROLLUP_MERGE = {"sum": "{name} + excluded.{name}", "min": "min({name}, excluded.{name})",
+                 "max": "max({name}, excluded.{name})"}
+
+CREATE_ROLLUP_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS footprint_monthly "
+    "(user_id TEXT NOT NULL, month TEXT NOT NULL, row_count INTEGER NOT NULL, "
+    + ", ".join(f"{column}_{stat} REAL" for column, stat in _ROLLUP_STATS)
+    + ", PRIMARY KEY (user_id, month)) WITHOUT ROWID")
+CREATE_ROLLUP_TRIGGER_SQL = (
+    "CREATE TRIGGER IF NOT EXISTS footprints_monthly_rollup AFTER INSERT ON footprints BEGIN "
+    "INSERT INTO footprint_monthly (user_id, month, row_count, "
+    + ", ".join(f"{column}_{stat}" for column, stat in _ROLLUP_STATS)
+    + ") VALUES (NEW.user_id, substr(NEW.date, 1, 7), 1, "
+    + ", ".join(f"NEW.{column}" for column, _ in _ROLLUP_STATS)
+    + ") ON CONFLICT (user_id, month) DO UPDATE SET row_count = row_count + 1, "
+    + ", ".join(f"{column}_{stat} = " + _ROLLUP_MERGE[stat].format(name=f"{column}_{stat}")
+                for column, stat in _ROLLUP_STATS)
+    + "; END")
+BACKFILL_ROLLUP_SQL = (
+    "INSERT INTO footprint_monthly (user_id, month, row_count, "
+    + ", ".join(f"{column}_{stat}" for column, stat in _ROLLUP_STATS)
+    + ") SELECT user_id, substr(date, 1, 7), COUNT(*), "
+    + ", ".join(f"{_ROLLUP_AGGREGATES[stat]}({column})" for column, stat in _ROLLUP_STATS)
+    + " FROM footprints GROUP BY user_id, substr(date, 1, 7)")
+# Recompute one (user, month) rollup row from scratch, after footprints were updated in place
+REFRESH_ROLLUP_SQL = (
+    "INSERT OR REPLACE INTO footprint_monthly (user_id, month, row_count, "
+    + ", ".join(f"{column}_{stat}" for column, stat in _ROLLUP_STATS)
+    + ") SELECT user_id, substr(date, 1, 7), COUNT(*), "
+    + ", ".join(f"{_ROLLUP_AGGREGATES[stat]}({column})" for column, stat in _ROLLUP_STATS)
+    + " FROM footprints WHERE user_id = ? AND substr(date, 1, 7) = ? GROUP BY user_id, substr(date, 1, 7)")
+
+# Every distinct set of emission factors gets a version number in
+# DATABASE_PATH; each footprints row records the version its total was
+# calculated with (NULL for rows saved before versioning).
+CREATE_FACTOR_SETS_SQL = '''CREATE TABLE IF NOT EXISTS factor_sets
+                            (version INTEGER PRIMARY KEY AUTOINCREMENT, factors TEXT NOT NULL UNIQUE,
+                             created TEXT NOT NULL)'''
+# Progress of an unfinished recompute_footprints run under the current factor version, in each shard
+CREATE_RECOMPUTE_CHECKPOINT_SQL = '''CREATE TABLE IF NOT EXISTS recompute_checkpoint
+                                     (version INTEGER PRIMARY KEY, last_id INTEGER NOT NULL)'''
+_RECOMPUTE_INPUTS = ["electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency"]
+
+# Footprints (and their rollups) can be hash-partitioned by user over several
+# shard files. Users stay in DATABASE_PATH, which also records the layout.
+# target_count is set while a rebalance is moving rows between layouts.
+CREATE_SHARD_LAYOUT_SQL = '''CREATE TABLE IF NOT EXISTS shard_layout
+                             (id INTEGER PRIMARY KEY CHECK (id = 0), shard_count INTEGER NOT NULL,
+                              target_count INTEGER)'''
+_MOVED_COLUMNS = ", ".join(FOOTPRINT_COLUMNS[1:])  # Moved rows get new ids in their new shard
+
+# One connection per (thread, database path), opened on first use
+_local = threading.local()
+_all_connections = []
+_all_connections_lock = threading.Lock()
+_generation = 0  # Bumped by close_all_connections so other threads reopen
+
+def get_connection(path: str = None) -> sqlite3.Connection:
+    """
+    Return this thread's connection to the database, opening it on first use.
+
+    Connections are kept open and reused for the life of the thread, with WAL
+    journaling and the pragmas from config.py applied once when opened.
+
+    Args:
+        path (str): Database file. Defaults to DATABASE_PATH.
+    """
+    path = path or DATABASE_PATH
+    if getattr(_local, "generation", None) != _generation:
+        _local.connections = {}
+        _local.generation = _generation
+    connections = _local.connections
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, cached_statements=256,
+                               check_same_thread=False)
+        conn.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size={int(SQLITE_CACHE_SIZE)}")
+        conn.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}")
+        connections[path] = conn
+        with _all_connections_lock:
+            _all_connections.append(conn)
+    return conn
+
+def close_connection(path: str = None):
+    """Close this thread's connection to the database, if one is open."""
+    path = path or DATABASE_PATH
+    if getattr(_local, "generation", None) != _generation:
+        return
+    conn = _local.connections.pop(path, None)
+    if conn is not None:
+        with _all_connections_lock:
+            _all_connections.remove(conn)
+        conn.close()
+
+@atexit.register
+def close_all_connections():
+    """Close every pooled connection. Called automatically at interpreter exit."""
+    global _generation
+    with _all_connections_lock:
+        connections = list(_all_connections)
+        _all_connections.clear()
+        _generation += 1
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+_shard_count = None  # Layout of the open database, read from shard_layout by setup_database()
+_factor_version = None  # Version of the current emission factors, registered by setup_database()
+_shard_executor = None
+_shard_executor_lock = threading.Lock()
+
+def shard_count() -> int:
+    """Return the number of footprint shards (0 when footprints live in DATABASE_PATH)."""
+    return SHARD_COUNT if _shard_count is None else _shard_count
+
+def _shard_file(index: int) -> str:
+    stem, suffix = os.path.splitext(DATABASE_PATH)
+    return SHARD_PATH_TEMPLATE.format(stem=stem, index=index, suffix=suffix)
+
+def shard_paths(count: int = None) -> list:
+    """Return the database files holding footprints, in shard order (default: the current layout)."""
+    count = shard_count() if count is None else count
+    return [_shard_file(index) for index in range(count)] if count else [DATABASE_PATH]
+
+def shard_path(user_id: str, count: int = None) -> str:
+    """
+    Return the database file holding a user's footprints.
+
+    Users are assigned by the CRC-32 of their ID, which, unlike hash(), is the
+    same in every process, so a user's whole history is always in one shard.
+    """
+    count = shard_count() if count is None else count
+    if not count:
+        return DATABASE_PATH
+    return _shard_file(zlib.crc32(str(user_id).encode("utf-8")) % count)
+
+def shard_connection(user_id: str) -> sqlite3.Connection:
+    """Return this thread's connection to the shard holding a user's footprints."""
+    return get_connection(shard_path(user_id))
+
+def _group_by_shard(rows: list, path: str = None) -> dict:
+    """Group footprint rows (user_id first) by shard file, or put them all in path if given."""
+    if path or not shard_count():
+        return {path or DATABASE_PATH: rows}
+    groups = {}
+    for row in rows:
+        groups.setdefault(shard_path(row[0]), []).append(row)
+    return groups
+
+def _fan_out(func, paths: list) -> list:
+    """Call func(path) for every shard file in parallel and return the results in path order."""
+    global _shard_executor
+    if len(paths) == 1:
+        return [func(paths[0])]
+    with _shard_executor_lock:
+        if _shard_executor is None:
+            _shard_executor = ThreadPoolExecutor(SHARD_QUERY_WORKERS, thread_name_prefix="shard-query")
+    return list(_shard_executor.map(func, paths))
 
 def setup_database():
-    """Set up the SQLite database and create necessary tables."""
+    """
+    Set up the SQLite database and create necessary tables.
+
+    Users and the shard layout live in DATABASE_PATH; the footprint tables are
+    created in every shard of the recorded layout. A new database takes its
+    layout from SHARD_COUNT, an existing one keeps the layout it has.
+
+    Raises:
+        RuntimeError: If a shard rebalance was interrupted (run it again to finish).
+    """
+    global _shard_count, _factor_version
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
+        conn = get_connection()
+        with conn:
             cursor = conn.cursor()
             cursor.execute('''CREATE TABLE IF NOT EXISTS users
                               (id TEXT PRIMARY KEY, password TEXT, is_admin INTEGER DEFAULT 0)''')
-            cursor.execute('''CREATE TABLE IF NOT EXISTS footprints
-                              (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                               user_id TEXT, electricity REAL, gas REAL, fuel REAL,
-                               waste REAL, recycling REAL, travel REAL,
-                               efficiency REAL, footprint REAL, date TEXT)''')
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_id ON footprints (user_id)")
-            conn.commit()
+            cursor.execute(CREATE_FACTOR_SETS_SQL)
+            factors = json.dumps(emission_factors(), sort_keys=True)
+            cursor.execute("INSERT OR IGNORE INTO factor_sets (factors, created) VALUES (?, ?)",
+                           (factors, datetime.now().strftime("%Y-%m-%dT%H:%M:%S")))
+            _factor_version = cursor.execute("SELECT version FROM factor_sets WHERE factors = ?",
+                                             (factors,)).fetchone()[0]
+            # A database from before sharding has its footprints in the main file
+            unsharded = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                                       "AND name = 'footprints'").fetchone()
+            cursor.execute(CREATE_SHARD_LAYOUT_SQL)
+            cursor.execute("INSERT OR IGNORE INTO shard_layout (id, shard_count) VALUES (0, ?)",
+                           (0 if unsharded else SHARD_COUNT,))
+            count, target = cursor.execute("SELECT shard_count, target_count FROM shard_layout").fetchone()
+        if target is not None:
+            raise RuntimeError(f"Rebalancing from {count} to {target} shards was interrupted; run "
+                               f"'python manage.py rebalance-shards --shards {target}' to finish it.")
+        if count != SHARD_COUNT:
+            logging.warning(f"The database uses {count} footprint shards, not SHARD_COUNT ({SHARD_COUNT}); "
+                            "run 'python manage.py rebalance-shards' to change it.")
+        _shard_count = count
+        for path in shard_paths():
+            _setup_footprints(get_connection(path))
     except sqlite3.Error as error:
         logging.error(f"Database setup error: {error}\n{traceback.format_exc()}")
         raise
 
+def _setup_footprints(conn):
+    """Create the footprints table, its indexes and its rollups in one database file."""
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''CREATE TABLE IF NOT EXISTS footprints
+                          (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                           user_id TEXT, electricity REAL, gas REAL, fuel REAL,
+                           waste REAL, recycling REAL, travel REAL,
+                           efficiency REAL, footprint REAL, date TEXT, ts INTEGER)''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_id ON footprints (user_id)")
+
+        # ts holds the full-resolution timestamp (microseconds since the epoch).
+        # Older databases get the column here; migrate_timestamps() fills it in.
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(footprints)")]
+        if "ts" not in columns:
+            cursor.execute("ALTER TABLE footprints ADD COLUMN ts INTEGER")
+        if "factor_version" not in columns:
+            cursor.execute("ALTER TABLE footprints ADD COLUMN factor_version INTEGER")
+        cursor.execute(CREATE_RECOMPUTE_CHECKPOINT_SQL)
+        # A checkpoint only holds while its factors stay current: a set that comes back
+        # later (same version) has to be checked from the first row again
+        cursor.execute("DELETE FROM recompute_checkpoint WHERE version IS NOT ?", (_factor_version,))
+        # (user_id, ts) range index. id gives a stable order for keyset pagination and
+        # footprint makes it covering for range queries that only need the total.
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_ts ON footprints (user_id, ts, id, footprint)")
+
+        # Monthly rollups: fill them from existing history the first time they are created
+        rollups_exist = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                                       "AND name = 'footprint_monthly'").fetchone()
+        cursor.execute(CREATE_ROLLUP_TABLE_SQL)
+        cursor.execute(CREATE_ROLLUP_TRIGGER_SQL)
+        if not rollups_exist:
+            cursor.execute(BACKFILL_ROLLUP_SQL)
+
+        # Percentile sketches of the users' totals, likewise filled the first time
+        sketches_exist = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                                        "AND name = 'footprint_sketch'").fetchone()
+        cursor.execute(sketch.CREATE_SKETCH_TABLE_SQL)
+    if not sketches_exist:
+        sketch.rebuild(conn)
+
+@metrics.timed("save_to_db")
 def save_to_db(user_id: str, electricity: float, gas: float, fuel: float, waste: float,
-               recycling: float, travel: float, efficiency: float, footprint: float):
-    """Save user inputs and calculated footprint to the database."""
+               recycling: float, travel: float, efficiency: float, footprint: float, conn=None):
+    """
+    Save user inputs and calculated footprint to the database.
+
+    When an open connection is passed in, the row joins the caller's
+    transaction and committing is left to the caller, so bulk loaders can
+    commit once per batch instead of once per row. It must be the user's
+    shard_connection(); save_footprints() does the grouping for mixed users.
+    """
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO footprints
-                              (user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, footprint, date)
-                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                           (user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, footprint,
-                            datetime.now().strftime('%Y-%m-%d')))
-            conn.commit()
+        row = _footprint_row(user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, footprint)
+        if conn is not None:
+            _insert_footprints(conn, [row])
+            return
+        conn = shard_connection(user_id)
+        with conn:
+            _insert_footprints(conn, [row])
     except sqlite3.Error as error:
         logging.error(f"Database save error for user {user_id}: {error}\n{traceback.format_exc()}")
-        raise
\ No newline at end of file
+        raise
+
+def save_footprints(records) -> int:
+    """
+    Save many footprints, each a tuple of save_to_db's arguments (without conn).
+
+    Rows are grouped by shard and written with one transaction per shard.
+
+    Returns:
+        int: Number of rows saved.
+    """
+    rows = [_footprint_row(*record) for record in records]
+    try:
+        for path, group in _group_by_shard(rows).items():
+            conn = get_connection(path)
+            with conn:
+                _insert_footprints(conn, group)
+    except sqlite3.Error as error:
+        logging.error(f"Database save error for {len(rows)} rows: {error}\n{traceback.format_exc()}")
+        raise
+    return len(rows)
+
+def _footprint_row(user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, footprint) -> tuple:
+    """Build the parameter tuple for INSERT_FOOTPRINT_SQL, stamped with the current time and factor version."""
+    ts = time.time_ns() // 1000
+    return (user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, footprint,
+            datetime.fromtimestamp(ts / 1_000_000).strftime('%Y-%m-%d'), ts, _factor_version)
+
+def to_timestamp(value) -> int:
+    """
+    Convert a datetime, date or epoch value to the integer stored in footprints.ts.
+
+    Args:
+        value: A datetime (naive values are local time), a date (local
+            midnight) or an int already in microseconds since the epoch.
+
+    Returns:
+        int: Microseconds since the epoch.
+    """
+    if isinstance(value, datetime):
+        return int(value.timestamp()) * 1_000_000 + value.microsecond
+    if isinstance(value, date):
+        return int(datetime(value.year, value.month, value.day).timestamp()) * 1_000_000
+    return int(value)
+
+def migrate_timestamps(chunk_size: int = 10000, progress=None) -> int:
+    """
+    Fill footprints.ts for rows written before the column existed.
+
+    Old rows only recorded a '%Y-%m-%d' date, so they get local midnight of
+    that day. Rows are updated shard by shard in id order, one committed chunk
+    at a time, and only rows whose ts is still NULL are touched. An interrupted
+    migration can therefore simply be run again and carries on where it stopped.
+
+    Args:
+        chunk_size (int): Rows updated per transaction.
+        progress (callable): Optional callback receiving the running total.
+
+    Returns:
+        int: Number of rows migrated.
+    """
+    migrated = 0
+    try:
+        for path in shard_paths():
+            conn = get_connection(path)
+            last_id = conn.execute("SELECT COALESCE(MIN(id), 0) - 1 FROM footprints WHERE ts IS NULL").fetchone()[0]
+            while True:
+                with conn:
+                    ids = [row[0] for row in conn.execute(
+                        "SELECT id FROM footprints WHERE id > ? AND ts IS NULL ORDER BY id LIMIT ?",
+                        (last_id, chunk_size))]
+                    if not ids:
+                        break
+                    conn.execute(
+                        "UPDATE footprints SET ts = CAST(strftime('%s', date, 'utc') AS INTEGER) * 1000000 "
+                        "WHERE id BETWEEN ? AND ? AND ts IS NULL", (ids[0], ids[-1]))
+                migrated += len(ids)
+                last_id = ids[-1]
+                if progress:
+                    progress(migrated)
+    except sqlite3.Error as error:
+        logging.error(f"Timestamp migration error after {migrated} rows: {error}\n{traceback.format_exc()}")
+        raise
+    return migrated
+
+def factor_version() -> int:
+    """Return the version of the emission factors in use (registered by setup_database())."""
+    return _factor_version
+
+def get_factor_sets() -> list:
+    """Return (version, factors, created) for every emission factor set seen so far, oldest first."""
+    return [(version, json.loads(factors), created) for version, factors, created in get_connection().execute(
+        "SELECT version, factors, created FROM factor_sets ORDER BY version")]
+
+def count_stale_footprints() -> int:
+    """Return how many stored totals were calculated with other emission factors than the current ones."""
+    return sum(_fan_out(lambda path: get_connection(path).execute(
+        "SELECT COUNT(*) FROM footprints WHERE factor_version IS NOT ?", (_factor_version,)).fetchone()[0],
+        shard_paths()))
+
+def recompute_footprints(chunk_size: int = 10000, pause: float = 0.0, progress=None) -> dict:
+    """
+    Recalculate stored totals that were calculated with other emission factors than the current ones.
+
+    Rows are processed shard by shard in id order, chunk_size rows per
+    transaction: their inputs go through calculate_footprint_batch and the
+    new total and factor version are written back, together with the
+    affected monthly rollups and percentile sketches. Each transaction also
+    records the last id it reached in recompute_checkpoint, so an interrupted
+    job resumes after its last committed chunk (the checkpoint is dropped
+    when the shard is done, or when the factors change). Transactions stay short and
+    readers are never blocked (WAL), so saves carry on while the job runs;
+    pause adds a delay between chunks to give them more room. Rows saved
+    meanwhile already carry the current version.
+
+    Args:
+        chunk_size (int): Rows recalculated per transaction.
+        pause (float): Seconds to wait between chunks.
+        progress (callable): Optional callback receiving the running total of updated rows.
+
+    Returns:
+        dict: rows updated, rows skipped (inputs that fail validation keep
+        their old total and version) and elapsed seconds.
+
+    Raises:
+        RuntimeError: If setup_database() has not registered the current factors.
+    """
+    import numpy as np
+
+    if _factor_version is None:
+        raise RuntimeError("setup_database() must run before recompute_footprints().")
+    started = time.perf_counter()
+    select = (f"SELECT id, user_id, date, {', '.join(_RECOMPUTE_INPUTS)} FROM footprints "
+              "WHERE id > ? AND factor_version IS NOT ? ORDER BY id LIMIT ?")
+    updated = skipped = 0
+    try:
+        for path in shard_paths():
+            conn = get_connection(path)
+            checkpoint = conn.execute("SELECT last_id FROM recompute_checkpoint WHERE version = ?",
+                                      (_factor_version,)).fetchone()
+            last_id = checkpoint[0] if checkpoint else 0
+            while True:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    rows = conn.execute(select, (last_id, _factor_version, chunk_size)).fetchall()
+                    if not rows:
+                        # The shard is done; a later run under this version starts over
+                        conn.execute("DELETE FROM recompute_checkpoint WHERE version = ?", (_factor_version,))
+                        break
+                    inputs = np.array([row[3:] for row in rows], dtype=np.float64)  # NULL inputs become NaN
+                    totals = calculate_footprint_batch(*inputs.T)["total_emissions"]
+                    valid = np.flatnonzero(~np.isnan(totals))
+                    changed = [rows[index] for index in valid]
+
+                    state = sketch.before_change(conn, list(dict.fromkeys(row[1] for row in changed)),
+                                                 {row[2][:4] for row in changed if row[2]})
+                    conn.executemany("UPDATE footprints SET footprint = ?, factor_version = ? WHERE id = ?",
+                                     [(float(totals[index]), _factor_version, rows[index][0]) for index in valid])
+                    conn.executemany(REFRESH_ROLLUP_SQL, {(row[1], row[2][:7]) for row in changed if row[2]})
+                    sketch.after_change(conn, state)
+                    last_id = rows[-1][0]
+                    conn.execute("INSERT OR REPLACE INTO recompute_checkpoint (version, last_id) VALUES (?, ?)",
+                                 (_factor_version, last_id))
+                updated += len(valid)
+                skipped += len(rows) - len(valid)
+                if progress:
+                    progress(updated)
+                if pause:
+                    time.sleep(pause)
+    except sqlite3.Error as error:
+        logging.error(f"Footprint recomputation error after {updated} rows: {error}\n{traceback.format_exc()}")
+        raise
+    return {"rows": updated, "skipped": skipped, "elapsed": time.perf_counter() - started}
+
+def get_footprint_range(user_id: str, start, end) -> list:
+    """
+    Return (id, ts, footprint) for a user's calculations with start <= ts < end.
+
+    Bounds may be datetimes, dates or epoch microseconds. The query is
+    answered from the idx_user_ts index alone.
+    """
+    return shard_connection(user_id).execute(
+        "SELECT id, ts, footprint FROM footprints WHERE user_id = ? AND ts >= ? AND ts < ? ORDER BY ts, id",
+        (user_id, to_timestamp(start), to_timestamp(end))).fetchall()
+
+def get_footprint_page(user_id: str, start=None, end=None, after: tuple = None, limit: int = 100) -> tuple:
+    """
+    Return one page of a user's calculations in time order, using keyset pagination.
+
+    Args:
+        user_id (str): User to look up.
+        start, end: Optional range bounds (start <= ts < end).
+        after (tuple): The cursor returned with the previous page, or None for the first page.
+        limit (int): Maximum rows per page.
+
+    Returns:
+        tuple: (rows, cursor). Rows are full footprints rows in FOOTPRINT_COLUMNS
+        order. Pass cursor as `after` to fetch the next page; it is None once
+        there are no more rows.
+
+    Raises:
+        ValueError: If limit is less than 1.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1.")
+    last_ts, last_id = after if after else (-1 << 63, 0)
+    rows = shard_connection(user_id).execute(
+        f"SELECT {', '.join(FOOTPRINT_COLUMNS)} FROM footprints "
+        "WHERE user_id = ? AND ts >= ? AND ts < ? AND (ts, id) > (?, ?) ORDER BY ts, id LIMIT ?",
+        (user_id, to_timestamp(start) if start is not None else -1 << 63,
+         to_timestamp(end) if end is not None else (1 << 63) - 1, last_ts, last_id, limit)).fetchall()
+    cursor = (rows[-1][_TS], rows[-1][0]) if len(rows) == limit else None
+    return rows, cursor
+
+def get_history_page(user_id: str, before_id: int = None, limit: int = 100) -> list:
+    """
+    Return one page of a user's calculations, newest first, using keyset pagination on (user_id, id).
+
+    Args:
+        user_id (str): User to look up.
+        before_id (int): The id of the last row of the previous page, or None for the newest rows.
+        limit (int): Maximum rows per page.
+
+    Returns:
+        list: Full footprints rows in FOOTPRINT_COLUMNS order. The page is
+        answered from the idx_user_id index (which ends in the row id), so
+        every page costs the same however deep it is.
+
+    Raises:
+        ValueError: If limit is less than 1.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1.")
+    return shard_connection(user_id).execute(
+        f"SELECT {', '.join(FOOTPRINT_COLUMNS)} FROM footprints WHERE user_id = ? AND id < ? "
+        "ORDER BY id DESC LIMIT ?", (user_id, (1 << 63) - 1 if before_id is None else before_id, limit)).fetchall()
+
+def count_user_footprints(user_id: str) -> int:
+    """Return how many calculations a user has saved."""
+    return shard_connection(user_id).execute("SELECT COUNT(*) FROM footprints WHERE user_id = ?",
+                                             (user_id,)).fetchone()[0]
+
+def iter_footprint_chunks(chunk_size: int = 10000, path: str = None, after_id: int = 0):
+    """
+    Yield every footprints row in lists of up to chunk_size rows (in FOOTPRINT_COLUMNS order).
+
+    Rows are read in id order with keyset pagination, shard by shard, or from
+    one database file if path is given (then only rows with id > after_id).
+    """
+    query = f"SELECT {', '.join(FOOTPRINT_COLUMNS)} FROM footprints WHERE id > ? ORDER BY id LIMIT ?"
+    for shard in [path] if path else shard_paths():
+        conn = get_connection(shard)
+        last_id = after_id
+        while True:
+            rows = conn.execute(query, (last_id, chunk_size)).fetchall()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1][0]
+
+def _insert_footprints(conn, rows: list):
+    """Insert footprint rows (built by _footprint_row) and update the percentile sketches, without committing."""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")  # Take the write lock before reading the totals the sketches move
+    state = sketch.before_insert(conn, rows)
+    conn.executemany(INSERT_FOOTPRINT_SQL, rows)
+    sketch.after_change(conn, state)
+
+def authenticate_user(username: str, password: str) -> bool:
+    """Return True if the username and password match a registered user."""
+    return get_connection().execute(SELECT_USER_SQL, (username, password)).fetchone() is not None
+
+def register_user(username: str, password: str):
+    """
+    Register a new user.
+
+    Raises:
+        sqlite3.IntegrityError: If the username already exists.
+    """
+    conn = get_connection()
+    with conn:
+        conn.execute(INSERT_USER_SQL, (username, password))
+
+def backfill_rollups() -> int:
+    """
+    Rebuild footprint_monthly from the full footprints table, in one transaction per shard.
+
+    Shards are rebuilt in parallel.
+
+    Returns:
+        int: Number of (user, month) rollup rows written.
+    """
+    def backfill(path):
+        conn = get_connection(path)
+        with conn:
+            conn.execute("DELETE FROM footprint_monthly")
+            return conn.execute(BACKFILL_ROLLUP_SQL).rowcount
+
+    try:
+        return sum(_fan_out(backfill, shard_paths()))
+    except sqlite3.Error as error:
+        logging.error(f"Rollup backfill error: {error}\n{traceback.format_exc()}")
+        raise
+
+def rebuild_sketches() -> int:
+    """
+    Rebuild the percentile sketches from the footprints and rollups, shard by shard in parallel.
+
+    Returns:
+        int: Number of user totals (latest and annual) counted.
+    """
+    try:
+        return sum(_fan_out(lambda path: sketch.rebuild(get_connection(path)), shard_paths()))
+    except sqlite3.Error as error:
+        logging.error(f"Sketch rebuild error: {error}\n{traceback.format_exc()}")
+        raise
+
+def get_percentile_rank(footprint: float, name: str = sketch.LATEST) -> float:
+    """
+    Return the share of users whose total is below footprint, from the sketches.
+
+    The cost does not depend on the number of users; see sketch.py for the
+    error bounds.
+
+    Args:
+        footprint (float): Total to rank, in kgCO2.
+        name (str): sketch.LATEST (latest totals) or sketch.annual(year).
+
+    Returns:
+        float: A fraction between 0 and 1, or None if no user has a total yet.
+    """
+    below = same = total = 0
+    for counts in _fan_out(lambda path: sketch.rank_counts(get_connection(path), footprint, name), shard_paths()):
+        below, same, total = below + counts[0], same + counts[1], total + counts[2]
+    return (below + same / 2) / total if total else None
+
+def get_sketch_quantile(q: float, name: str = sketch.LATEST) -> float:
+    """Return the q-quantile (0 <= q <= 1) of the users' totals from the sketches, or None if there are none."""
+    counts = {}
+    for rows in _fan_out(lambda path: get_connection(path).execute(
+            "SELECT bucket, count FROM footprint_sketch WHERE name = ? AND count > 0", (name,)).fetchall(),
+            shard_paths()):
+        for key, count in rows:
+            counts[key] = counts.get(key, 0) + count
+    return sketch.quantile(counts, q)
+
+def rebalance_shards(count: int, chunk_size: int = 100, progress=None) -> int:
+    """
+    Move footprints between shard files so they match a new shard count.
+
+    Users whose shard changes are moved chunk_size users at a time: their
+    rows (and monthly rollups) are copied to the new shard and then deleted
+    from the old one; the percentile sketches are rebuilt at the end. Moved rows keep their order but get new ids. The
+    target is recorded first and the layout is only switched at the end, so
+    an interrupted rebalance is finished by running it again with the same
+    count; setup_database() refuses to start until then. Shard files left
+    empty are deleted. Nothing else should write to the database meanwhile.
+
+    Args:
+        count (int): New number of shards (0 moves everything back into DATABASE_PATH).
+        chunk_size (int): Users moved per transaction.
+        progress (callable): Optional callback receiving the running total of moved rows.
+
+    Returns:
+        int: Number of rows moved.
+
+    Raises:
+        ValueError: If count is negative.
+        RuntimeError: If an interrupted rebalance to a different count is still pending.
+    """
+    global _shard_count
+    if count < 0:
+        raise ValueError("The shard count cannot be negative.")
+    conn = get_connection()
+    current, target = conn.execute("SELECT shard_count, target_count FROM shard_layout").fetchone()
+    if target not in (None, count):
+        raise RuntimeError(f"Rebalancing from {current} to {target} shards was interrupted; finish it first.")
+    with conn:
+        conn.execute("UPDATE shard_layout SET target_count = ?", (count,))
+
+    targets = shard_paths(count)
+    for path in targets:
+        _setup_footprints(get_connection(path))
+    # Rows may be in an old shard or, after an interruption, already in a new one
+    sources = [path for path in dict.fromkeys(shard_paths(current) + targets) if os.path.exists(path)]
+    moved = 0
+    try:
+        for source in sources:
+            moved = _move_users(source, count, chunk_size, progress, moved)
+    except sqlite3.Error as error:
+        logging.error(f"Shard rebalance error after {moved} rows: {error}\n{traceback.format_exc()}")
+        raise
+
+    _shard_count = count
+    rebuild_sketches()
+    with conn:
+        conn.execute("UPDATE shard_layout SET shard_count = ?, target_count = NULL", (count,))
+    close_all_connections()
+    for path in sources:
+        if path not in targets and path != DATABASE_PATH:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    return moved
+
+def _move_users(source: str, count: int, chunk_size: int, progress, moved: int) -> int:
+    """Move the users in source that belong elsewhere in a count-shard layout; return the running total."""
+    conn = sqlite3.connect(source, timeout=SQLITE_BUSY_TIMEOUT)
+    try:
+        destinations = {}
+        for (user_id,) in conn.execute("SELECT DISTINCT user_id FROM footprints"):
+            path = shard_path(user_id, count)
+            if path != source:
+                destinations.setdefault(path, []).append(user_id)
+        for path, user_ids in destinations.items():
+            conn.execute("ATTACH DATABASE ? AS destination", (path,))
+            try:
+                for start in range(0, len(user_ids), chunk_size):
+                    chunk = user_ids[start:start + chunk_size]
+                    users = f"user_id IN ({', '.join('?' * len(chunk))})"
+                    # Copy, replacing anything an interrupted run already copied (the destination's
+                    # rollup trigger rebuilds its monthly rows), and only then delete. Two separate
+                    # commits: WAL transactions are not atomic across files, and a crash between
+                    # them leaves a duplicate that the next run replaces, never a lost row.
+                    with conn:
+                        conn.execute(f"DELETE FROM destination.footprints WHERE {users}", chunk)
+                        conn.execute(f"DELETE FROM destination.footprint_monthly WHERE {users}", chunk)
+                        moved += conn.execute(
+                            f"INSERT INTO destination.footprints ({_MOVED_COLUMNS}) "
+                            f"SELECT {_MOVED_COLUMNS} FROM main.footprints WHERE {users} ORDER BY id", chunk).rowcount
+                    with conn:
+                        conn.execute(f"DELETE FROM main.footprints WHERE {users}", chunk)
+                        conn.execute(f"DELETE FROM main.footprint_monthly WHERE {users}", chunk)
+                    if progress:
+                        progress(moved)
+            finally:
+                conn.execute("DETACH DATABASE destination")
+    finally:
+        conn.close()
+    return moved
+
+def get_monthly_rollups(user_id: str, start_month: str = None, end_month: str = None) -> list:
+    """
+    Return a user's per-month totals, oldest first, read from the rollup table.
+
+    Args:
+        user_id (str): User to look up.
+        start_month (str): Optional first month to include ('YYYY-MM').
+        end_month (str): Optional last month to include ('YYYY-MM').
+
+    Returns:
+        list: One dictionary per month with month, row_count and the
+        <column>_sum/_min/_max values for every column in ROLLUP_COLUMNS.
+    """
+    query = "SELECT * FROM footprint_monthly WHERE user_id = ? AND month >= ? AND month <= ? ORDER BY month"
+    cursor = shard_connection(user_id).execute(query, (user_id, start_month or "", end_month or "9999-99"))
+    names = [description[0] for description in cursor.description]
+    return [dict(zip(names, row)) for row in cursor]
+
+def get_annual_totals(user_id: str) -> list:
+    """Return (year, calculation count, total footprint) tuples for a user, oldest first."""
+    return shard_connection(user_id).execute(
+        "SELECT substr(month, 1, 4) AS year, SUM(row_count), SUM(footprint_sum) FROM footprint_monthly "
+        "WHERE user_id = ? GROUP BY year ORDER BY year", (user_id,)).fetchall()
+
+def _latest_footprints(path: str, user_ids: list = None) -> sqlite3.Cursor:
+    """Return a cursor over the latest footprints row of each user in one database file."""
+    query = (f"SELECT {', '.join(FOOTPRINT_COLUMNS)} FROM footprints "
+             "WHERE id IN (SELECT MAX(id) FROM footprints GROUP BY user_id)")
+    params = ()
+    if user_ids:
+        query += f" AND user_id IN ({', '.join('?' * len(user_ids))})"
+        params = tuple(user_ids)
+    return get_connection(path).execute(query + " ORDER BY user_id", params)
+
+def iter_latest_footprints(user_ids: list = None):
+    """
+    Yield each user's most recent footprints row (in FOOTPRINT_COLUMNS order), by user_id.
+
+    With a single database, rows are streamed from the cursor rather than
+    loaded all at once. With shards, the shards holding the requested users
+    are queried in parallel and their results merged in user_id order.
+
+    Args:
+        user_ids (list): Optional users to restrict the query to.
+    """
+    if not shard_count():
+        yield from _latest_footprints(DATABASE_PATH, user_ids)
+        return
+    if user_ids:
+        groups = {}
+        for user_id in user_ids:
+            groups.setdefault(shard_path(user_id), []).append(user_id)
+    else:
+        groups = dict.fromkeys(shard_paths())
+    shards = _fan_out(lambda path: _latest_footprints(path, groups[path]).fetchall(), list(groups))
+    yield from heapq.merge(*shards, key=lambda row: row[1])
+
+class FootprintWriteQueue:
+    """
+    Write-behind queue that group-commits footprint inserts on a background thread.
+
+    Rows are buffered and written with executemany, committing whenever
+    batch_size rows are pending or flush_ms milliseconds have passed since the
+    first pending row arrived. put() blocks when max_pending rows are queued,
+    which applies backpressure to fast producers. Everything still queued is
+    flushed by close(), which also runs at interpreter exit.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size: int = WRITE_QUEUE_BATCH_SIZE, flush_ms: float = WRITE_QUEUE_FLUSH_MS,
+                 max_pending: int = WRITE_QUEUE_MAX_PENDING, path: str = None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.path = path
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stats_lock = threading.Lock()
+        self._rows_written = 0
+        self._rows_failed = 0
+        self._commits = 0
+        self._commit_seconds_total = 0.0
+        self._commit_seconds_last = 0.0
+        self._commit_seconds_max = 0.0
+        self._thread = threading.Thread(target=self._run, name="footprint-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, user_id: str, electricity: float, gas: float, fuel: float, waste: float,
+            recycling: float, travel: float, efficiency: float, footprint: float, timeout: float = None):
+        """
+        Queue a footprint row for writing (same arguments as save_to_db).
+
+        Raises:
+            queue.Full: If the queue stayed full for longer than timeout seconds.
+            RuntimeError: If the queue has been closed.
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError("The write queue has been closed.")
+        row = _footprint_row(user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, footprint)
+        self._queue.put(row, timeout=timeout)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Commit everything queued so far. Returns False if timeout expired first (the queue may be full)."""
+        if not self._thread.is_alive():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def close(self, timeout: float = None):
+        """Flush all pending rows and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)
+        atexit.unregister(self.close)
+
+    def stats(self) -> dict:
+        """Return queue depth, row counts and commit latency (in milliseconds)."""
+        with self._stats_lock:
+            commits = self._commits
+            return {
+                "queue_depth": self._queue.qsize(),
+                "rows_written": self._rows_written,
+                "rows_failed": self._rows_failed,
+                "commits": commits,
+                "commit_ms_last": self._commit_seconds_last * 1000,
+                "commit_ms_avg": self._commit_seconds_total * 1000 / commits if commits else 0.0,
+                "commit_ms_max": self._commit_seconds_max * 1000,
+            }
+
+    def _run(self):
+        """Writer thread: collect rows into batches and group-commit them."""
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None  # Flush interval elapsed
+
+            if isinstance(item, tuple):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            self._commit(batch)
+            batch = []
+            deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is self._STOP:
+                break
+
+    def _commit(self, batch: list):
+        """Write one batch, in a single transaction per shard, and record the commit latency."""
+        if not batch:
+            return
+        for path, rows in _group_by_shard(batch, self.path).items():
+            started = time.perf_counter()
+            try:
+                conn = get_connection(path)
+                with conn:
+                    _insert_footprints(conn, rows)
+            except sqlite3.Error as error:
+                logging.error(f"Database save error for {len(rows)} queued rows: {error}\n{traceback.format_exc()}")
+                with self._stats_lock:
+                    self._rows_failed += len(rows)
+                continue
+            self._record_commit(len(rows), time.perf_counter() - started)
+
+    def _record_commit(self, rows: int, elapsed: float):
+        metrics.observe("db_commit", elapsed)
+        metrics.count("footprints_saved", rows)
+        with self._stats_lock:
+            self._rows_written += rows
+            self._commits += 1
+            self._commit_seconds_total += elapsed
+            self._commit_seconds_last = elapsed
+            self._commit_seconds_max = max(self._commit_seconds_max, elapsed)
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue() -> FootprintWriteQueue:
+    """Return the shared write-behind queue, starting it on first use."""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None or not _write_queue._thread.is_alive():
+            _write_queue = FootprintWriteQueue()
+        return _write_queue
+
+def save_to_db_async(user_id: str, electricity: float, gas: float, fuel: float, waste: float,
+                     recycling: float, travel: float, efficiency: float, footprint: float):
+    """Queue a footprint row on the shared write-behind queue instead of writing it now."""
+    get_write_queue().put(user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, footprint)
@@ -0,0 +1,280 @@
+# export.py
+"""
+Chunked columnar export of the footprints table.
+
+Rows are read in id order, chunk_size rows at a time (keyset pagination on
+the primary key), and each chunk is written out before the next is read, so
+memory use does not depend on the table size. The export directory keeps a
+manifest.json with the highest exported id (the watermark); the next run
+only exports rows added since then, so nightly exports stay cheap. The
+manifest is updated after every chunk, so an interrupted export resumes
+where it stopped. A sharded database is exported shard by shard, with a
+watermark per shard (ids are only unique within a shard); after the shard
+count changes, start over with --full.
+
+Formats:
+    npy      One directory per chunk with a .npy file per column (no extra
+             dependencies; load with np.load(..., mmap_mode="r") or iter_npy_parts)
+    arrow    One Arrow IPC file per run, a record batch per chunk (needs pyarrow)
+    parquet  One Parquet file per run, a row group per chunk (needs pyarrow)
+
+Usage:
+    python export.py exports/footprints
+    python export.py exports/footprints --format parquet --chunk-size 500000 --users
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import database
+from config import EXPORT_CHUNK_SIZE
+
+FORMATS = ["npy", "arrow", "parquet"]
+USER_COLUMNS = ["id", "is_admin"]  # Passwords are never exported
+# Column types other than REAL (exported as float64)
+FOOTPRINT_TYPES = {"id": "integer", "user_id": "text", "date": "text", "ts": "integer",
+                   "factor_version": "integer"}
+USER_TYPES = {"id": "text", "is_admin": "integer"}
+MANIFEST = "manifest.json"
+
+def _read_manifest(directory: str) -> dict:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {"table": "footprints", "format": None, "shards": 0, "watermark": 0, "watermarks": {},
+                "rows": 0, "parts": []}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+def _write_manifest(directory: str, manifest: dict):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(path + ".tmp", path)
+
+def _columns(rows: list, names: list, types: dict) -> dict:
+    """Turn a chunk of rows into NumPy columns (missing numbers become NaN, or -1 for integers)."""
+    import numpy as np
+
+    columns = {}
+    for name, values in zip(names, zip(*rows)):
+        if types.get(name) == "text":
+            columns[name] = np.array(["" if value is None else str(value) for value in values])
+        elif types.get(name) == "integer":
+            columns[name] = np.array([-1 if value is None else value for value in values], dtype=np.int64)
+        else:
+            columns[name] = np.array(values, dtype=np.float64)  # None becomes NaN
+    return columns
+
+def _sources() -> list:
+    """Return (shard name, path) for every file holding footprints; the name is None when unsharded."""
+    if not database.shard_count():
+        return [(None, database.DATABASE_PATH)]
+    return [(os.path.basename(path), path) for path in database.shard_paths()]
+
+def _watermark(manifest: dict, shard: str) -> int:
+    return manifest["watermark"] if shard is None else manifest.setdefault("watermarks", {}).get(shard, 0)
+
+def _set_watermark(manifest: dict, shard: str, last_id: int):
+    if shard is None:
+        manifest["watermark"] = last_id
+    else:
+        manifest["watermarks"][shard] = last_id
+
+def _id_ranges(ranges: dict) -> dict:
+    """Describe the (first id, last id) exported per shard as part metadata."""
+    if None in ranges:
+        return {"first_id": ranges[None][0], "last_id": ranges[None][1]}
+    return {"shards": {shard: {"first_id": first, "last_id": last} for shard, (first, last) in ranges.items()}}
+
+def _write_npy(path: str, columns: dict):
+    """Write one .npy file per column into the directory path, replacing it atomically."""
+    import numpy as np
+
+    temporary = path + ".tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    for column, values in columns.items():
+        np.save(os.path.join(temporary, f"{column}.npy"), values)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(temporary, path)
+
+class _NpyWriter:
+    """A directory of .npy files per chunk."""
+
+    def __init__(self, directory: str, run: int):
+        self.directory = directory
+        self.run = run
+        self.part = 0
+
+    def write(self, columns: dict) -> str:
+        self.part += 1
+        name = f"part-{self.run:05d}-{self.part:05d}"
+        _write_npy(os.path.join(self.directory, name), columns)
+        return name
+
+    def close(self):
+        pass
+
+class _ArrowWriter:
+    """An Arrow IPC or Parquet file, with a record batch or row group per chunk."""
+
+    def __init__(self, directory: str, name: str, file_format: str):
+        try:
+            import pyarrow
+        except ImportError:
+            raise RuntimeError(f"The {file_format} format needs pyarrow (pip install pyarrow).")
+        self.pa = pyarrow
+        self.file_format = file_format
+        self.name = f"{name}.{file_format}"
+        self.path = os.path.join(directory, self.name)
+        self._writer = None
+
+    def write(self, columns: dict) -> str:
+        table = self.pa.table(columns)
+        if self._writer is None:
+            if self.file_format == "arrow":
+                self._writer = self.pa.ipc.new_file(self.path + ".tmp", table.schema)
+            else:
+                import pyarrow.parquet
+                self._writer = pyarrow.parquet.ParquetWriter(self.path + ".tmp", table.schema)
+        self._writer.write_table(table)
+        return self.name
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self.path + ".tmp", self.path)
+
+def _open_writer(directory: str, file_format: str, run: int):
+    if file_format == "npy":
+        return _NpyWriter(directory, run)
+    return _ArrowWriter(directory, f"part-{run:05d}", file_format)
+
+def _export_users(directory: str, file_format: str) -> str:
+    """Write a snapshot of the users table (without passwords), replacing the previous one."""
+    users = database.get_connection().execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users ORDER BY id").fetchall()
+    columns = _columns(users, USER_COLUMNS, USER_TYPES) if users else {name: [] for name in USER_COLUMNS}
+    if file_format == "npy":
+        _write_npy(os.path.join(directory, "users"), columns)
+        return "users"
+    writer = _ArrowWriter(directory, "users", file_format)
+    writer.write(columns)
+    writer.close()
+    return writer.name
+
+def export_footprints(directory: str, file_format: str = "npy", chunk_size: int = EXPORT_CHUNK_SIZE,
+                      include_users: bool = False, full: bool = False, progress=None) -> dict:
+    """
+    Export footprints rows added since the last export to columnar files.
+
+    Args:
+        directory (str): Export directory (created if missing). It holds the manifest.
+        file_format (str): "npy", "arrow" or "parquet". An existing export keeps its format.
+        chunk_size (int): Rows read and written per chunk.
+        include_users (bool): Also write a snapshot of the users table (without passwords).
+        full (bool): Ignore the watermark and start a new export from the first row.
+        progress (callable): Called with the number of rows exported so far after each chunk.
+
+    Returns:
+        dict: rows exported by this run, the new watermark (a dict of watermarks
+        per shard file for a sharded database) and elapsed seconds.
+
+    Raises:
+        ValueError: If the format or shard count differs from the existing export's, or the format is unknown.
+        RuntimeError: If the format needs pyarrow and it is not installed.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format {file_format!r}; choose from {', '.join(FORMATS)}.")
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory)
+    if full:
+        for part in manifest["parts"]:
+            path = os.path.join(directory, part["name"])
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+        manifest.update(watermark=0, watermarks={}, rows=0, parts=[])
+    if manifest["format"] not in (None, file_format) and manifest["parts"]:
+        raise ValueError(f"{directory} holds a {manifest['format']} export; use --full to start over.")
+    if manifest.get("shards", 0) != database.shard_count() and manifest["parts"]:
+        raise ValueError(f"{directory} was exported from {manifest.get('shards', 0)} shards, the database "
+                         f"now has {database.shard_count()}; use --full to start over.")
+    manifest["format"] = file_format
+    manifest["shards"] = database.shard_count()
+
+    started = time.perf_counter()
+    run = max((part["run"] for part in manifest["parts"]), default=0) + 1
+    writer = _open_writer(directory, file_format, run)
+    exported, ranges = 0, {}  # Shard -> (first id, last id) exported by this run
+    try:
+        for shard, path in _sources():
+            for rows in database.iter_footprint_chunks(chunk_size, path, _watermark(manifest, shard)):
+                name = writer.write(_columns(rows, database.FOOTPRINT_COLUMNS, FOOTPRINT_TYPES))
+                ranges[shard] = (ranges.get(shard, rows[0])[0], rows[-1][0])
+                exported += len(rows)
+                if file_format == "npy":
+                    # npy parts are complete as soon as they are written: advance the watermark per chunk
+                    manifest["parts"].append({"name": name, "run": run, "rows": len(rows),
+                                              **_id_ranges({shard: (rows[0][0], rows[-1][0])})})
+                    _set_watermark(manifest, shard, rows[-1][0])
+                    manifest["rows"] += len(rows)
+                    _write_manifest(directory, manifest)
+                if progress:
+                    progress(exported)
+    finally:
+        writer.close()
+
+    if file_format != "npy" and exported:
+        # Arrow and Parquet files are only valid once closed: record the whole run at the end
+        manifest["parts"].append({"name": writer.name, "run": run, "rows": exported, **_id_ranges(ranges)})
+        for shard, (_, last_id) in ranges.items():
+            _set_watermark(manifest, shard, last_id)
+        manifest["rows"] += exported
+    if include_users:
+        manifest["users"] = _export_users(directory, file_format)
+    manifest["exported_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    _write_manifest(directory, manifest)
+    watermark = manifest["watermark"] if not manifest["shards"] else dict(manifest["watermarks"])
+    return {"rows": exported, "watermark": watermark, "elapsed": time.perf_counter() - started}
+
+def iter_npy_parts(directory: str, columns: list = None, mmap: bool = True):
+    """
+    Yield the parts of an npy export as dictionaries of column arrays, in id order (per shard).
+
+    With mmap, arrays are memory-mapped rather than read into memory.
+    """
+    import numpy as np
+
+    manifest = _read_manifest(directory)
+    for part in manifest["parts"]:
+        path = os.path.join(directory, part["name"])
+        names = columns or [name[:-4] for name in sorted(os.listdir(path)) if name.endswith(".npy")]
+        yield {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None) for name in names}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export the footprints table to columnar files.")
+    parser.add_argument("directory", help="Export directory (keeps the watermark between runs)")
+    parser.add_argument("--format", choices=FORMATS, default="npy", help="Output format (default: npy)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="Rows per chunk")
+    parser.add_argument("--users", action="store_true", help="Also export the users table (without passwords)")
+    parser.add_argument("--full", action="store_true", help="Ignore the watermark and export every row again")
+    parser.add_argument("--database", help="Database file (default: config.DATABASE_PATH)")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.database:
+        database.DATABASE_PATH = args.database
+    database.setup_database()
+    try:
+        summary = export_footprints(args.directory, args.format, args.chunk_size, args.users, args.full,
+                                    progress=lambda rows: print(f"  {rows} rows exported", file=sys.stderr))
+    except (ValueError, RuntimeError) as error:
+        print(error, file=sys.stderr)
+        return 1
+    print(f"Exported {summary['rows']} rows in {summary['elapsed']:.2f} s (watermark {summary['watermark']})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
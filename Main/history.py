@@ -0,0 +1,174 @@
+# history.py
+"""
+Compact in-memory footprint history, for analysing many calculations at once.
+
+load_history() reads footprints rows into a FootprintHistory, which keeps
+one contiguous column per field instead of a tuple of Python objects per
+row. Columns are filled through array.array while rows stream in from the
+database, chunk by chunk, and exposed as NumPy arrays without copying.
+Aggregations (sum, mean, count, min, max; overall, per month or per user)
+run on the columns with NumPy and skip missing values, like SQL aggregates.
+
+Memory per row (64-bit CPython 3.11, user IDs shared between rows):
+    footprints row tuple       about 480 bytes (a 144 byte tuple holding
+                               9 floats, 3 ints and the date string)
+    FootprintHistory           88 bytes (id and ts: 8 bytes each; user and
+                               month codes: 4 bytes each; 8 float64 columns)
+A single calculate_footprint result takes 280 bytes as a dictionary and
+160 bytes as a calculations.FootprintResult.
+
+Usage:
+    from history import load_history
+    history = load_history(["alice", "bob"], start=date(2025, 1, 1))
+    history.by_month("footprint", "sum")  # {"2025-01": ..., ...}
+"""
+import math
+from array import array
+
+import database
+
+# float64 columns, named after their footprints columns
+VALUE_COLUMNS = ["electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency", "footprint"]
+STATS = ("sum", "mean", "count", "min", "max")
+_ID, _USER, _DATE, _TS = (database.FOOTPRINT_COLUMNS.index(name) for name in ("id", "user_id", "date", "ts"))
+_VALUES = {name: database.FOOTPRINT_COLUMNS.index(name) for name in VALUE_COLUMNS}
+
+def _month_code(day: str) -> int:
+    """Encode a 'YYYY-MM-DD' date as a month number (-1 if missing); months are grouped like the rollups."""
+    return int(day[:4]) * 12 + int(day[5:7]) - 1 if day else -1
+
+def _month_name(code: int) -> str:
+    return f"{code // 12:04d}-{code % 12 + 1:02d}" if code >= 0 else None
+
+class FootprintHistory:
+    """
+    Footprints rows stored column by column.
+
+    Attributes:
+        ids, ts (np.ndarray): int64 row ids and timestamps (-1 where ts is missing).
+        user_codes (np.ndarray): int32 index of each row's user in users.
+        users (list): Distinct user IDs, in order of first appearance.
+        months (np.ndarray): int32 month of each row (year * 12 + month - 1).
+        values (dict): A float64 array per VALUE_COLUMNS entry (NaN where missing).
+    """
+
+    def __init__(self, ids, ts, users: list, user_codes, months, values: dict):
+        self.ids = ids
+        self.ts = ts
+        self.users = users
+        self.user_codes = user_codes
+        self.months = months
+        self.values = values
+
+    @classmethod
+    def from_rows(cls, chunks) -> "FootprintHistory":
+        """Build a history from lists of footprints rows (in FOOTPRINT_COLUMNS order)."""
+        import numpy as np
+
+        ids, ts, user_codes, months = array("q"), array("q"), array("i"), array("i")
+        values = {name: array("d") for name in VALUE_COLUMNS}
+        users = {}
+        for rows in chunks:
+            if not rows:
+                continue
+            columns = list(zip(*rows))
+            ids.extend(columns[_ID])
+            ts.extend(-1 if value is None else value for value in columns[_TS])
+            user_codes.extend(users.setdefault(user_id, len(users)) for user_id in columns[_USER])
+            months.extend(map(_month_code, columns[_DATE]))
+            for name, index in _VALUES.items():
+                column = columns[index]
+                values[name].extend(column if None not in column else
+                                    [math.nan if value is None else value for value in column])
+        # The arrays share the array.array buffers, which stop growing here
+        return cls(np.frombuffer(ids, np.int64), np.frombuffer(ts, np.int64), list(users),
+                   np.frombuffer(user_codes, np.int32), np.frombuffer(months, np.int32),
+                   {name: np.frombuffer(column, np.float64) for name, column in values.items()})
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the columns."""
+        return sum(column.nbytes for column in (self.ids, self.ts, self.user_codes, self.months,
+                                                *self.values.values()))
+
+    def components(self) -> dict:
+        """Return calculate_footprint_batch's results for every row, with the current emission factors."""
+        from calculations import calculate_footprint_batch
+        return calculate_footprint_batch(*(self.values[name] for name in VALUE_COLUMNS[:-1]))
+
+    def _aggregate(self, groups, size: int, column: str, stat: str):
+        """Apply stat to column within each group (an index from 0 to size - 1 per row)."""
+        import numpy as np
+
+        if stat not in STATS:
+            raise ValueError(f"Unknown statistic {stat!r}; choose from {', '.join(STATS)}.")
+        values = self.values[column]
+        present = ~np.isnan(values)
+        groups, values = groups[present], values[present]
+        counts = np.bincount(groups, minlength=size)
+        if stat == "count":
+            return counts
+        if stat in ("sum", "mean"):
+            sums = np.bincount(groups, weights=values, minlength=size)
+            if stat == "sum":
+                return sums
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return sums / counts
+        result = np.full(size, np.inf if stat == "min" else -np.inf)
+        (np.minimum if stat == "min" else np.maximum).at(result, groups, values)
+        result[counts == 0] = np.nan
+        return result
+
+    def aggregate(self, column: str = "footprint", stat: str = "sum") -> float:
+        """Return a statistic of one column over all rows (NaN for the mean, min or max of no values)."""
+        import numpy as np
+        return self._aggregate(np.zeros(len(self), np.intp), 1, column, stat)[0].item()
+
+    def by_month(self, column: str = "footprint", stat: str = "sum") -> dict:
+        """Return {'YYYY-MM': statistic} for every month with rows, oldest first."""
+        import numpy as np
+        months, groups = np.unique(self.months, return_inverse=True)
+        return dict(zip(map(_month_name, months.tolist()),
+                        self._aggregate(groups, len(months), column, stat).tolist()))
+
+    def by_user(self, column: str = "footprint", stat: str = "sum") -> dict:
+        """Return {user_id: statistic} for every user with rows."""
+        return dict(zip(self.users, self._aggregate(self.user_codes.astype("intp"), len(self.users),
+                                                    column, stat).tolist()))
+
+def load_history(user_ids=None, start=None, end=None, chunk_size: int = 10000) -> FootprintHistory:
+    """
+    Load footprints rows into a FootprintHistory, chunk_size rows at a time.
+
+    Args:
+        user_ids: A user ID or a list of them (e.g. a department); each
+            user's rows are loaded in time order. None loads every row, shard
+            by shard in id order.
+        start, end: Optional range bounds (start <= ts < end), as datetimes,
+            dates or epoch microseconds. Rows without a timestamp (run
+            manage.py migrate-timestamps) are left out when users are given
+            or a bound is set.
+        chunk_size (int): Rows read per query.
+    """
+    if isinstance(user_ids, str):
+        user_ids = [user_ids]
+    if user_ids is not None:
+        return FootprintHistory.from_rows(_user_pages(user_ids, start, end, chunk_size))
+    chunks = database.iter_footprint_chunks(chunk_size)
+    if start is not None or end is not None:
+        low = database.to_timestamp(start) if start is not None else -1 << 63
+        high = database.to_timestamp(end) if end is not None else (1 << 63) - 1
+        chunks = ([row for row in rows if row[_TS] is not None and low <= row[_TS] < high] for rows in chunks)
+    return FootprintHistory.from_rows(chunks)
+
+def _user_pages(user_ids: list, start, end, chunk_size: int):
+    for user_id in user_ids:
+        cursor = None
+        while True:
+            rows, cursor = database.get_footprint_page(user_id, start, end, cursor, chunk_size)
+            yield rows
+            if cursor is None:
+                break
@@ -0,0 +1,272 @@
+# history_view.py
+"""
+Paginated, virtualized view of a user's saved calculations for the main window.
+
+Rows are read newest first with keyset pagination on (user_id, id)
+(database.get_history_page), one page at a time on a BackgroundTasks
+worker, so the Tk event loop never waits for the database. The panel draws
+only the rows that fit in its window and redraws them as it scrolls, so a
+history of tens of thousands of rows costs no more to show than a short
+one. Pages next to the visible ones are prefetched. Loaded pages are kept in
+a small LRU cache, and the cursor of every page seen is kept, so jumping
+back never rereads from the newest row.
+"""
+import collections
+import logging
+import tkinter as tk
+
+import customtkinter as ctk
+
+import database
+from config import HISTORY_CACHE_PAGES, HISTORY_PAGE_SIZE, HISTORY_PREFETCH_PAGES, HISTORY_ROW_HEIGHT
+
+_ID, _FOOTPRINT, _DATE = (database.FOOTPRINT_COLUMNS.index(name) for name in ("id", "footprint", "date"))
+# Columns holding calculate_footprint's seven inputs, in argument order
+INPUT_COLUMNS = [database.FOOTPRINT_COLUMNS.index(name)
+                 for name in ("electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency")]
+
+def read_pages(user_id: str, first_page: int, cursor: int, last_page: int, page_size: int) -> dict:
+    """
+    Read pages first_page..last_page of a user's history, following the keyset cursor. Runs on a worker thread.
+
+    Args:
+        cursor (int): The last id of the page before first_page (None when first_page is 0).
+
+    Returns:
+        dict: {page: rows}. It stops early at the end of the history.
+    """
+    pages = {}
+    for page in range(first_page, last_page + 1):
+        rows = database.get_history_page(user_id, cursor, page_size)
+        pages[page] = rows
+        if len(rows) < page_size:
+            break
+        cursor = rows[-1][_ID]
+    return pages
+
+def read_first_pages(user_id: str, pages: int, page_size: int, flush_writes: bool = False) -> tuple:
+    """Return (row count, {page: rows}) for the newest pages of a user's history. Runs on a worker thread."""
+    if flush_writes:
+        database.get_write_queue().flush(timeout=5)  # Include calculations that are still queued
+    return database.count_user_footprints(user_id), read_pages(user_id, 0, None, pages - 1, page_size)
+
+class HistoryPages:
+    """
+    Page bookkeeping for the history panel: which rows are loaded, and where to read the others from.
+
+    Row i of the history (0 is the newest) is row i % page_size of page
+    i // page_size. Pages can only be reached by following cursors from a
+    page whose cursor is known. All methods run on the Tk thread.
+    """
+
+    def __init__(self, page_size: int = HISTORY_PAGE_SIZE, cache_pages: int = HISTORY_CACHE_PAGES,
+                 prefetch: int = HISTORY_PREFETCH_PAGES):
+        self.page_size = page_size
+        self.cache_pages = cache_pages
+        self.prefetch = prefetch
+        self.generation = 0
+        self.reset(0)
+
+    def reset(self, total: int):
+        """Forget every page (the history changed); total is its new row count."""
+        self.total = total
+        self.generation += 1  # Reads started before this are dropped
+        self._pages = collections.OrderedDict()  # Page -> rows, least recently used first
+        self._cursors = {0: None}  # Page -> last id of the page before it
+        self._loading = set()
+
+    def row(self, index: int):
+        """Return row index (a footprints row), or None if its page is not loaded."""
+        page = self._pages.get(index // self.page_size)
+        if page is None:
+            return None
+        self._pages.move_to_end(index // self.page_size)
+        offset = index % self.page_size
+        return page[offset] if offset < len(page) else None
+
+    def next_load(self, first: int, last: int):
+        """
+        Return the next read needed to show rows first..last and prefetch around them, or None.
+
+        Returns:
+            tuple: (first page, its cursor, last page) to pass to read_pages.
+            The range starts at the nearest page with a known cursor, so pages
+            between it and the wanted one are read on the way.
+        """
+        if not self.total:
+            return None
+        last_page = (self.total - 1) // self.page_size
+        visible = range(first // self.page_size, min(last, self.total - 1) // self.page_size + 1)
+        wanted = list(visible) + [page for distance in range(1, self.prefetch + 1)
+                                  for page in (visible[0] - distance, visible[-1] + distance)]
+        for page in wanted:
+            if not 0 <= page <= last_page or page in self._pages or page in self._loading:
+                continue
+            start = max(known for known in self._cursors if known <= page)
+            if start in self._loading:
+                return None  # Wait for the pages in between to arrive
+            self._loading.update(range(start, page + 1))
+            return start, self._cursors[start], page
+        return None
+
+    def store(self, generation: int, pages: dict):
+        """Keep pages read by read_pages, unless the history was reset since the read started."""
+        if generation != self.generation:
+            return
+        for page, rows in sorted(pages.items()):
+            self._pages[page] = rows
+            self._pages.move_to_end(page)
+            if len(rows) == self.page_size:
+                self._cursors[page + 1] = rows[-1][_ID]
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+
+    def release(self, generation: int, first_page: int, last_page: int):
+        """Mark a read returned by next_load as finished (or failed), so its pages can be requested again."""
+        if generation == self.generation:
+            self._loading.difference_update(range(first_page, last_page + 1))
+
+def format_row(row) -> str:
+    """Return the text shown for a footprints row."""
+    footprint = "-" if row[_FOOTPRINT] is None else f"{row[_FOOTPRINT]:,.2f}"
+    return f"{row[_DATE] or '':<10}  {footprint:>12} kgCO2"
+
+def row_inputs(row) -> list:
+    """Return the entry texts for a footprints row's inputs (recycling back as a percentage)."""
+    values = [row[index] for index in INPUT_COLUMNS]
+    values[4] = values[4] * 100 if values[4] is not None else None
+    return ["" if value is None else f"{value:.10g}" for value in values]
+
+class HistoryPanel(ctk.CTkFrame):
+    """
+    Scrollable list of a user's saved calculations, newest first.
+
+    Only the rows in view are drawn, as text items on a canvas that are
+    reused while scrolling. Clicking a row calls on_select with its
+    footprints row.
+    """
+
+    def __init__(self, master, user_id: str, tasks, on_select, pages: HistoryPages = None,
+                 row_height: int = HISTORY_ROW_HEIGHT, **kwargs):
+        super().__init__(master, **kwargs)
+        self.user_id = user_id
+        self.tasks = tasks
+        self.on_select = on_select
+        self.pages = pages or HistoryPages()
+        self.row_height = row_height
+        self.top = 0  # Index of the first row in view
+        self._items = []  # One canvas text item per row that fits
+        self._highlight = None
+        self._selected = None  # id of the selected row
+
+        self.title = ctk.CTkLabel(master=self, text="History", font=("Arial", 14, "bold"), text_color="#ECEFF4")
+        self.title.pack(pady=(10, 5))
+        body = ctk.CTkFrame(master=self, fg_color="transparent")
+        body.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.canvas = tk.Canvas(body, bg="#3B4252", highlightthickness=0, width=280, height=200)
+        self.scrollbar = ctk.CTkScrollbar(master=body, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.canvas.pack(side=tk.LEFT, fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", lambda event: self._render())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", lambda event: self.scroll_to(self.top + (-3 if event.delta > 0 else 3)))
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_to(self.top - 3))  # Linux wheel up
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_to(self.top + 3))  # Linux wheel down
+
+    @property
+    def visible(self) -> int:
+        """Number of rows that fit in the canvas."""
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def refresh(self, flush_writes: bool = False):
+        """Reload the history from the newest row (after a save, flush_writes waits for queued rows)."""
+        pages = self.visible // self.pages.page_size + 1 + self.pages.prefetch
+
+        def loaded(result):
+            total, first_pages = result
+            self.pages.reset(total)
+            self.pages.store(self.pages.generation, first_pages)
+            self.title.configure(text=f"History ({total:,} calculations)")
+            self.scroll_to(0)
+
+        self.tasks.submit(read_first_pages, self.user_id, pages, self.pages.page_size, flush_writes,
+                          on_success=loaded, on_error=self._on_load_error, description="Loading history...")
+
+    def scroll_to(self, index: int):
+        """Show rows from index on."""
+        self.top = max(0, min(index, self.pages.total - self.visible))
+        self._render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * self.pages.total))
+        else:
+            step = self.visible if unit == "pages" else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def _render(self):
+        """Draw the rows in view and request any pages they (or their neighbours) need."""
+        visible = self.visible
+        while len(self._items) < visible:
+            self._items.append(self.canvas.create_text(8, (len(self._items) + 0.5) * self.row_height, anchor="w",
+                                                       fill="#ECEFF4", font=("Courier", 11)))
+        self.top = max(0, min(self.top, self.pages.total - visible))
+        highlighted = None
+        for slot, item in enumerate(self._items):
+            index = self.top + slot
+            row = self.pages.row(index) if slot < visible and index < self.pages.total else None
+            if row is not None:
+                text = format_row(row)
+                if row[_ID] == self._selected:
+                    highlighted = slot
+            else:
+                text = "Loading..." if slot < visible and index < self.pages.total else ""
+            self.canvas.itemconfigure(item, text=text)
+        self._draw_highlight(highlighted)
+        if self.pages.total:
+            self.scrollbar.set(self.top / self.pages.total, min(1.0, (self.top + visible) / self.pages.total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self._load(self.top, self.top + visible - 1)
+
+    def _draw_highlight(self, slot):
+        if self._highlight is not None:
+            self.canvas.delete(self._highlight)
+            self._highlight = None
+        if slot is not None:
+            self._highlight = self.canvas.create_rectangle(0, slot * self.row_height, self.canvas.winfo_width(),
+                                                           (slot + 1) * self.row_height, fill="#4C566A", width=0)
+            self.canvas.tag_lower(self._highlight)
+
+    def _load(self, first: int, last: int):
+        """Start the next page read, if any; when it arrives, the rows are drawn again."""
+        request = self.pages.next_load(first, last)
+        if request is None:
+            return
+        start, cursor, page = request
+        generation = self.pages.generation
+
+        def loaded(pages):
+            self.pages.store(generation, pages)
+            self.pages.release(generation, start, page)
+            self._render()
+
+        def failed(error):
+            self.pages.release(generation, start, page)
+            self._on_load_error(error)
+
+        self.tasks.submit(read_pages, self.user_id, start, cursor, page, self.pages.page_size,
+                          on_success=loaded, on_error=failed, description="Loading history...")
+
+    def _on_click(self, event):
+        index = self.top + event.y // self.row_height
+        row = self.pages.row(index) if index < self.pages.total else None
+        if row is not None:
+            self._selected = row[_ID]
+            self._render()
+            self.on_select(row)
+
+    def _on_load_error(self, error):
+        logging.error(f"History load error: {error}")
+        self.title.configure(text="History (could not be loaded)")
@@ -0,0 +1,115 @@
+# manage.py
+"""
+Database maintenance commands.
+
+Usage:
+    python manage.py backfill-rollups
+    python manage.py migrate-timestamps --chunk-size 10000
+    python manage.py rebalance-shards --shards 8
+    python manage.py recompute-footprints --chunk-size 10000 --pause 0.05
+    python manage.py rebuild-sketches
+    python manage.py tag-recommendations --chunk-size 100000
+"""
+import argparse
+import sys
+
+import database
+
+def backfill_rollups(args):
+    """Rebuild the monthly rollup table from the full footprint history."""
+    database.setup_database()
+    rows = database.backfill_rollups()
+    print(f"Rebuilt {rows} monthly rollup rows.")
+
+def migrate_timestamps(args):
+    """Fill footprints.ts for old rows in resumable chunks."""
+    database.setup_database()
+    rows = database.migrate_timestamps(args.chunk_size, progress=lambda done: print(f"  {done} rows migrated"))
+    print(f"Migrated {rows} rows.")
+
+def rebuild_sketches(args):
+    """Rebuild the percentile-ranking sketches from the stored footprints."""
+    database.setup_database()
+    totals = database.rebuild_sketches()
+    print(f"Rebuilt the percentile sketches from {totals} user totals.")
+
+def rebalance_shards(args):
+    """Move footprints so they are spread over a new number of shard files."""
+    try:
+        database.setup_database()
+    except RuntimeError:
+        pass  # An interrupted rebalance: running it again finishes it
+    rows = database.rebalance_shards(args.shards, args.chunk_size,
+                                     progress=lambda done: print(f"  {done} rows moved"))
+    print(f"Moved {rows} rows; footprints are now spread over {args.shards} shards.")
+
+def recompute_footprints(args):
+    """Recalculate stored totals after the emission factors changed, in resumable chunks."""
+    database.setup_database()
+    for version, factors, created in database.get_factor_sets():
+        print(f"Factor set {version} ({created}): {factors}")
+    print(f"{database.count_stale_footprints()} rows were calculated with other factors "
+          f"than the current set ({database.factor_version()}).")
+    summary = database.recompute_footprints(args.chunk_size, args.pause,
+                                            progress=lambda done: print(f"  {done} rows recalculated"))
+    print(f"Recalculated {summary['rows']} rows in {summary['elapsed']:.2f} s"
+          f" ({summary['skipped']} rows with invalid inputs skipped).")
+
+def tag_recommendations(args):
+    """Count how many stored footprints each recommendation rule applies to."""
+    import numpy as np
+    from recommendations import recommend_batch, rule_counts
+
+    database.setup_database()
+    columns = [database.FOOTPRINT_COLUMNS.index(name)
+               for name in ("electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency")]
+    totals, rows = {}, 0
+    for chunk in database.iter_footprint_chunks(args.chunk_size):
+        data = np.array([[row[index] for index in columns] for row in chunk], dtype=np.float64)
+        for name, count in rule_counts(recommend_batch(*data.T)).items():
+            totals[name] = totals.get(name, 0) + count
+        rows += len(chunk)
+        print(f"  {rows} rows tagged")
+    if not rows:
+        print("No footprints stored.")
+        return
+    for name, count in totals.items():
+        print(f"{name:<24}{count:>12}  {count / rows:7.1%}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Carbon Footprint Calculator database maintenance.")
+    parser.add_argument("--database", help="Database file (default: config.DATABASE_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("backfill-rollups", help="Rebuild per-user monthly rollups from history")
+    command.set_defaults(handler=backfill_rollups)
+
+    command = commands.add_parser("migrate-timestamps", help="Fill the ts column for rows written before it existed")
+    command.add_argument("--chunk-size", type=int, default=10000, help="Rows updated per transaction")
+    command.set_defaults(handler=migrate_timestamps)
+
+    command = commands.add_parser("rebuild-sketches", help="Rebuild the percentile-ranking sketches from history")
+    command.set_defaults(handler=rebuild_sketches)
+
+    command = commands.add_parser("rebalance-shards", help="Spread footprints over a new number of shard files")
+    command.add_argument("--shards", type=int, required=True, help="New shard count (0 for a single file)")
+    command.add_argument("--chunk-size", type=int, default=100, help="Users moved per transaction")
+    command.set_defaults(handler=rebalance_shards)
+
+    command = commands.add_parser("recompute-footprints", help="Recalculate totals saved with older emission factors")
+    command.add_argument("--chunk-size", type=int, default=10000, help="Rows recalculated per transaction")
+    command.add_argument("--pause", type=float, default=0.0, help="Seconds to wait between chunks")
+    command.set_defaults(handler=recompute_footprints)
+
+    command = commands.add_parser("tag-recommendations", help="Count stored footprints per recommendation rule")
+    command.add_argument("--chunk-size", type=int, default=100000, help="Rows evaluated per batch")
+    command.set_defaults(handler=tag_recommendations)
+
+    args = parser.parse_args(argv)
+    if args.database:
+        database.DATABASE_PATH = args.database
+    args.handler(args)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
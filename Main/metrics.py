@@ -0,0 +1,333 @@
+# metrics.py
+"""
+Lightweight per-stage timing and counters.
+
+Stages (validation, calculation, database writes, redraws, chart rendering,
+PDF generation) are wrapped in timed(stage), which records the duration in a
+fixed-bucket latency histogram. Collection is off by default and can be
+switched on and off at runtime with enable() and disable(); while it is off,
+timed() only returns a shared no-op object. Metrics are exported to a local file in
+Prometheus text format or JSON.
+
+An optional sampling profiler can be attached with start_profiler(). It
+samples the stack of every thread that is inside a timed stage and keeps the
+samples of the slowest requests (outermost stages), which dump_profiles()
+writes out in folded-stack format for flame graph tools.
+
+Usage:
+    import metrics
+    metrics.enable()
+    with metrics.timed("calculate"):
+        ...
+    metrics.write_metrics("metrics.prom")
+"""
+import bisect
+import collections
+import functools
+import heapq
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from config import METRICS_EXPORT_PATH
+
+# Where the application writes its metrics (set by main.py --metrics)
+EXPORT_PATH = METRICS_EXPORT_PATH
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_enabled = os.environ.get("CARBON_METRICS", "") not in ("", "0")
+_histograms = {}
+_counters = collections.Counter()
+_profiler = None
+_depth = threading.local()
+
+class Histogram:
+    """Latency histogram with fixed buckets. Callers hold the module lock."""
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in (capped at the maximum)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+def enable():
+    """Start collecting metrics."""
+    global _enabled
+    _enabled = True
+
+def disable():
+    """Stop collecting metrics (what was collected so far is kept)."""
+    global _enabled
+    _enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset():
+    """Discard all collected metrics."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def observe(stage: str, seconds: float):
+    """Record one duration for a stage."""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+def count(event: str, amount: int = 1):
+    """Increment a counter."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[event] += amount
+
+class _Timer:
+    """Context manager and decorator recording the duration of a stage."""
+
+    __slots__ = ("stage", "started", "profiler", "token")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        depth = getattr(_depth, "value", 0)
+        _depth.value = depth + 1
+        self.profiler = _profiler if depth == 0 else None  # Only outermost stages are profiled requests
+        if self.profiler is not None:
+            self.token = self.profiler.begin(self.stage)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        _depth.value -= 1
+        observe(self.stage, seconds)
+        if exc_type is not None:
+            count(f"{self.stage}_errors")
+        if self.profiler is not None:
+            self.profiler.end(self.token, seconds)
+        return False
+
+    def __call__(self, func):
+        stage = self.stage
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+class _NullTimer:
+    """Returned by timed() while metrics are off: a no-op context manager that still works as a decorator."""
+
+    __slots__ = ("stage",)
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def __call__(self, func):
+        return _Timer(self.stage)(func)  # The wrapper checks again on every call
+
+_null_timers = {}  # Stage -> shared _NullTimer, so disabled timing allocates nothing
+
+def timed(stage: str):
+    """
+    Time a stage, as a context manager (with timed("stage"): ...) or decorator (@timed("stage")).
+
+    Exceptions are counted as <stage>_errors and passed on.
+    """
+    if _enabled or _profiler is not None:
+        return _Timer(stage)
+    null_timer = _null_timers.get(stage)
+    if null_timer is None:
+        null_timer = _null_timers[stage] = _NullTimer(stage)
+    return null_timer
+
+def snapshot() -> dict:
+    """
+    Return all metrics as a JSON-serialisable dict.
+
+    Returns:
+        dict: stages (per stage: count, sum, max, mean, p50, p95, p99 in seconds
+        and cumulative bucket counts) and counters.
+    """
+    with _lock:
+        stages = {}
+        for stage, histogram in sorted(_histograms.items()):
+            cumulative, running = {}, 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), histogram.buckets):
+                running += bucket
+                cumulative[str(bound)] = running
+            stages[stage] = {
+                "count": histogram.count, "sum": histogram.total, "max": histogram.max,
+                "mean": histogram.total / histogram.count if histogram.count else 0.0,
+                "p50": histogram.quantile(0.5), "p95": histogram.quantile(0.95), "p99": histogram.quantile(0.99),
+                "buckets": cumulative,
+            }
+        return {"enabled": _enabled, "stages": stages, "counters": dict(sorted(_counters.items()))}
+
+def prometheus_text() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    data = snapshot()
+    lines = ["# HELP carbon_stage_seconds Time spent in each pipeline stage.",
+             "# TYPE carbon_stage_seconds histogram"]
+    for stage, values in data["stages"].items():
+        for bound, cumulative in values["buckets"].items():
+            lines.append(f'carbon_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'carbon_stage_seconds_sum{{stage="{stage}"}} {values["sum"]}')
+        lines.append(f'carbon_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+    lines += ["# HELP carbon_events_total Event counters.", "# TYPE carbon_events_total counter"]
+    for event, value in data["counters"].items():
+        lines.append(f'carbon_events_total{{event="{event}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def write_metrics(path: str = None):
+    """Write all metrics to path (default EXPORT_PATH): JSON for a .json file, Prometheus text otherwise."""
+    path = path or EXPORT_PATH
+    text = json.dumps(snapshot(), indent=2) if path.lower().endswith(".json") else prometheus_text()
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(temporary, path)  # Scrapers never see a half-written file
+
+class SamplingProfiler:
+    """
+    Sample the stacks of threads inside a timed stage and keep the slowest requests.
+
+    A request is an outermost timed stage. While it runs, a background thread
+    records its thread's stack every interval seconds; when it finishes, its
+    samples are kept if it is among the keep slowest requests seen so far.
+    """
+
+    def __init__(self, interval: float = 0.005, keep: int = 5):
+        self.interval = interval
+        self.keep = keep
+        self._active = {}  # Thread id -> (stage, Counter of folded stacks)
+        self._slowest = []  # Min-heap of (seconds, sequence, stage, Counter)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def begin(self, stage: str):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = (stage, collections.Counter())
+        return thread_id
+
+    def end(self, thread_id, seconds: float):
+        with self._lock:
+            stage, samples = self._active.pop(thread_id, (None, None))
+            if stage is None:
+                return
+            self._sequence += 1
+            entry = (seconds, self._sequence, stage, samples)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self) -> list:
+        """Return (seconds, stage, Counter of folded stacks) for the kept requests, slowest first."""
+        with self._lock:
+            return [(seconds, stage, samples) for seconds, _, stage, samples in sorted(self._slowest, reverse=True)]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, (stage, samples) in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+
+def _fold(frame) -> str:
+    """Render a stack as root;...;leaf function names (the folded-stack format)."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def start_profiler(interval: float = 0.005, keep: int = 5) -> SamplingProfiler:
+    """Attach a sampling profiler to the timed stages (replacing any running one)."""
+    global _profiler
+    stop_profiler()
+    profiler = SamplingProfiler(interval, keep)
+    profiler.start()
+    _profiler = profiler
+    return profiler
+
+def stop_profiler():
+    """Detach and stop the sampling profiler, if one is running."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+
+def dump_profiles(directory: str) -> list:
+    """
+    Write the slowest requests' samples as folded-stack files, one per request.
+
+    Returns:
+        list: The files written (empty if no profiler is running).
+    """
+    if _profiler is None:
+        return []
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for rank, (seconds, stage, samples) in enumerate(_profiler.slowest(), 1):
+        path = os.path.join(directory, f"{rank:02d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', stage)}_{seconds * 1000:.0f}ms.folded")
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, hits in samples.most_common():
+                file.write(f"{stack} {hits}\n")
+        paths.append(path)
+    return paths
@@ -1,5 +1,56 @@
+import hashlib
+import io
+import zlib
 from fpdf import FPDF
+from fpdf.fonts import CORE_FONTS_CHARWIDTHS
+from PIL import Image
+import metrics
 
+REPORT_TITLE = "Carbon Footprint Report"
+
+def report_lines(user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, total_footprint,
+                 energy_emissions, waste_emissions, travel_emissions, recommendations) -> list:
+    """
+    Return the text lines of a report, below the title.
+
+    When recommendations is None, the rule-based recommendations for the inputs are used.
+    """
+    if recommendations is None:
+        from recommendations import provide_recommendations
+        recommendations = provide_recommendations(
+            electricity, gas, fuel, waste, recycling, travel, efficiency,
+            {"total_emissions": total_footprint, "energy_emissions": energy_emissions,
+             "waste_emissions": waste_emissions, "travel_emissions": travel_emissions})
+    lines = [
+        # Add user information
+        f"User ID: {user_id}",
+
+        # Add inputs
+        f"Monthly Electricity Bill (EUR): {electricity}",
+        f"Monthly Natural Gas Bill (EUR): {gas}",
+        f"Monthly Fuel Bill (EUR): {fuel}",
+        f"Waste Generated (kg): {waste}",
+        f"Recycling Percentage (%): {recycling * 100}",
+        f"Business Travel (km): {travel}",
+        f"Fuel Efficiency (L/100km): {efficiency}",
+
+        # Add total footprint
+        f"Total Carbon Footprint: {total_footprint:.2f} kgCO2",
+
+        # Add emissions breakdown
+        f"Energy Emissions: {energy_emissions:.2f} kgCO2",
+        f"Waste Emissions: {waste_emissions:.2f} kgCO2",
+        f"Travel Emissions: {travel_emissions:.2f} kgCO2",
+
+        # Add recommendations
+        "Recommendations:",
+    ]
+    for recommendation in recommendations:
+        # Replace unsupported characters (e.g., "€" with "EUR")
+        lines.append(recommendation.replace("€", "EUR"))
+    return lines
+
+@metrics.timed("generate_pdf")
 def generate_pdf(user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, total_footprint, energy_emissions, waste_emissions, travel_emissions, recommendations, file_path, image_path):
     pdf = FPDF()
     pdf.add_page()
@@ -8,38 +59,178 @@ def generate_pdf(user_id, electricity, gas, fuel, waste, recycling, travel, effi
     pdf.set_font("Helvetica", size=16)
 
     # Add title
-    pdf.cell(200, 10, txt="Carbon Footprint Report", ln=True, align='C')
+    pdf.cell(200, 10, txt=REPORT_TITLE, ln=True, align='C')
 
-    # Add user information
+    # Add user information, inputs, totals, breakdown and recommendations
     pdf.set_font("Helvetica", size=12)
-    pdf.cell(200, 10, txt=f"User ID: {user_id}", ln=True, align='L')
-
-    # Add inputs
-    pdf.cell(200, 10, txt=f"Monthly Electricity Bill (EUR): {electricity}", ln=True, align='L')
-    pdf.cell(200, 10, txt=f"Monthly Natural Gas Bill (EUR): {gas}", ln=True, align='L')
-    pdf.cell(200, 10, txt=f"Monthly Fuel Bill (EUR): {fuel}", ln=True, align='L')
-    pdf.cell(200, 10, txt=f"Waste Generated (kg): {waste}", ln=True, align='L')
-    pdf.cell(200, 10, txt=f"Recycling Percentage (%): {recycling * 100}", ln=True, align='L')
-    pdf.cell(200, 10, txt=f"Business Travel (km): {travel}", ln=True, align='L')
-    pdf.cell(200, 10, txt=f"Fuel Efficiency (L/100km): {efficiency}", ln=True, align='L')
-
-    # Add total footprint
-    pdf.cell(200, 10, txt=f"Total Carbon Footprint: {total_footprint:.2f} kgCO2", ln=True, align='L')
-
-    # Add emissions breakdown
-    pdf.cell(200, 10, txt=f"Energy Emissions: {energy_emissions:.2f} kgCO2", ln=True, align='L')
-    pdf.cell(200, 10, txt=f"Waste Emissions: {waste_emissions:.2f} kgCO2", ln=True, align='L')
-    pdf.cell(200, 10, txt=f"Travel Emissions: {travel_emissions:.2f} kgCO2", ln=True, align='L')
-
-    # Add recommendations
-    pdf.cell(200, 10, txt="Recommendations:", ln=True, align='L')
-    for recommendation in recommendations:
-        # Replace unsupported characters (e.g., "€" with "EUR")
-        recommendation = recommendation.replace("€", "EUR")
-        pdf.cell(200, 10, txt=recommendation, ln=True, align='L')
+    for line in report_lines(user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, total_footprint,
+                             energy_emissions, waste_emissions, travel_emissions, recommendations):
+        pdf.cell(200, 10, txt=line, ln=True, align='L')
 
-    # Add graph image
+    # Add graph image (a file path, PNG bytes or an in-memory buffer such as io.BytesIO)
+    if isinstance(image_path, bytes):
+        image_path = io.BytesIO(image_path)
     pdf.image(image_path, x=10, y=150, w=180)
 
     # Save the PDF
-    pdf.output(file_path)
\ No newline at end of file
+    pdf.output(file_path)
+
+class ConsolidatedReportWriter:
+    """
+    Stream many reports (usually one page each) into a single PDF file.
+
+    FPDF keeps a whole document in memory until output(), which does not
+    scale to tens of thousands of pages. This writer emits every page to the
+    file as soon as it is added and only keeps object offsets in memory, so
+    memory use stays flat as the page count grows. The page layout follows
+    generate_pdf. Shared assets are written once and referenced from every
+    page: the Helvetica font, the title header (a form XObject) and each
+    distinct chart image.
+
+    Usage:
+        with ConsolidatedReportWriter("department.pdf") as writer:
+            writer.add_page(user_id, electricity, ..., recommendations, image)
+    """
+
+    PAGE_WIDTH, PAGE_HEIGHT = 595.28, 841.89  # A4 in points
+    MM = 72 / 25.4  # Points per millimetre
+    # Fixed object numbers for the shared objects; the catalog and page tree
+    # are written last, once every page is known.
+    CATALOG, PAGES, FONT, HEADER = 1, 2, 3, 4
+    LINES_PER_PAGE = 25  # 10 mm rows between the title and FPDF's 20 mm bottom margin
+    MIN_IMAGE_HEIGHT = 50  # mm; with less room left below the text, the chart goes on a page of its own
+
+    def __init__(self, file_path: str):
+        self.file = open(file_path, "wb")
+        self.offsets = [0] * (self.HEADER + 1)
+        self.pages = []
+        self.images = {}  # Image digest -> object number
+        self.position = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._write_object(self.FONT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                                      b"/Encoding /WinAnsiEncoding >>")
+        self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    def add_page(self, user_id, electricity, gas, fuel, waste, recycling, travel, efficiency, total_footprint,
+                 energy_emissions, waste_emissions, travel_emissions, recommendations, image):
+        """
+        Write one report (same arguments as generate_pdf, minus file_path; image is PNG bytes).
+
+        Text longer than LINES_PER_PAGE lines continues on further pages, each
+        under the title, and the chart follows the text on the last one.
+        """
+        lines = report_lines(user_id, electricity, gas, fuel, waste, recycling, travel, efficiency,
+                             total_footprint, energy_emissions, waste_emissions, travel_emissions, recommendations)
+        pages = [lines[start:start + self.LINES_PER_PAGE] for start in range(0, len(lines), self.LINES_PER_PAGE)]
+        for page_lines in pages[:-1]:
+            self._write_page(self._text_content(page_lines))
+        content = self._text_content(pages[-1])
+
+        image_number, pixel_width, pixel_height = self._image_object(image)
+        # Place the chart where generate_pdf does, but below the text if that runs longer
+        top = max(150, 10 + 10 * (len(pages[-1]) + 1) + 5) * self.MM
+        if self.PAGE_HEIGHT - top - 10 * self.MM < self.MIN_IMAGE_HEIGHT * self.MM:
+            self._write_page(content)
+            content, top = [b"/Hdr Do"], (10 + 10 + 5) * self.MM  # Just below the title
+        width = 180 * self.MM
+        height = width * pixel_height / pixel_width
+        available = self.PAGE_HEIGHT - top - 10 * self.MM
+        if height > available:
+            width, height = width * available / height, available
+        content.append(b"q %.2f 0 0 %.2f %.2f %.2f cm /Im Do Q"
+                       % (width, height, 10 * self.MM, self.PAGE_HEIGHT - top - height))
+        self._write_page(content, image_number)
+
+    def _text_content(self, lines: list) -> list:
+        """Return the content stream operators for a page's title and text lines."""
+        content = [b"/Hdr Do", b"BT /F1 12 Tf"]
+        for index, line in enumerate(lines, start=1):
+            # Same positions as FPDF cells: 10 mm rows from the top margin, 1 mm cell padding
+            baseline = self.PAGE_HEIGHT - (10 + 10 * index + 5) * self.MM - 0.3 * 12
+            content.append(b"1 0 0 1 %.2f %.2f Tm (%s) Tj" % (11 * self.MM, baseline, self._pdf_text(line)))
+        content.append(b"ET")
+        return content
+
+    def _write_page(self, content: list, image_number: int = None):
+        """Write a page's content stream and page object (image_number is the chart it draws, if any)."""
+        content_number = self._write_stream(b"", b"\n".join(content))
+        image = b" /Im %d 0 R" % image_number if image_number is not None else b""
+        page_number = self._write_object(None, (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /Font << /F1 %d 0 R >> /XObject << /Hdr %d 0 R%s >> >> "
+            b"/Contents %d 0 R >>"
+            % (self.PAGES, self.PAGE_WIDTH, self.PAGE_HEIGHT, self.FONT, self.HEADER, image, content_number)))
+        self.pages.append(page_number)
+
+    def close(self):
+        """Write the page tree, cross-reference table and trailer, then close the file."""
+        if self.file.closed:
+            return
+        kids = b" ".join(b"%d 0 R" % number for number in self.pages)
+        self._write_object(self.PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages)))
+        self._write_object(self.CATALOG, b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES)
+
+        xref_position = self.position
+        entries = [b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets)]
+        entries.extend(b"%010d 00000 n \n" % offset for offset in self.offsets[1:])
+        self._write(b"".join(entries))
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                    % (len(self.offsets), self.CATALOG, xref_position))
+        self.file.close()
+
+    def _write(self, data: bytes):
+        self.file.write(data)
+        self.position += len(data)
+
+    def _write_object(self, number, body: bytes) -> int:
+        """Write an indirect object, allocating a new object number if number is None."""
+        if number is None:
+            number = len(self.offsets)
+            self.offsets.append(0)
+        self.offsets[number] = self.position
+        self._write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        return number
+
+    def _write_stream(self, dictionary: bytes, data: bytes, number=None, compress: bool = True) -> int:
+        """Write a (Flate-compressed) stream object."""
+        if compress:
+            data = zlib.compress(data)
+            dictionary += b" /Filter /FlateDecode"
+        return self._write_object(number, b"<<%s /Length %d >>\nstream\n%s\nendstream"
+                                          % (dictionary, len(data), data))
+
+    def _write_header(self):
+        """Write the page title once, as a form XObject drawn on every page."""
+        width = sum(CORE_FONTS_CHARWIDTHS["helvetica"].get(char, 556) for char in REPORT_TITLE) * 16 / 1000
+        x = (10 + 100) * self.MM - width / 2  # Centred in the 200 mm title cell
+        baseline = self.PAGE_HEIGHT - 15 * self.MM - 0.3 * 16
+        data = b"BT /F1 16 Tf %.2f %.2f Td (%s) Tj ET" % (x, baseline, self._pdf_text(REPORT_TITLE))
+        self._write_stream(b" /Type /XObject /Subtype /Form /BBox [0 0 %.2f %.2f] /Resources << /Font << /F1 %d 0 R >> >>"
+                           % (self.PAGE_WIDTH, self.PAGE_HEIGHT, self.FONT), data, number=self.HEADER)
+
+    def _image_object(self, image: bytes) -> tuple:
+        """Return (object number, width, height) for an image, embedding it only the first time it is seen."""
+        digest = hashlib.sha1(image).digest()
+        if digest not in self.images:
+            picture = Image.open(io.BytesIO(image)).convert("RGB")
+            number = self._write_stream(b" /Type /XObject /Subtype /Image /Width %d /Height %d "
+                                        b"/ColorSpace /DeviceRGB /BitsPerComponent 8" % picture.size,
+                                        picture.tobytes())
+            self.images[digest] = (number,) + picture.size
+        return self.images[digest]
+
+    @staticmethod
+    def _pdf_text(text: str) -> bytes:
+        """Encode text as a PDF literal string body (WinAnsi, with escapes)."""
+        data = str(text).encode("cp1252", errors="replace")
+        return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
@@ -0,0 +1,204 @@
+# recommendations.py
+import operator
+from functools import lru_cache
+
+from calculations import calculate_footprint, calculate_footprint_batch
+from config import SCENARIO_TARGET_REDUCTION
+from scenarios import INPUTS, optimize_reduction
+
+LEVER_ACTIONS = {
+    "efficiency": "improve fuel efficiency by {:.0f}%",
+    "recycling": "recycle {:.0f} percentage points more",
+    "travel": "cut business travel by {:.0f}%",
+}
+
+# Recommendation rules, in the order their advice is listed. Each rule is
+# (name, conditions, recommendation) and applies when all of its conditions
+# hold. A condition is (field, operator, value): field is an input (recycling
+# as passed to calculate_footprint), a calculate_footprint result or a
+# component's share of the total (energy_share, waste_share, travel_share),
+# and value is a number or another field. A rule without conditions applies
+# only when no other rule does.
+RULES = [
+    ("public_transport", [("fuel", ">=", 150)],
+     "- Use public transportation or carpool to reduce fuel consumption."),
+    ("renewable_electricity", [("electricity", ">=", 150)],
+     "- Consider switching to renewable energy sources for electricity."),
+    ("insulation", [("gas", ">=", 100), ("gas", ">=", "electricity")],
+     "- Improve insulation in your home to reduce natural gas usage."),
+    ("recycling", [("waste_share", ">=", 0.1)],
+     "- Increase recycling and composting efforts."),
+    ("efficient_vehicle", [("efficiency", ">", 8), ("travel_share", ">=", 0.2)],
+     "- Opt for more fuel-efficient vehicles."),
+    ("video_conferencing", [("travel_emissions", ">=", 2000)],
+     "- Reduce unnecessary business travel by using video conferencing."),
+    ("doing_well", [("total_emissions", "<=", 5000)],
+     "- You are doing well! Keep up the good work and look for additional ways to reduce your footprint."),
+    ("largest_source", [],
+     "- Start with the largest emission source in the breakdown; it offers the biggest reduction."),
+]
+
+RESULTS = ["total_emissions", "energy_emissions", "waste_emissions", "travel_emissions"]
+SHARES = {"energy_share": "energy_emissions", "waste_share": "waste_emissions", "travel_share": "travel_emissions"}
+FIELDS = INPUTS + RESULTS + list(SHARES)
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+             "==": operator.eq, "!=": operator.ne}
+
+def compile_rules(rules: list) -> tuple:
+    """
+    Check a rule table and compile it for provide_recommendations and recommend_batch.
+
+    Returns:
+        tuple: (name, conditions, recommendation) per rule, with every
+        condition's operator resolved to a function.
+
+    Raises:
+        ValueError: If a rule uses an unknown field or operator, or there are more than 64 rules.
+    """
+    if len(rules) > 64:
+        raise ValueError("At most 64 rules are supported (each is one bit of a uint64 mask).")
+    compiled = []
+    for name, conditions, recommendation in rules:
+        clauses = []
+        for field, symbol, value in conditions:
+            for operand in (field, value) if isinstance(value, str) else (field,):
+                if operand not in FIELDS:
+                    raise ValueError(f"Rule {name!r}: unknown field {operand!r}.")
+            if symbol not in OPERATORS:
+                raise ValueError(f"Rule {name!r}: unknown operator {symbol!r}.")
+            clauses.append((field, OPERATORS[symbol], value))
+        compiled.append((name, tuple(clauses), recommendation))
+    return tuple(compiled)
+
+_compiled_rules = compile_rules(RULES)
+
+def _shares(results: dict, divide) -> dict:
+    total = results["total_emissions"]
+    return {share: divide(results[component], total) for share, component in SHARES.items()}
+
+def provide_recommendations(electricity: float, gas: float, fuel: float, waste: float, recycling: float,
+                            travel: float, efficiency: float, results: dict = None, rules: tuple = None) -> list:
+    """
+    Provide personalized recommendations from the rule table for one set of inputs.
+
+    Args:
+        electricity, gas, fuel, waste, recycling, travel, efficiency: As passed to calculate_footprint.
+        results (dict): calculate_footprint's results for these inputs (calculated if omitted).
+        rules (tuple): Compiled rules (default: RULES).
+
+    Returns:
+        list: The recommendation lines of every rule that applies.
+    """
+    if results is None:
+        results = calculate_footprint(electricity, gas, fuel, waste, recycling, travel, efficiency)
+    values = dict(zip(INPUTS, (electricity, gas, fuel, waste, recycling, travel, efficiency)))
+    values.update((name, results[name]) for name in RESULTS)
+    values.update(_shares(results, lambda part, total: part / total if total > 0 else 0.0))
+
+    rules = rules or _compiled_rules
+    matched = [all(compare(values[field], values[value] if isinstance(value, str) else value)
+                   for field, compare, value in conditions) and bool(conditions)
+               for _, conditions, _ in rules]
+    if not any(matched):
+        matched = [not conditions for _, conditions, _ in rules]
+    return [recommendation for (_, _, recommendation), hit in zip(rules, matched) if hit]
+
+def recommend_batch(electricity, gas, fuel, waste, recycling, travel, efficiency, results: dict = None,
+                    rules: tuple = None):
+    """
+    Evaluate the rule table for many records at once.
+
+    Takes the same columns as calculate_footprint_batch. Every condition is
+    one vectorized comparison over the whole batch, so millions of stored
+    footprints can be tagged in one pass.
+
+    Args:
+        results (dict): calculate_footprint_batch's results for these columns (calculated if omitted).
+        rules (tuple): Compiled rules (default: RULES).
+
+    Returns:
+        np.ndarray: A uint64 mask per row with bit i set when rule i applies
+        (decode with rule_messages). Invalid rows get 0.
+    """
+    import numpy as np
+
+    if results is None:
+        results = calculate_footprint_batch(electricity, gas, fuel, waste, recycling, travel, efficiency)
+    values = {name: np.asarray(column, dtype=np.float64)
+              for name, column in zip(INPUTS, (electricity, gas, fuel, waste, recycling, travel, efficiency))}
+    values.update((name, results[name]) for name in RESULTS)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values.update(_shares(results, lambda part, total: np.where(total > 0, part / total, 0.0)))
+
+    rules = rules or _compiled_rules
+    masks = np.zeros(len(values["total_emissions"]), dtype=np.uint64)
+    fallback = np.uint64(0)
+    for bit, (_, conditions, _) in enumerate(rules):
+        if not conditions:
+            fallback |= np.uint64(1 << bit)
+            continue
+        hit = np.ones(len(masks), dtype=bool)
+        for field, compare, value in conditions:
+            hit &= compare(values[field], values[value] if isinstance(value, str) else value)
+        masks[hit] |= np.uint64(1 << bit)
+    masks[masks == 0] = fallback
+    masks[results["invalid_rows"]] = 0
+    return masks
+
+def rule_messages(mask: int, rules: tuple = None) -> list:
+    """Return the recommendation lines encoded in one of recommend_batch's masks."""
+    mask = int(mask)
+    return [recommendation for bit, (_, _, recommendation) in enumerate(rules or _compiled_rules) if mask >> bit & 1]
+
+def rule_counts(masks, rules: tuple = None) -> dict:
+    """Return how many of recommend_batch's masks each rule applies to, by rule name."""
+    import numpy as np
+
+    return {name: int(((masks >> np.uint64(bit)) & np.uint64(1)).sum()) for bit, (name, _, _) in enumerate(rules or _compiled_rules)}
+
+def ranking_recommendations(rank: float) -> list:
+    """
+    Place a footprint within the organization.
+
+    Args:
+        rank (float): Share of users with a lower total (database.get_percentile_rank), or None.
+
+    Returns:
+        list: One line, or none if there is nothing to compare with.
+    """
+    if rank is None:
+        return []
+    if rank >= 0.5:
+        return [f"- Your footprint is in the top {max(1, round((1 - rank) * 100))}% of the organization."]
+    return [f"- Your footprint is lower than {round((1 - rank) * 100)}% of the organization's."]
+
+@lru_cache(maxsize=64)
+def scenario_recommendations(electricity: float, gas: float, fuel: float, waste: float, recycling: float,
+                             travel: float, efficiency: float, target: float = None) -> tuple:
+    """
+    Recommend the least-effort combination of changes that meets a reduction target.
+
+    The target defaults to SCENARIO_TARGET_REDUCTION below the current
+    footprint. If the levers cannot reach it, the largest possible reduction
+    is recommended instead. Memoized, so live updates and reports for the
+    same inputs only run the scenario sweep once.
+
+    Returns:
+        tuple: Recommendation lines (empty if no lever reduces the footprint).
+    """
+    result = optimize_reduction(electricity, gas, fuel, waste, recycling, travel, efficiency)
+    baseline = result["baseline"]
+    if target is None:
+        target = baseline * (1 - SCENARIO_TARGET_REDUCTION)
+    reachable = [scenario for scenario in result["front"] if scenario["total_emissions"] <= target]
+    if reachable:
+        scenario = reachable[0]
+        heading = f"- To reach {target:.0f} kgCO2 with the least effort: "
+    else:
+        scenario = result["front"][-1]
+        heading = f"- Largest reduction available ({scenario['reduction']:.0f} kgCO2): "
+    actions = [LEVER_ACTIONS[name].format(change) for name, change in scenario["changes"].items() if change > 0]
+    if not actions or scenario["reduction"] <= 0:
+        return ()
+    return (heading + ", ".join(actions) + ".",)
+
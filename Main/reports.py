@@ -0,0 +1,218 @@
+# reports.py
+"""
+Bulk PDF report generation for every user, without the GUI.
+
+The latest footprint of each user is read from the database, and charts and
+PDFs are rendered on a process pool with matplotlib's headless Agg backend.
+
+Usage:
+    python reports.py --output-dir reports --workers 8
+    python reports.py --consolidated department.pdf --user alice --user bob
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import matplotlib
+matplotlib.use("Agg")  # Headless: never needs a display
+
+from calculations import calculate_footprint
+from charts import render_breakdown_png
+from database import FOOTPRINT_COLUMNS, get_percentile_rank, iter_latest_footprints, setup_database
+from pdf_generator import ConsolidatedReportWriter, generate_pdf
+from recommendations import provide_recommendations, ranking_recommendations, scenario_recommendations
+
+STAGES = ["query", "calculate", "chart", "pdf"]
+
+def report_file_name(user_id: str) -> str:
+    """Return a file-system safe report name for a user."""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(user_id)) + "_report.pdf"
+
+def render_report(record: dict, file_path: str) -> dict:
+    """
+    Render one user's chart and PDF report.
+
+    Args:
+        record (dict): A footprints row keyed by FOOTPRINT_COLUMNS.
+        file_path (str): Where to write the PDF.
+
+    Returns:
+        dict: Seconds spent in the calculate, chart and pdf stages.
+    """
+    timings = {}
+    started = time.perf_counter()
+    results = calculate_footprint(record["electricity"], record["gas"], record["fuel"], record["waste"],
+                                  record["recycling"], record["travel"], record["efficiency"])
+    timings["calculate"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    image = render_breakdown_png(results["energy_emissions"], results["waste_emissions"],
+                                 results["travel_emissions"])
+    timings["chart"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    generate_pdf(
+        record["user_id"], record["electricity"], record["gas"], record["fuel"], record["waste"],
+        record["recycling"], record["travel"], record["efficiency"], results["total_emissions"],
+        results["energy_emissions"], results["waste_emissions"], results["travel_emissions"],
+        report_recommendations(record, results), file_path, image
+    )
+    timings["pdf"] = time.perf_counter() - started
+    return timings
+
+def report_recommendations(record: dict, results: dict) -> list:
+    """
+    Return the recommendation lines for a report: the user's ranking, the rule-based advice and the optimized scenario.
+
+    The ranking is looked up in the database unless the record already carries it under "rank".
+    """
+    inputs = [record[name] for name in ("electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency")]
+    rank = record["rank"] if "rank" in record else get_percentile_rank(results["total_emissions"])
+    return (ranking_recommendations(rank)
+            + provide_recommendations(*inputs, results) + list(scenario_recommendations(*inputs)))
+
+def _render_batch(rows: list, output_dir: str, ranks: list) -> list:
+    """Worker task: render a batch of reports, returning (user_id, error, timings) per row."""
+    outcomes = []
+    for row, rank in zip(rows, ranks):
+        record = dict(zip(FOOTPRINT_COLUMNS, row), rank=rank)  # Workers never open the database
+        try:
+            timings = render_report(record, os.path.join(output_dir, report_file_name(record["user_id"])))
+            outcomes.append((record["user_id"], None, timings))
+        except Exception as error:
+            outcomes.append((record["user_id"], f"{type(error).__name__}: {error}", {}))
+    return outcomes
+
+def generate_all_reports(output_dir: str, workers: int = None, batch_size: int = 20, user_ids: list = None,
+                         progress=None) -> dict:
+    """
+    Generate a PDF report for every user's latest footprint on a process pool.
+
+    Rows are streamed from the database and handed to the workers in batches,
+    with at most two batches per worker in flight at a time.
+
+    Args:
+        output_dir (str): Directory for the PDF files (created if missing).
+        workers (int): Worker processes (default: number of CPUs).
+        batch_size (int): Reports rendered per worker task.
+        user_ids (list): Optional users to restrict the run to.
+        progress (callable): Optional callback receiving the summary so far after each batch.
+
+    Returns:
+        dict: reports, failures (list of (user_id, error)), elapsed seconds,
+        reports_per_second and per-stage timing totals in seconds.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    summary = {"reports": 0, "failures": [], "elapsed": 0.0, "reports_per_second": 0.0,
+               "stages": {stage: 0.0 for stage in STAGES}}
+    started = time.perf_counter()
+
+    rows = iter_latest_footprints(user_ids)
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(pending) < workers * 2:
+                query_started = time.perf_counter()
+                batch = list(islice(rows, batch_size))
+                summary["stages"]["query"] += time.perf_counter() - query_started
+                if not batch:
+                    break
+                ranks = [get_percentile_rank(row[9]) if row[9] is not None else None for row in batch]
+                pending.add(executor.submit(_render_batch, batch, output_dir, ranks))
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for user_id, error, timings in future.result():
+                    if error:
+                        summary["failures"].append((user_id, error))
+                    else:
+                        summary["reports"] += 1
+                    for stage, seconds in timings.items():
+                        summary["stages"][stage] += seconds
+            if progress:
+                summary["elapsed"] = time.perf_counter() - started
+                summary["reports_per_second"] = summary["reports"] / summary["elapsed"]
+                progress(summary)
+
+    summary["elapsed"] = time.perf_counter() - started
+    summary["reports_per_second"] = summary["reports"] / summary["elapsed"] if summary["elapsed"] else 0.0
+    return summary
+
+def export_consolidated_pdf(file_path: str, user_ids: list = None, progress=None, progress_every: int = 1000) -> dict:
+    """
+    Write one consolidated PDF with a report page for every user's latest footprint.
+
+    Rows are streamed from the database and each page is written to the file
+    as soon as it is rendered, so memory use stays flat however many pages
+    the document has. Identical charts are rendered and embedded only once.
+
+    Returns:
+        dict: pages, failures (list of (user_id, error)) and elapsed seconds.
+    """
+    summary = {"pages": 0, "failures": [], "elapsed": 0.0}
+    started = time.perf_counter()
+    with ConsolidatedReportWriter(file_path) as writer:
+        for row in iter_latest_footprints(user_ids):
+            record = dict(zip(FOOTPRINT_COLUMNS, row))
+            try:
+                results = calculate_footprint(record["electricity"], record["gas"], record["fuel"], record["waste"],
+                                              record["recycling"], record["travel"], record["efficiency"])
+                image = render_breakdown_png(results["energy_emissions"], results["waste_emissions"],
+                                             results["travel_emissions"])
+                writer.add_page(
+                    record["user_id"], record["electricity"], record["gas"], record["fuel"], record["waste"],
+                    record["recycling"], record["travel"], record["efficiency"], results["total_emissions"],
+                    results["energy_emissions"], results["waste_emissions"], results["travel_emissions"],
+                    report_recommendations(record, results), image
+                )
+            except Exception as error:
+                summary["failures"].append((record["user_id"], f"{type(error).__name__}: {error}"))
+                continue
+            summary["pages"] += 1
+            if progress and summary["pages"] % progress_every == 0:
+                progress(summary)
+    summary["elapsed"] = time.perf_counter() - started
+    return summary
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate PDF reports for every user's latest footprint.")
+    parser.add_argument("--output-dir", default="reports", help="Directory for the PDF files")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=20, help="Reports rendered per worker task")
+    parser.add_argument("--user", action="append", dest="users", help="Only report on this user (repeatable)")
+    parser.add_argument("--consolidated", metavar="FILE",
+                        help="Write a single consolidated PDF with one page per user instead of one file each")
+    args = parser.parse_args(argv)
+
+    setup_database()
+    if args.consolidated:
+        summary = export_consolidated_pdf(args.consolidated, args.users,
+                                          progress=lambda s: print(f"  {s['pages']} pages", file=sys.stderr))
+        print(f"Wrote {summary['pages']} pages to {args.consolidated} in {summary['elapsed']:.2f} s")
+        for user_id, error in summary["failures"]:
+            print(f"FAILED {user_id}: {error}", file=sys.stderr)
+        return 1 if summary["failures"] else 0
+
+    summary = generate_all_reports(
+        args.output_dir, args.workers, args.batch_size, args.users,
+        progress=lambda s: print(f"  {s['reports']} reports, {len(s['failures'])} failures, "
+                                 f"{s['reports_per_second']:.1f} reports/s", file=sys.stderr))
+
+    print(f"Generated {summary['reports']} reports in {summary['elapsed']:.2f} s "
+          f"({summary['reports_per_second']:.1f} reports/s)")
+    print("Stage totals (summed over workers):")
+    for stage, seconds in summary["stages"].items():
+        print(f"  {stage:<10}{seconds:9.3f} s")
+    for user_id, error in summary["failures"]:
+        print(f"FAILED {user_id}: {error}", file=sys.stderr)
+    return 1 if summary["failures"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# scenarios.py
+"""
+Scenario sweep and reduction-target optimizer.
+
+Each lever is a change a site can make: improve fuel efficiency, recycle
+more or cut business travel. The sweep evaluates every combination of lever
+settings on a grid in one batch through calculate_footprint_batch, scores
+each scenario by its footprint and the effort it takes (SCENARIO_LEVERS in
+config.py), and keeps only the Pareto-optimal scenarios: those no other
+scenario beats on both footprint and effort.
+"""
+from calculations import calculate_footprint, calculate_footprint_batch
+from config import SCENARIO_LEVERS, SCENARIO_STEPS
+
+INPUTS = ["electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency"]
+
+def apply_levers(inputs: dict, changes: dict) -> dict:
+    """
+    Return the calculate_footprint inputs after applying lever changes.
+
+    Works on scalars and on NumPy arrays of changes alike.
+
+    Args:
+        inputs (dict): Inputs keyed by INPUTS (recycling as passed to calculate_footprint).
+        changes (dict): Lever settings:
+            - efficiency: % better fuel efficiency
+            - recycling: percentage points more recycling (capped at 100%)
+            - travel: % less business travel
+    """
+    import numpy as np
+
+    scenario = dict(inputs)
+    if "efficiency" in changes:
+        scenario["efficiency"] = inputs["efficiency"] * (1 + changes["efficiency"] / 100)
+    if "recycling" in changes:
+        scenario["recycling"] = np.minimum(inputs["recycling"] + changes["recycling"] / 100, 1.0)
+    if "travel" in changes:
+        scenario["travel"] = inputs["travel"] * (1 - changes["travel"] / 100)
+    return scenario
+
+def sweep_scenarios(electricity: float, gas: float, fuel: float, waste: float, recycling: float, travel: float,
+                    efficiency: float, levers: dict = None, steps: int = SCENARIO_STEPS) -> dict:
+    """
+    Evaluate every combination of lever settings on a grid.
+
+    Args:
+        levers (dict): lever -> (largest change, effort per unit of change); defaults to SCENARIO_LEVERS.
+        steps (int): Grid points per lever, from no change to the largest change.
+
+    Returns:
+        dict: One array per lever with its setting in each scenario, plus
+        total_emissions and effort arrays for all steps ** len(levers) scenarios.
+
+    Raises:
+        ValueError: If a lever is unknown, steps is below 2 or the inputs are invalid.
+    """
+    import numpy as np
+
+    levers = SCENARIO_LEVERS if levers is None else levers
+    unknown = set(levers) - {"efficiency", "recycling", "travel"}
+    if unknown:
+        raise ValueError(f"Unknown levers: {', '.join(sorted(unknown))}")
+    if steps < 2:
+        raise ValueError("At least two steps per lever are required.")
+    calculate_footprint(electricity, gas, fuel, waste, recycling, travel, efficiency)  # Validate the baseline
+
+    names = list(levers)
+    grids = np.meshgrid(*(np.linspace(0, levers[name][0], steps) for name in names), indexing="ij")
+    changes = {name: grid.ravel() for name, grid in zip(names, grids)}
+    size = steps ** len(names)
+
+    inputs = dict(zip(INPUTS, (electricity, gas, fuel, waste, recycling, travel, efficiency)))
+    scenario = apply_levers(inputs, changes)
+    columns = [np.broadcast_to(np.asarray(scenario[name], dtype=np.float64), (size,)) for name in INPUTS]
+    results = calculate_footprint_batch(*columns)
+
+    effort = np.zeros(size)
+    for name in names:
+        effort += changes[name] * levers[name][1]
+
+    sweep = dict(changes)
+    sweep["total_emissions"] = results["total_emissions"]
+    sweep["effort"] = effort
+    return sweep
+
+def pareto_front(footprints, efforts):
+    """
+    Return the indices of the Pareto-optimal scenarios, ordered by increasing effort.
+
+    A scenario is kept if every scenario with less or equal effort has a
+    strictly higher footprint.
+    """
+    import numpy as np
+
+    order = np.lexsort((footprints, efforts))  # By effort, then footprint
+    ordered = footprints[order]
+    best_before = np.minimum.accumulate(np.concatenate(([np.inf], ordered[:-1])))
+    return order[ordered < best_before]
+
+def optimize_reduction(electricity: float, gas: float, fuel: float, waste: float, recycling: float, travel: float,
+                       efficiency: float, target: float = None, levers: dict = None,
+                       steps: int = SCENARIO_STEPS) -> dict:
+    """
+    Find the least-effort ways to reduce a footprint.
+
+    Args:
+        target (float): Optional footprint target in kgCO2.
+
+    Returns:
+        dict: baseline (the current total), front (Pareto-optimal scenarios,
+        by increasing effort) and best (the least-effort scenario at or
+        under target, or None if there is no target or it cannot be reached).
+        Each scenario is a dict with changes (lever -> setting),
+        total_emissions, reduction and effort.
+    """
+    levers = SCENARIO_LEVERS if levers is None else levers
+    baseline = calculate_footprint(electricity, gas, fuel, waste, recycling, travel, efficiency)["total_emissions"]
+    sweep = sweep_scenarios(electricity, gas, fuel, waste, recycling, travel, efficiency, levers, steps)
+
+    front = []
+    for index in pareto_front(sweep["total_emissions"], sweep["effort"]):
+        total = float(sweep["total_emissions"][index])
+        front.append({
+            "changes": {name: float(sweep[name][index]) for name in levers},
+            "total_emissions": total,
+            "reduction": baseline - total,
+            "effort": float(sweep["effort"][index]),
+        })
+
+    best = None
+    if target is not None:
+        best = next((scenario for scenario in front if scenario["total_emissions"] <= target), None)
+    return {"baseline": baseline, "front": front, "best": best}
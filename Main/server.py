@@ -0,0 +1,539 @@
+# server.py
+"""
+Local HTTP service exposing the calculator to other tools.
+
+A small HTTP/1.1 server built on asyncio streams (no extra dependencies).
+The event loop only parses requests and does the scalar calculations;
+database queries, batch chunks and PDF rendering run on worker threads, and
+the number of connections and concurrent PDF jobs is capped (SERVER_* in
+config.py). Request bodies are read incrementally, so a batch upload is
+calculated and answered chunk by chunk while it is still arriving.
+
+Endpoints (inputs use the saved-inputs fields, recycling as a percentage):
+    GET  /health
+    GET  /metrics                      Prometheus text (see metrics.py)
+    POST /footprint                    One JSON object -> results and trees_needed
+                                       ("save": true with a user_id also stores it)
+    POST /footprints/batch             JSONL (or CSV with Content-Type: text/csv) in,
+                                       JSONL results streamed back; ?save=1 stores them,
+                                       ?user= is the user_id for rows without one
+    GET  /users/<id>/history           ?start=&end=&after=&limit= (keyset pages)
+    GET  /users/<id>/rollups           Monthly totals
+    GET  /users/<id>/report            PDF of the user's latest footprint
+    POST /report                       PDF for one JSON object of inputs
+
+Usage:
+    python server.py --port 8080
+    python server.py --load-test --requests 20000 --concurrency 64
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import metrics
+from calculations import calculate_footprint, calculate_offset
+from cli import INPUT_FIELDS, parse_row, process_chunk, save_records
+from config import (SERVER_BATCH_CHUNK_SIZE, SERVER_HOST, SERVER_MAX_BODY, SERVER_MAX_CONNECTIONS,
+                    SERVER_MAX_PDF_JOBS, SERVER_PORT, SERVER_WORKERS)
+import database
+
+MAX_HISTORY_LIMIT = 1000  # Largest page /users/<id>/history returns
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    """Raised by handlers to send an error response."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class Body:
+    """Incremental reader for one request body (Content-Length or chunked)."""
+
+    def __init__(self, reader, headers: dict):
+        self._reader = reader
+        self._chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        self._remaining = int(headers.get("content-length") or 0)
+        self._done = not self._chunked and self._remaining == 0
+
+    async def chunks(self):
+        """Yield the body as it arrives."""
+        while not self._done:
+            if self._chunked:
+                size = int((await self._reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass  # Skip trailers
+                    self._done = True
+                    return
+                data = await self._reader.readexactly(size)
+                await self._reader.readline()
+            else:
+                data = await self._reader.read(min(self._remaining, 65536))
+                if not data:
+                    raise HTTPError(400, "Request body ended early.")
+                self._remaining -= len(data)
+                self._done = self._remaining == 0
+            yield data
+
+    async def lines(self):
+        """Yield the body line by line (without line endings) as it arrives."""
+        pending = b""
+        async for data in self.chunks():
+            pending += data
+            *complete, pending = pending.split(b"\n")
+            for line in complete:
+                yield line.rstrip(b"\r")
+        if pending.strip():
+            yield pending.rstrip(b"\r")
+
+    async def read(self, limit: int = SERVER_MAX_BODY) -> bytes:
+        """Read the whole body, refusing bodies larger than limit bytes."""
+        parts, size = [], 0
+        async for data in self.chunks():
+            size += len(data)
+            if size > limit:
+                raise HTTPError(413, f"Request body larger than {limit} bytes; use the batch endpoint.")
+            parts.append(data)
+        return b"".join(parts)
+
+    async def discard(self):
+        """Consume whatever is left so the connection can be reused."""
+        async for _ in self.chunks():
+            pass
+
+    async def json(self) -> dict:
+        try:
+            value = json.loads(await self.read())
+        except (ValueError, UnicodeDecodeError) as error:
+            raise HTTPError(400, f"Invalid JSON: {error}")
+        if not isinstance(value, dict):
+            raise HTTPError(400, "Expected a JSON object.")
+        return value
+
+class Response:
+    """Writes one HTTP/1.1 response, either whole or streamed with chunked encoding."""
+
+    def __init__(self, writer, keep_alive: bool):
+        self._writer = writer
+        self.keep_alive = keep_alive
+        self.status = None
+
+    def _head(self, status: int, content_type: str, headers: list) -> bytes:
+        self.status = status
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                 f"Connection: {'keep-alive' if self.keep_alive else 'close'}"] + headers
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self._writer.write(self._head(status, content_type, [f"Content-Length: {len(body)}"]) + body)
+        await self._writer.drain()
+
+    async def send_json(self, value, status: int = 200):
+        await self.send(status, json.dumps(value).encode("utf-8"))
+
+    async def start_stream(self, content_type: str):
+        self._writer.write(self._head(200, content_type, ["Transfer-Encoding: chunked"]))
+
+    async def write(self, data: bytes):
+        if data:
+            self._writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            await self._writer.drain()  # Back-pressure: wait while the client is slow to read
+
+    async def end_stream(self):
+        self._writer.write(b"0\r\n\r\n")
+        await self._writer.drain()
+
+    @property
+    def started(self) -> bool:
+        return self.status is not None
+
+def _parse_inputs(payload: dict) -> tuple:
+    """Return (user_id, calculate_footprint inputs) for a request object, or raise HTTPError(400)."""
+    try:
+        return parse_row(payload, None)
+    except (ValueError, TypeError) as error:
+        raise HTTPError(400, str(error))
+
+def _footprint_result(values: list) -> dict:
+    try:
+        results = calculate_footprint(*values)
+    except ValueError as error:
+        raise HTTPError(400, str(error))
+    results["trees_needed"] = calculate_offset(results["total_emissions"])
+    return results
+
+def _timestamp_param(value: str):
+    """Parse a history bound: epoch microseconds or an ISO date/datetime."""
+    if value.lstrip("-").isdigit():
+        return int(value)
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPError(400, f"Invalid date: {value!r}")
+
+def _render_pdf(record: dict) -> bytes:
+    """Worker thread: render one report and return the PDF bytes."""
+    from reports import render_report  # Loads matplotlib (Agg) and fpdf on first use
+
+    handle, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(handle)
+    try:
+        render_report(record, path)
+        with open(path, "rb") as file:
+            return file.read()
+    finally:
+        os.remove(path)
+
+class FootprintServer:
+    """The HTTP service. Call start() inside a running event loop, or use serve()."""
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT, max_connections: int = SERVER_MAX_CONNECTIONS,
+                 workers: int = SERVER_WORKERS, max_pdf_jobs: int = SERVER_MAX_PDF_JOBS,
+                 chunk_size: int = SERVER_BATCH_CHUNK_SIZE):
+        self.host = host
+        self.port = port
+        self.chunk_size = chunk_size
+        self._connections = asyncio.Semaphore(max_connections)
+        self._pdf_jobs = asyncio.Semaphore(max_pdf_jobs)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self._server = None
+        # (method, path pattern) -> (route name, handler); "*" matches the user id
+        self._routes = {
+            ("GET", "health"): ("health", self.health),
+            ("GET", "metrics"): ("metrics", self.metrics),
+            ("POST", "footprint"): ("footprint", self.footprint),
+            ("POST", "footprints/batch"): ("batch", self.batch),
+            ("POST", "report"): ("report", self.report),
+            ("GET", "users/*/history"): ("history", self.history),
+            ("GET", "users/*/rollups"): ("rollups", self.rollups),
+            ("GET", "users/*/report"): ("user_report", self.user_report),
+        }
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # The real port when 0 was requested
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, func, *args):
+        """Run blocking work (database, PDF) on the worker threads."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _handle_connection(self, reader, writer):
+        async with self._connections:  # Connections beyond the limit wait here
+            try:
+                while await self._handle_request(reader, writer):
+                    pass
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                writer.close()
+
+    async def _handle_request(self, reader, writer) -> bool:
+        """Serve one request. Returns whether the connection stays open."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return False
+        started = time.perf_counter()
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            await Response(writer, False).send_json({"error": "Malformed request line."}, 400)
+            return False
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        body = Body(reader, headers)
+        response = Response(writer, keep_alive)
+        url = urlsplit(target)
+        route = "unknown"
+        try:
+            route = await self._dispatch(method, unquote(url.path), parse_qs(url.query), headers, body, response)
+            await body.discard()
+        except HTTPError as error:
+            if response.started:
+                raise ConnectionError("Error after the response started")
+            if error.status == 413:
+                response.keep_alive = False  # Do not read the rest of an oversized body
+            else:
+                await body.discard()
+            await response.send_json({"error": str(error)}, error.status)
+        except sqlite3.Error as error:
+            if response.started:
+                raise
+            response.keep_alive = False  # The connection may be in an unknown state
+            await response.send_json({"error": f"Database error: {error}"}, 500)
+        except Exception as error:
+            logging.exception(f"Error handling {method} {url.path}")
+            if response.started:
+                raise
+            response.keep_alive = False  # The connection may be in an unknown state
+            await response.send_json({"error": f"Internal error: {error}"}, 500)
+        metrics.observe(f"http_{route}", time.perf_counter() - started)
+        metrics.count(f"http_{response.status}")
+        return response.keep_alive
+
+    async def _dispatch(self, method, path, query, headers, body, response) -> str:
+        """Route a request to its handler and return the route name (for metrics)."""
+        parts = [part for part in path.split("/") if part]
+        pattern = f"users/*/{parts[2]}" if len(parts) == 3 and parts[0] == "users" else "/".join(parts)
+        if (method, pattern) not in self._routes:
+            known = any(route_pattern == pattern for _, route_pattern in self._routes)
+            raise HTTPError(405 if known else 404, f"No route for {method} {path}")
+        name, handler = self._routes[(method, pattern)]
+        await handler(parts=parts, query=query, headers=headers, body=body, response=response)
+        return name
+
+    async def health(self, response, **_):
+        await response.send_json({"status": "ok"})
+
+    async def metrics(self, response, **_):
+        await response.send(200, metrics.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+
+    async def footprint(self, body, response, **_):
+        payload = await body.json()
+        user_id, values = _parse_inputs(payload)
+        results = _footprint_result(values)
+        if payload.get("save"):
+            if not user_id:
+                raise HTTPError(400, "A user_id is required to save.")
+            # The write queue commits in the background; put() only blocks if it is full
+            await self._run(database.save_to_db_async, user_id, *values, results["total_emissions"])
+        await response.send_json(results)
+
+    async def batch(self, query, headers, body, response, **_):
+        save = query.get("save", ["0"])[0] not in ("0", "false", "")
+        default_user = query.get("user", [None])[0]
+        is_csv = headers.get("content-type", "").startswith("text/csv")
+        await response.start_stream("application/x-ndjson")
+
+        header = None
+        chunk, line_number, written, rejected = [], 1, 0, 0
+
+        async def flush(rows, first_line):
+            errors = io.StringIO()
+            records = await self._run(self._process_batch_chunk, rows, first_line, errors, save, default_user)
+            lines = [json.dumps(record) for record in records]
+            lines += [json.dumps({"error": message}) for message in errors.getvalue().splitlines()]
+            await response.write(("\n".join(lines) + "\n").encode("utf-8") if lines else b"")
+            return len(records), len(rows) - len(records)
+
+        first_line = 1
+        async for raw in body.lines():
+            if not raw.strip():
+                line_number += 1
+                continue
+            text = raw.decode("utf-8", errors="replace")
+            if is_csv:
+                values = next(csv.reader([text]))
+                if header is None:
+                    header = values
+                    line_number += 1
+                    first_line = line_number
+                    continue
+                row = dict(zip(header, values))
+            else:
+                try:
+                    row = json.loads(text)
+                except ValueError as error:
+                    row = f"Invalid JSON: {error}"
+                if not isinstance(row, (dict, str)):
+                    row = "Expected a JSON object."
+            chunk.append(row)
+            line_number += 1
+            if len(chunk) >= self.chunk_size:
+                done, failed = await flush(chunk, first_line)
+                written, rejected = written + done, rejected + failed
+                chunk, first_line = [], line_number
+        if chunk:
+            done, failed = await flush(chunk, first_line)
+            written, rejected = written + done, rejected + failed
+        await response.write(json.dumps({"summary": {"written": written, "rejected": rejected}}).encode() + b"\n")
+        await response.end_stream()
+
+    def _process_batch_chunk(self, rows: list, first_line: int, errors, save: bool, default_user: str) -> list:
+        """
+        Worker thread: calculate (and optionally save) one chunk of batch rows.
+
+        Rows are dicts, or error messages for lines that could not be parsed.
+        """
+        records, start = [], 0
+        for offset, row in enumerate(rows + ["end"]):
+            if not isinstance(row, str):
+                continue
+            # Calculate the run of parsed rows before this one, keeping their line numbers
+            records += process_chunk(rows[start:offset], default_user, first_line + start, errors)
+            if offset < len(rows):
+                errors.write(f"row {first_line + offset}: {row}\n")
+            start = offset + 1
+        if save:
+            saved = [record for record in records if record["user_id"]]
+            if len(saved) < len(records):
+                errors.write(f"rows {first_line}-{first_line + len(rows) - 1}: "
+                             f"{len(records) - len(saved)} rows without a user_id were not saved.\n")
+            save_records(saved)
+            records = saved
+        return records
+
+    async def history(self, parts, query, response, **_):
+        user_id = parts[1]
+        try:
+            limit = int(query.get("limit", ["100"])[0])
+            after = query.get("after", [None])[0]
+            after = tuple(int(value) for value in after.split(":")) if after else None
+        except ValueError:
+            raise HTTPError(400, "limit must be an integer and after must be 'ts:id'.")
+        if not 1 <= limit <= MAX_HISTORY_LIMIT:
+            raise HTTPError(400, f"limit must be between 1 and {MAX_HISTORY_LIMIT}.")
+        start = _timestamp_param(query["start"][0]) if "start" in query else None
+        end = _timestamp_param(query["end"][0]) if "end" in query else None
+        rows, cursor = await self._run(database.get_footprint_page, user_id, start, end, after, limit)
+        await response.send_json({
+            "rows": [dict(zip(database.FOOTPRINT_COLUMNS, row)) for row in rows],
+            "next": f"{cursor[0]}:{cursor[1]}" if cursor else None,
+        })
+
+    async def rollups(self, parts, query, response, **_):
+        start = query.get("start", [None])[0]
+        end = query.get("end", [None])[0]
+        await response.send_json(await self._run(database.get_monthly_rollups, parts[1], start, end))
+
+    async def user_report(self, parts, response, **_):
+        rows = await self._run(lambda: list(database.iter_latest_footprints([parts[1]])))
+        if not rows:
+            raise HTTPError(404, f"No footprints saved for user {parts[1]}.")
+        await self._send_pdf(dict(zip(database.FOOTPRINT_COLUMNS, rows[0])), response)
+
+    async def report(self, body, response, **_):
+        user_id, values = _parse_inputs(await body.json())
+        _footprint_result(values)  # Validate before queueing a render
+        record = dict(zip(INPUT_FIELDS, values), user_id=user_id or "anonymous")
+        await self._send_pdf(record, response)
+
+    async def _send_pdf(self, record: dict, response):
+        async with self._pdf_jobs:  # Requests beyond the limit wait for a free slot
+            pdf = await self._run(_render_pdf, record)
+        await response.send(200, pdf, "application/pdf")
+
+async def serve(host: str = SERVER_HOST, port: int = SERVER_PORT, **options):
+    """Run the service until cancelled."""
+    database.setup_database()
+    server = await FootprintServer(host, port, **options).start()
+    print(f"Serving on http://{server.host}:{server.port}", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+async def load_test(host: str, port: int, path: str = "/footprint", body: bytes = None, requests: int = 10000,
+                    concurrency: int = 50) -> dict:
+    """
+    Send requests over keep-alive connections and report throughput and latency.
+
+    Returns:
+        dict: requests, errors, elapsed seconds, requests_per_second and p50/p95/p99/max latency in ms.
+    """
+    if body is None:
+        body = json.dumps({"electricity": 100, "gas": 50, "fuel": 80, "waste": 20, "recycling": 50,
+                           "travel": 100, "efficiency": 8}).encode()
+    request = (f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+    latencies, errors = [], 0
+    remaining = requests
+
+    async def client():
+        nonlocal remaining, errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                writer.write(request)
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - started)
+                errors += status != 200
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0.0
+
+    return {"requests": len(latencies), "errors": errors, "elapsed": elapsed,
+            "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(0.5), "p95_ms": percentile(0.95), "p99_ms": percentile(0.99),
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the calculator over HTTP on localhost.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-connections", type=int, default=SERVER_MAX_CONNECTIONS,
+                        help="Connections served at once; more wait to be accepted")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Threads for database and PDF work")
+    parser.add_argument("--max-pdf-jobs", type=int, default=SERVER_MAX_PDF_JOBS, help="PDFs rendered at once")
+    parser.add_argument("--metrics", action="store_true", help="Collect per-route timings (served on /metrics)")
+    parser.add_argument("--load-test", action="store_true",
+                        help="Instead of serving, start a server on a free port and load-test it")
+    parser.add_argument("--requests", type=int, default=10000, help="Requests sent by --load-test")
+    parser.add_argument("--concurrency", type=int, default=50, help="Client connections used by --load-test")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        metrics.enable()
+    options = {"max_connections": args.max_connections, "workers": args.workers, "max_pdf_jobs": args.max_pdf_jobs}
+    if args.load_test:
+        async def run_load_test():
+            server = await FootprintServer(args.host, 0, **options).start()
+            try:
+                return await load_test(server.host, server.port, requests=args.requests,
+                                       concurrency=args.concurrency)
+            finally:
+                await server.close()
+        summary = asyncio.run(run_load_test())
+        print(json.dumps(summary, indent=2))
+        return 1 if summary["errors"] else 0
+
+    try:
+        asyncio.run(serve(args.host, args.port, **options))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# sketch.py
+"""
+Quantile sketches of users' footprint totals, for percentile ranking.
+
+A sketch counts values in logarithmically spaced buckets (the DDSketch
+scheme): bucket k holds values in (gamma^(k-1), gamma^k], with
+gamma = (1 + a) / (1 - a) for the relative accuracy a (SKETCH_RELATIVE_ACCURACY),
+mirrored for negative values, and one bucket for totals within
+SKETCH_MIN_VALUE of zero. Unlike t-digest or KLL sketches, counts can also
+be taken away, which a user's latest total needs: every save replaces it.
+
+Two kinds of sketch are kept, one row per (name, bucket) in the
+footprint_sketch table of every database file that holds footprints:
+    latest        every user's most recent total
+    annual:YYYY   every user's total for the year
+
+They are updated in the same transaction as each footprint insert and are
+bounded in size by the value range, not the number of users (about 1,000
+buckets for totals between 1 kg and 10,000 t at 1% accuracy).
+
+Error bounds:
+    quantile(q)   within a relative error a of the exact q-quantile.
+    rank(value)   exact for users whose totals are more than a (relative)
+                  away from value; the users within that margin are
+                  counted as half below and half above.
+"""
+import math
+from collections import Counter
+
+from config import SKETCH_MIN_VALUE, SKETCH_RELATIVE_ACCURACY
+
+GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+# Values just above SKETCH_MIN_VALUE land in bucket 1, or in bucket 2 when log(SKETCH_MIN_VALUE) is a
+# multiple of _LOG_GAMMA (as it is for 1.0). Bucket numbers are stored, so this must not change.
+_OFFSET = math.ceil(math.log(SKETCH_MIN_VALUE) / _LOG_GAMMA) - 1
+LATEST = "latest"
+
+CREATE_SKETCH_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS footprint_sketch
+                             (name TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL,
+                              PRIMARY KEY (name, bucket)) WITHOUT ROWID'''
+UPDATE_SKETCH_SQL = '''INSERT INTO footprint_sketch (name, bucket, count) VALUES (?, ?, ?)
+                       ON CONFLICT (name, bucket) DO UPDATE SET count = count + excluded.count'''
+RANK_SQL = '''SELECT COALESCE(SUM(CASE WHEN bucket < ? THEN count END), 0),
+                     COALESCE(SUM(CASE WHEN bucket = ? THEN count END), 0), COALESCE(SUM(count), 0)
+              FROM footprint_sketch WHERE name = ?'''
+_USERS_PER_QUERY = 500  # Keeps the IN (...) lists well below SQLite's parameter limit
+
+def annual(year) -> str:
+    """Return the sketch name for a year's totals."""
+    return f"annual:{year}"
+
+def bucket(value: float) -> int:
+    """Return the bucket of a value. Buckets are ordered like the values they hold."""
+    if abs(value) <= SKETCH_MIN_VALUE:
+        return 0
+    key = math.ceil(math.log(abs(value)) / _LOG_GAMMA) - _OFFSET
+    return key if value > 0 else -key
+
+def bucket_value(key: int) -> float:
+    """Return the value a bucket stands for (within the relative accuracy of all its values)."""
+    if key == 0:
+        return 0.0
+    value = 2 * GAMMA ** (abs(key) + _OFFSET) / (GAMMA + 1)
+    return value if key > 0 else -value
+
+def _totals(conn, user_ids: list, years: set) -> dict:
+    """Return {(sketch name, user_id): total} for the users' latest totals and their totals in years."""
+    totals = {}
+    for start in range(0, len(user_ids), _USERS_PER_QUERY):
+        chunk = user_ids[start:start + _USERS_PER_QUERY]
+        users = ", ".join("?" * len(chunk))
+        for user_id, footprint in conn.execute(
+                f"SELECT user_id, footprint FROM footprints WHERE id IN "
+                f"(SELECT MAX(id) FROM footprints WHERE user_id IN ({users}) GROUP BY user_id)", chunk):
+            totals[LATEST, user_id] = footprint
+        for user_id, year, total in conn.execute(
+                f"SELECT user_id, substr(month, 1, 4) AS year, SUM(footprint_sum) FROM footprint_monthly "
+                f"WHERE user_id IN ({users}) AND substr(month, 1, 4) IN ({', '.join('?' * len(years))}) "
+                f"GROUP BY user_id, year",
+                chunk + sorted(years)):
+            totals[annual(year), user_id] = total
+    return totals
+
+def before_change(conn, user_ids: list, years: set) -> tuple:
+    """
+    Read the users' totals (latest, and for the given years) before their footprints change.
+
+    Call inside the (write) transaction that changes them, then pass the
+    result to after_change, so no other writer can change them in between.
+    """
+    return user_ids, years, _totals(conn, user_ids, years)
+
+def before_insert(conn, rows: list) -> tuple:
+    """
+    Read the totals that inserting footprint rows will change (see before_change).
+
+    Args:
+        rows (list): Parameter tuples for INSERT_FOOTPRINT_SQL (user_id first, date tenth).
+    """
+    return before_change(conn, list(dict.fromkeys(row[0] for row in rows)), {row[9][:4] for row in rows})
+
+def after_change(conn, state: tuple):
+    """Move each changed user total from its old bucket to its new one."""
+    user_ids, years, previous = state
+    changes = Counter()
+    for (name, user_id), total in _totals(conn, user_ids, years).items():
+        old = previous.get((name, user_id))
+        if total is None or (old is not None and bucket(old) == bucket(total)):
+            continue
+        if old is not None:
+            changes[name, bucket(old)] -= 1
+        changes[name, bucket(total)] += 1
+    conn.executemany(UPDATE_SKETCH_SQL, [(name, key, count) for (name, key), count in changes.items() if count])
+
+def rebuild(conn) -> int:
+    """
+    Rebuild the sketches of one database file from its footprints and monthly rollups.
+
+    Returns:
+        int: Number of user totals counted.
+    """
+    changes = Counter()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")  # No inserts between reading the totals and replacing the sketches
+        for (footprint,) in conn.execute("SELECT footprint FROM footprints WHERE footprint IS NOT NULL AND id IN "
+                                         "(SELECT MAX(id) FROM footprints GROUP BY user_id)"):
+            changes[LATEST, bucket(footprint)] += 1
+        for year, total in conn.execute("SELECT substr(month, 1, 4) AS year, SUM(footprint_sum) "
+                                        "FROM footprint_monthly GROUP BY user_id, year "
+                                        "HAVING SUM(footprint_sum) IS NOT NULL"):
+            changes[annual(year), bucket(total)] += 1
+        conn.execute("DELETE FROM footprint_sketch")
+        conn.executemany(UPDATE_SKETCH_SQL, [(name, key, count) for (name, key), count in changes.items()])
+    return sum(changes.values())
+
+def rank_counts(conn, value: float, name: str = LATEST) -> tuple:
+    """Return (totals in lower buckets, totals in value's bucket, all totals) from one database file."""
+    key = bucket(value)
+    return conn.execute(RANK_SQL, (key, key, name)).fetchone()
+
+def quantile(counts: dict, q: float) -> float:
+    """Return the q-quantile (0 <= q <= 1) of a sketch given as {bucket: count}, or None if it is empty."""
+    total = sum(counts.values())
+    if not total:
+        return None
+    rank, seen = q * (total - 1), 0
+    for key in sorted(counts):
+        seen += counts[key]
+        if seen > rank:
+            return bucket_value(key)
+    return bucket_value(max(counts))
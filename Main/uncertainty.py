@@ -0,0 +1,169 @@
+# uncertainty.py
+"""
+Monte Carlo uncertainty analysis for a footprint.
+
+The emission factors are point estimates, and so are a user's inputs. This
+module draws N samples of every factor and input from configurable
+distributions, evaluates the footprint formula for all samples in one
+vectorized NumPy pass and reports percentiles per component.
+
+A distribution spec is either a plain number (no uncertainty) or a tuple:
+    ("fixed", value)
+    ("normal", mean, sd)             samples below zero are clipped to zero
+    ("lognormal", median, sigma)     sigma of the underlying normal
+    ("uniform", low, high)
+    ("triangular", low, mode, high)
+
+Usage:
+    python uncertainty.py 100 50 80 20 50 100 8 --seed 42
+    python uncertainty.py 100 50 80 20 50 100 8 --input-uncertainty 0.1 --samples 200000
+"""
+import argparse
+import json
+import sys
+import time
+
+from calculations import calculate_footprint
+from config import UNCERTAINTY_FACTORS, UNCERTAINTY_PERCENTILES, UNCERTAINTY_SAMPLES
+
+INPUTS = ["electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency"]
+FACTORS = ["co2_per_kwh", "co2_per_gas", "co2_per_liter_fuel", "co2_per_kg_waste", "co2_per_liter_travel"]
+COMPONENTS = ["total_emissions", "energy_emissions", "waste_emissions", "travel_emissions"]
+
+def sample(rng, spec, size: int):
+    """
+    Draw size samples from a distribution spec.
+
+    Raises:
+        ValueError: If the spec is not recognised.
+    """
+    import numpy as np
+
+    if isinstance(spec, (int, float)):
+        return np.full(size, float(spec))
+    kind, *params = spec
+    if kind == "fixed" and len(params) == 1:
+        return np.full(size, float(params[0]))
+    if kind == "normal" and len(params) == 2:
+        return np.maximum(rng.normal(params[0], params[1], size), 0.0)
+    if kind == "lognormal" and len(params) == 2:
+        return params[0] * np.exp(rng.normal(0.0, params[1], size))
+    if kind == "uniform" and len(params) == 2:
+        return rng.uniform(params[0], params[1], size)
+    if kind == "triangular" and len(params) == 3:
+        return rng.triangular(params[0], params[1], params[2], size)
+    raise ValueError(f"Unknown distribution spec: {spec!r}")
+
+def simulate_footprint(electricity: float, gas: float, fuel: float, waste: float, recycling: float, travel: float,
+                       efficiency: float, samples: int = UNCERTAINTY_SAMPLES, percentiles=UNCERTAINTY_PERCENTILES,
+                       factors: dict = None, inputs: dict = None, input_uncertainty: float = 0.0,
+                       seed: int = None) -> dict:
+    """
+    Estimate the spread of a footprint by Monte Carlo sampling.
+
+    Inputs have the same meaning as in calculate_footprint (recycling as
+    passed by the GUI). Every factor and input is sampled independently, in a
+    fixed order, so the same seed always gives the same result.
+
+    Args:
+        samples (int): Number of Monte Carlo samples.
+        percentiles: Percentiles (0-100) to report for each component.
+        factors (dict): Distribution specs overriding UNCERTAINTY_FACTORS, keyed by FACTORS.
+        inputs (dict): Distribution specs for individual inputs, keyed by INPUTS.
+        input_uncertainty (float): Relative standard deviation of a normal distribution
+            around every input not given in inputs (0 keeps them fixed).
+        seed (int): Seed for reproducible results.
+
+    Returns:
+        dict: One entry per component (total_emissions, energy_emissions, waste_emissions,
+        travel_emissions) holding the point estimate, mean, std and a percentiles dict,
+        plus samples (the number used) and invalid_samples (samples dropped because the
+        sampled fuel efficiency was not positive).
+
+    Raises:
+        ValueError: If samples is not positive, a spec is invalid or the point inputs are invalid.
+    """
+    import numpy as np
+
+    if samples < 1:
+        raise ValueError("At least one sample is required.")
+    point = calculate_footprint(electricity, gas, fuel, waste, recycling, travel, efficiency)
+
+    factor_specs = dict(UNCERTAINTY_FACTORS)
+    factor_specs.update(factors or {})
+    input_specs = {}
+    for name, value in zip(INPUTS, (electricity, gas, fuel, waste, recycling, travel, efficiency)):
+        input_specs[name] = ("normal", value, abs(value) * input_uncertainty) if input_uncertainty else value
+    input_specs.update(inputs or {})
+    unknown = set(factor_specs) - set(FACTORS) | set(input_specs) - set(INPUTS)
+    if unknown:
+        raise ValueError(f"Unknown factors or inputs: {', '.join(sorted(unknown))}")
+
+    rng = np.random.default_rng(seed)
+    f = {name: sample(rng, factor_specs[name], samples) for name in FACTORS}
+    x = {name: sample(rng, input_specs[name], samples) for name in INPUTS}
+
+    # Same formula as calculate_footprint, evaluated for every sample at once
+    emissions = np.empty((4, samples))
+    energy, waste_part, travel_part, total = emissions[1], emissions[2], emissions[3], emissions[0]
+    np.multiply(x["electricity"] * 12, f["co2_per_kwh"], out=energy)
+    energy += x["gas"] * 12 * f["co2_per_gas"]
+    energy += x["fuel"] * 12 * f["co2_per_liter_fuel"]
+    np.multiply(x["waste"] * 12, f["co2_per_kg_waste"] - (x["recycling"] / 100), out=waste_part)
+    valid = x["efficiency"] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.multiply(x["travel"] / x["efficiency"], f["co2_per_liter_travel"], out=travel_part)
+    np.add(energy, waste_part, out=total)
+    total += travel_part
+
+    if not valid.all():
+        emissions = emissions[:, valid]
+    if emissions.shape[1] == 0:
+        raise ValueError("Every sampled fuel efficiency was zero or negative.")
+
+    percentiles = [float(p) for p in percentiles]
+    quantiles = np.percentile(emissions, percentiles, axis=1)
+    means = emissions.mean(axis=1)
+    stds = emissions.std(axis=1)
+
+    summary = {"samples": samples, "invalid_samples": samples - emissions.shape[1]}
+    for row, component in enumerate(COMPONENTS):
+        summary[component] = {
+            "point": point[component],
+            "mean": float(means[row]),
+            "std": float(stds[row]),
+            "percentiles": {p: float(q) for p, q in zip(percentiles, quantiles[:, row])},
+        }
+    return summary
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Monte Carlo confidence intervals for one footprint.")
+    for name in INPUTS:
+        parser.add_argument(name, type=float, help="recycling as a percentage (0-100)" if name == "recycling" else None)
+    parser.add_argument("--samples", type=int, default=UNCERTAINTY_SAMPLES, help="Monte Carlo samples")
+    parser.add_argument("--percentile", type=float, action="append", dest="percentiles",
+                        help=f"Percentile to report (repeatable, default: {list(UNCERTAINTY_PERCENTILES)})")
+    parser.add_argument("--input-uncertainty", type=float, default=0.0,
+                        help="Relative standard deviation applied to every input (e.g. 0.1)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible results")
+    args = parser.parse_args(argv)
+
+    if args.recycling < 0 or args.recycling > 100:
+        parser.error("recycling must be between 0 and 100")
+    values = [getattr(args, name) for name in INPUTS]
+    values[4] = values[4] / 100  # Convert percentage to decimal, as the GUI does
+    started = time.perf_counter()
+    try:
+        summary = simulate_footprint(*values, samples=args.samples,
+                                     percentiles=args.percentiles or UNCERTAINTY_PERCENTILES,
+                                     input_uncertainty=args.input_uncertainty, seed=args.seed)
+    except ValueError as error:
+        sys.stderr.write(f"{error}\n")
+        return 1
+    summary["elapsed"] = time.perf_counter() - started
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+# tests/helpers.py
+"""Shared test fixtures."""
+import os
+import tempfile
+import unittest
+import database
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Point the database module at a fresh temporary file for each test.
+
+    Set SHARD_COUNT on a subclass to create the database with that many
+    footprint shards. Also works as the first base of an
+    IsolatedAsyncioTestCase subclass (setUp runs before asyncSetUp,
+    tearDown after asyncTearDown).
+    """
+
+    SHARD_COUNT = None  # None keeps config.SHARD_COUNT
+
+    def setUp(self):
+        self.original_shards = database.SHARD_COUNT
+        if self.SHARD_COUNT is not None:
+            database.SHARD_COUNT = self.SHARD_COUNT
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.original_path = database.DATABASE_PATH
+        database.DATABASE_PATH = os.path.join(self.tmpdir.name, "test.db")
+        database.setup_database()
+
+    def tearDown(self):
+        database.close_all_connections()
+        database.DATABASE_PATH = self.original_path
+        database.SHARD_COUNT = self.original_shards
+        self.tmpdir.cleanup()
@@ -0,0 +1,63 @@
+# tests/test_background.py
+import threading
+import time
+import unittest
+from background import BackgroundTasks
+
+class FakeRoot:
+    """Stands in for the Tk root: runs root.after callbacks when pumped."""
+
+    def __init__(self):
+        self.callbacks = []
+        self.thread = threading.current_thread()
+
+    def after(self, ms, callback):
+        self.callbacks.append(callback)
+
+    def pump(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.callbacks and time.monotonic() < deadline:
+            self.callbacks.pop(0)()
+            time.sleep(0.01)
+
+class FakeButton:
+    def __init__(self):
+        self.states = []
+
+    def configure(self, state):
+        self.states.append(state)
+
+class TestBackgroundTasks(unittest.TestCase):
+    def test_results_are_delivered_on_the_tk_thread(self):
+        root, button = FakeRoot(), FakeButton()
+        statuses, delivered = [], []
+        tasks = BackgroundTasks(root, on_status=lambda *status: statuses.append(status))
+
+        def job(value, progress):
+            progress("Halfway", 0.5)
+            return (value * 2, threading.current_thread())
+
+        tasks.submit(job, 21, on_success=lambda result: delivered.append((result, threading.current_thread())),
+                     widgets=(button, button), report_progress=True)
+        self.assertEqual(button.states, ["disabled"])
+        root.pump()
+        tasks.shutdown()
+
+        ((value, worker_thread), callback_thread), = delivered
+        self.assertEqual(value, 42)
+        self.assertIsNot(worker_thread, root.thread)
+        self.assertIs(callback_thread, root.thread)
+        self.assertEqual(button.states, ["disabled", "normal"])
+        self.assertIn(("Halfway", 0.5, 1), statuses)
+        self.assertEqual(tasks.active, 0)
+
+    def test_errors_go_to_on_error(self):
+        root, errors = FakeRoot(), []
+        tasks = BackgroundTasks(root)
+        tasks.submit(lambda: 1 / 0, on_error=errors.append)
+        root.pump()
+        tasks.shutdown()
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+
+if __name__ == "__main__":
+    unittest.main()
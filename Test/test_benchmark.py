@@ -0,0 +1,31 @@
+# tests/test_benchmark.py
+import unittest
+import database
+from benchmark import compare, run_benchmarks, synthetic_rows
+
+class TestBenchmark(unittest.TestCase):
+    def test_synthetic_rows_are_reproducible(self):
+        self.assertEqual(synthetic_rows(5), synthetic_rows(5))
+        self.assertNotEqual(synthetic_rows(5), synthetic_rows(5, seed=1))
+
+    def test_run_benchmarks(self):
+        path = database.DATABASE_PATH
+        results = run_benchmarks(["calculate_batch", "save_to_db_single"], repeat=2)
+        self.assertEqual(database.DATABASE_PATH, path)  # The real database is left alone
+        self.assertEqual(set(results["benchmarks"]), {"calculate_batch", "save_to_db_single"})
+        for result in results["benchmarks"].values():
+            self.assertLessEqual(result["min"], result["median"])
+            self.assertGreater(result["ops_per_second"], 0)
+        with self.assertRaises(ValueError):
+            run_benchmarks(["nothing"])
+
+    def test_compare_flags_regressions_above_the_threshold(self):
+        baseline = {"benchmarks": {"a": {"median": 1.0}, "b": {"median": 1.0}, "gone": {"median": 1.0}}}
+        results = {"benchmarks": {"a": {"median": 1.1}, "b": {"median": 1.5}, "new": {"median": 1.0}}}
+        rows = {row[0]: row for row in compare(results, baseline, threshold=0.2)}
+        self.assertEqual(set(rows), {"a", "b"})
+        self.assertFalse(rows["a"][4])
+        self.assertTrue(rows["b"][4])
+
+if __name__ == "__main__":
+    unittest.main()
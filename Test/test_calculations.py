@@ -1,11 +1,33 @@
 # tests/test_calculations.py
 import unittest
-from calculations import calculate_footprint, calculate_offset
+from array import array
+import numpy as np
+from calculations import calculate_footprint, calculate_footprint_batch, calculate_offset
 
 class TestCalculations(unittest.TestCase):
     def test_calculate_footprint(self):
         result = calculate_footprint(100, 50, 30, 10, 50, 1000, 8)
-        self.assertAlmostEqual(result, 1234.56, places=2)
+        self.assertAlmostEqual(result["total_emissions"], 1136.13, places=2)
+        self.assertAlmostEqual(result["energy_emissions"], 838.98, places=2)
+        self.assertAlmostEqual(result["waste_emissions"], 8.40, places=2)
+        self.assertAlmostEqual(result["travel_emissions"], 288.75, places=2)
+
+    def test_calculate_footprint_batch_matches_scalar(self):
+        rows = [(100, 50, 30, 10, 50, 1000, 8), (0, 0, 0, 0, 0, 0, 1), (200, 200, 200, 200, 0.02, 2000, 2.0)]
+        columns = [array('d', column) for column in zip(*rows)]
+        result = calculate_footprint_batch(*columns)
+        self.assertEqual(len(result["invalid_rows"]), 0)
+        for i, row in enumerate(rows):
+            expected = calculate_footprint(*row)
+            for key, value in expected.items():
+                self.assertEqual(result[key][i], value)
+
+    def test_calculate_footprint_batch_reports_invalid_rows(self):
+        result = calculate_footprint_batch(np.ones(4), np.ones(4), np.ones(4), np.ones(4),
+                                           np.array([50, 150, 50, -1]), np.ones(4), np.array([8, 8, 0, 8]))
+        self.assertEqual(result["invalid_rows"].tolist(), [1, 2, 3])
+        self.assertTrue(np.isnan(result["total_emissions"][1:]).all())
+        self.assertFalse(np.isnan(result["total_emissions"][0]))
 
     def test_calculate_offset(self):
         result = calculate_offset(1000)
@@ -0,0 +1,47 @@
+# tests/test_charts.py
+import unittest
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from charts import _render_shares_png, breakdown_shares, render_breakdown_png, update_breakdown_pie
+
+class TestCharts(unittest.TestCase):
+    def test_identical_breakdowns_are_rendered_once(self):
+        _render_shares_png.cache_clear()
+        first = render_breakdown_png(500, 300, 200)
+        second = render_breakdown_png(5000, 3000, 2000)  # Same shares, different scale
+        self.assertTrue(first.startswith(b"\x89PNG"))
+        self.assertIs(first, second)
+        info = _render_shares_png.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_breakdown_shares(self):
+        self.assertEqual(breakdown_shares(1, 1, -5), (50.0, 50.0, 0.0))
+        with self.assertRaises(ValueError):
+            breakdown_shares(0, 0, -1)
+
+    def test_update_breakdown_pie_matches_a_fresh_pie(self):
+        def pie(sizes):
+            return Figure().add_subplot(111).pie(sizes, labels=['Energy', 'Waste', 'Travel'], autopct='%1.1f%%',
+                                                 startangle=140, shadow=True)
+
+        updated, fresh = pie([1, 2, 3]), pie([5, 1, 1])
+        self.assertTrue(update_breakdown_pie(*updated, [5, 1, 1]))
+        for wedge, expected in zip(updated[0], fresh[0]):
+            self.assertAlmostEqual(wedge.theta1, expected.theta1, places=4)
+            self.assertAlmostEqual(wedge.theta2, expected.theta2, places=4)
+        for text, expected in zip(updated[1] + updated[2], fresh[1] + fresh[2]):
+            self.assertEqual(text.get_text(), expected.get_text())
+            self.assertEqual(text.get_horizontalalignment(), expected.get_horizontalalignment())
+            for value, expected_value in zip(text.get_position(), expected.get_position()):
+                self.assertAlmostEqual(value, expected_value, places=4)
+
+        axes = updated[0][0].axes
+        self.assertFalse(update_breakdown_pie(*updated, [0, 0, 0]))
+        self.assertEqual(len(axes.patches), 6)  # The wedges and their shadows
+        self.assertFalse(any(artist.get_visible() for artist in (*axes.patches, *updated[1], *updated[2])))
+        self.assertTrue(update_breakdown_pie(*updated, [1, 1, 1]))
+        self.assertTrue(all(patch.get_visible() for patch in axes.patches))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+# tests/test_cli.py
+import io
+import json
+import subprocess
+import sys
+import unittest
+import database
+from helpers import DatabaseTestCase
+from cli import run
+from calculations import calculate_footprint
+
+class TestCli(unittest.TestCase):
+    def test_run_streams_csv_to_jsonl(self):
+        source = io.StringIO("user_id,electricity,gas,fuel,waste,recycling,travel,efficiency\n"
+                             "admin,200,200,200,200,2,2000,2\n"
+                             "bob,1,1,1,1,150,1,1\n"
+                             "carol,1,1,1,1,50,1,0\n"
+                             "dave,100,50,30,10,50,1000,8\n")
+        sink, errors = io.StringIO(), io.StringIO()
+        written, rejected = run(source, sink, "csv", "jsonl", chunk_size=2, errors=errors)
+        self.assertEqual((written, rejected), (2, 2))
+        records = [json.loads(line) for line in sink.getvalue().splitlines()]
+        self.assertEqual([record["user_id"] for record in records], ["admin", "dave"])
+        expected = calculate_footprint(100, 50, 30, 10, 0.5, 1000, 8)
+        self.assertEqual(records[1]["total_emissions"], expected["total_emissions"])
+        self.assertIn("row 3:", errors.getvalue())
+        self.assertIn("row 4:", errors.getvalue())
+
+    def test_cli_does_not_import_gui_stack(self):
+        code = ("import sys, cli; "
+                "print(sorted(m for m in ('customtkinter', 'tkinter', 'matplotlib', 'fpdf') if m in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "[]")
+
+class TestCliSave(DatabaseTestCase):
+    def test_bad_lines_are_rejected_and_rows_without_a_user_are_not_saved(self):
+        row = '{"electricity": 100, "gas": 50, "fuel": 30, "waste": 10, "recycling": 50, "travel": 1000, "efficiency": 8'
+        source = io.StringIO("\n".join([row + ', "user_id": "admin"}', "{not json", "[1, 2]", row + "}",
+                                         row + ', "user_id": "bob"}']) + "\n")
+        sink, errors = io.StringIO(), io.StringIO()
+        written, rejected = run(source, sink, "jsonl", "jsonl", chunk_size=2, save=True, errors=errors)
+        self.assertEqual((written, rejected), (2, 3))
+        self.assertEqual([line.split(":")[0] for line in errors.getvalue().splitlines()], ["row 2", "row 3", "row 4"])
+        self.assertIn("Invalid JSON", errors.getvalue())
+        self.assertEqual(database.get_connection().execute("SELECT COUNT(*) FROM footprints").fetchone()[0], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,274 @@
+# tests/test_database.py
+import os
+import sqlite3
+import threading
+import unittest
+from datetime import date
+from unittest import mock
+import calculations
+import database
+from helpers import DatabaseTestCase
+
+class TestConnections(DatabaseTestCase):
+    def test_connection_is_reused_per_thread(self):
+        conn = database.get_connection()
+        self.assertIs(database.get_connection(), conn)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(database.get_connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+    def test_pragmas_are_applied(self):
+        conn = database.get_connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+
+    def test_save_and_users(self):
+        database.save_to_db("admin", 200, 200, 200, 200, 0.02, 2000, 2, 9259.44)
+        count = database.get_connection().execute("SELECT COUNT(*) FROM footprints").fetchone()[0]
+        self.assertEqual(count, 1)
+
+        database.register_user("alice", "secret")
+        self.assertTrue(database.authenticate_user("alice", "secret"))
+        self.assertFalse(database.authenticate_user("alice", "wrong"))
+        with self.assertRaises(sqlite3.IntegrityError):
+            database.register_user("alice", "again")
+
+class TestRollups(DatabaseTestCase):
+    def test_rollups_follow_inserts_and_backfill(self):
+        database.save_to_db("admin", 100, 0, 0, 0, 0, 0, 1, 10.0)
+        database.save_to_db("admin", 300, 0, 0, 0, 0, 0, 1, 30.0)
+        database.save_to_db("bob", 50, 0, 0, 0, 0, 0, 1, 5.0)
+
+        (month,) = database.get_monthly_rollups("admin")
+        self.assertEqual(month["row_count"], 2)
+        self.assertEqual(month["footprint_sum"], 40.0)
+        self.assertEqual((month["electricity_min"], month["electricity_max"]), (100, 300))
+
+        before = database.get_monthly_rollups("admin")
+        database.backfill_rollups()
+        self.assertEqual(database.get_monthly_rollups("admin"), before)
+        self.assertEqual(database.get_annual_totals("bob")[0][1:], (1, 5.0))
+
+class TestTimestamps(DatabaseTestCase):
+    def test_migrate_timestamps_is_chunked_and_resumable(self):
+        conn = database.get_connection()
+        with conn:
+            conn.executemany("INSERT INTO footprints (user_id, footprint, date) VALUES (?, ?, ?)",
+                             [("admin", float(i), f"2025-0{1 + i % 3}-15") for i in range(7)])
+        self.assertEqual(database.migrate_timestamps(chunk_size=3), 7)
+        self.assertEqual(database.migrate_timestamps(chunk_size=3), 0)  # Nothing left to resume
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM footprints WHERE ts IS NULL").fetchone()[0], 0)
+
+        february = database.get_footprint_range("admin", date(2025, 2, 1), date(2025, 3, 1))
+        self.assertEqual([row[2] for row in february], [1.0, 4.0])
+
+    def test_keyset_pagination_visits_every_row_once(self):
+        for i in range(5):
+            database.save_to_db("admin", i, 0, 0, 0, 0, 0, 1, float(i))
+        seen, cursor = [], None
+        while True:
+            rows, cursor = database.get_footprint_page("admin", after=cursor, limit=2)
+            seen.extend(row[0] for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), 5)
+
+    def test_page_limit_must_be_positive(self):
+        for limit in (0, -1):
+            with self.assertRaises(ValueError):
+                database.get_footprint_page("admin", limit=limit)
+
+class TestWriteQueue(DatabaseTestCase):
+    def test_rows_are_group_committed(self):
+        writer = database.FootprintWriteQueue(batch_size=10, flush_ms=10000)
+        for i in range(25):
+            writer.put("admin", i, 0, 0, 0, 0, 0, 1, float(i))
+        self.assertTrue(writer.flush(timeout=5))
+        stats = writer.stats()
+        self.assertEqual(stats["rows_written"], 25)
+        self.assertEqual(stats["commits"], 3)  # Two full batches plus the flush
+        writer.close()
+
+        count = database.get_connection().execute("SELECT COUNT(*) FROM footprints").fetchone()[0]
+        self.assertEqual(count, 25)
+
+    def test_close_flushes_pending_rows(self):
+        writer = database.FootprintWriteQueue(batch_size=1000, flush_ms=10000)
+        writer.put("admin", 1, 1, 1, 1, 0.5, 1, 1, 1.0)
+        writer.close(timeout=5)
+        count = database.get_connection().execute("SELECT COUNT(*) FROM footprints").fetchone()[0]
+        self.assertEqual(count, 1)
+        with self.assertRaises(RuntimeError):
+            writer.put("admin", 1, 1, 1, 1, 0.5, 1, 1, 1.0)
+
+    def test_flush_times_out_when_the_queue_is_full(self):
+        writer = database.FootprintWriteQueue(batch_size=1, flush_ms=10000, max_pending=1)
+        release = threading.Event()
+        commit = writer._commit
+        writer._commit = lambda batch: (release.wait(5), commit(batch))  # Hold the writer on the first row
+        writer.put("admin", 1, 1, 1, 1, 0.5, 1, 1, 1.0)
+        writer.put("admin", 2, 1, 1, 1, 0.5, 1, 1, 2.0, timeout=5)  # Fills the queue
+        self.assertFalse(writer.flush(timeout=0.05))
+        release.set()
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(writer.stats()["rows_written"], 2)
+        writer.close()
+
+class TestRecompute(DatabaseTestCase):
+    INPUTS = [(100 + i, 50, 30 + i, 10, 0.5, 1000, 8) for i in range(25)]
+
+    def setUp(self):
+        super().setUp()
+        database.save_footprints((f"user{i % 4}", *row, calculations.calculate_footprint(*row)["total_emissions"])
+                                 for i, row in enumerate(self.INPUTS))
+        conn = database.get_connection()
+        with conn:
+            conn.execute("INSERT INTO footprints (user_id, efficiency, footprint, date) VALUES ('legacy', 0, 1.0, '2020-01-01')")
+        database.backfill_rollups()
+        database.rebuild_sketches()
+
+    def stored(self):
+        return database.get_connection().execute(
+            "SELECT footprint, factor_version FROM footprints WHERE user_id != 'legacy' ORDER BY id").fetchall()
+
+    def test_rows_record_their_factor_version(self):
+        version = database.factor_version()
+        self.assertEqual({row[1] for row in self.stored()}, {version})
+        self.assertEqual(database.count_stale_footprints(), 1)  # The row saved before versioning
+        database.setup_database()
+        self.assertEqual(len(database.get_factor_sets()), 1)  # Unchanged factors keep their version
+
+    def test_recompute_is_resumable_and_keeps_rollups_and_sketches(self):
+        with mock.patch.object(calculations, "CO2_PER_LITER_FUEL", 2.5):
+            database.setup_database()
+            self.assertEqual(len(database.get_factor_sets()), 2)
+            self.assertEqual(database.count_stale_footprints(), 26)
+
+            def interrupt(done):
+                raise KeyboardInterrupt
+            with self.assertRaises(KeyboardInterrupt):
+                database.recompute_footprints(chunk_size=10, progress=interrupt)
+            self.assertEqual(database.count_stale_footprints(), 16)
+
+            # Saves are not held up while the job runs
+            def save_meanwhile(done):
+                thread = threading.Thread(target=database.save_to_db, args=("user9", 1, 1, 1, 1, 0.5, 1, 8, 5.0))
+                thread.start()
+                thread.join(timeout=5)
+                self.assertFalse(thread.is_alive())
+            summary = database.recompute_footprints(chunk_size=10, progress=save_meanwhile)
+            self.assertEqual((summary["rows"], summary["skipped"]), (15, 1))  # The legacy row fails validation
+
+            expected = [calculations.calculate_footprint(*row)["total_emissions"] for row in self.INPUTS]
+            stored = self.stored()[:len(self.INPUTS)]
+            self.assertEqual([row[0] for row in stored], expected)
+            self.assertEqual({row[1] for row in stored}, {database.factor_version()})
+
+        rollups = {user: database.get_monthly_rollups(user) for user in ("user0", "user1")}
+        sketches = database.get_connection().execute(
+            "SELECT name, bucket, count FROM footprint_sketch WHERE count != 0 ORDER BY name, bucket").fetchall()
+        database.backfill_rollups()
+        database.rebuild_sketches()
+        self.assertEqual({user: database.get_monthly_rollups(user) for user in rollups}, rollups)
+        self.assertEqual(database.get_connection().execute(
+            "SELECT name, bucket, count FROM footprint_sketch WHERE count != 0 ORDER BY name, bucket").fetchall(),
+            sketches)
+
+    def test_returning_factor_set_is_recomputed_from_the_start(self):
+        def interrupt(done):
+            raise KeyboardInterrupt
+
+        def switch(fuel, progress=None):
+            with mock.patch.object(calculations, "CO2_PER_LITER_FUEL", fuel):
+                database.setup_database()
+                return database.recompute_footprints(chunk_size=10, progress=progress)["rows"]
+        original = calculations.CO2_PER_LITER_FUEL
+        self.assertEqual(switch(2.5), 25)
+        self.assertEqual(switch(original), 25)
+        self.assertEqual(len(database.get_factor_sets()), 2)  # The first set came back under its version
+        with self.assertRaises(KeyboardInterrupt):
+            switch(2.5, interrupt)  # Leaves a run under the second set unfinished
+        self.assertEqual(switch(original), 10)
+        self.assertEqual(switch(2.5), 25)  # Not resumed from the old checkpoint
+        with mock.patch.object(calculations, "CO2_PER_LITER_FUEL", 2.5):
+            self.assertEqual(database.count_stale_footprints(), 1)  # Only the invalid legacy row
+
+class TestShards(DatabaseTestCase):
+    SHARD_COUNT = 4
+    USERS = [f"user{i}" for i in range(12)]
+
+    def save_history(self):
+        for i in range(3):
+            database.save_footprints((user, i, 0, 0, 0, 0, 0, 1, float(i)) for user in self.USERS)
+
+    def shard_counts(self):
+        return {os.path.basename(path): database.get_connection(path).execute(
+            "SELECT COUNT(*) FROM footprints").fetchone()[0] for path in database.shard_paths()}
+
+    def test_rows_are_routed_by_user(self):
+        self.assertEqual(database.shard_count(), 4)
+        self.save_history()
+        database.save_to_db("user0", 9, 0, 0, 0, 0, 0, 1, 9.0)
+        counts = self.shard_counts()
+        self.assertEqual(sum(counts.values()), 37)
+        self.assertGreater(sum(1 for count in counts.values() if count), 1)
+        for user in self.USERS:
+            owner = database.get_connection(database.shard_path(user))
+            self.assertEqual(owner.execute("SELECT COUNT(*) FROM footprints WHERE user_id = ?",
+                                           (user,)).fetchone()[0], 4 if user == "user0" else 3)
+
+        self.assertEqual([row[2] for row in database.get_footprint_range("user0", 0, 1 << 62)], [0.0, 1.0, 2.0, 9.0])
+        self.assertEqual(database.get_annual_totals("user5")[0][1:], (3, 3.0))
+        latest = list(database.iter_latest_footprints())
+        self.assertEqual([row[1] for row in latest], sorted(self.USERS))
+        self.assertEqual(latest[0][9], 9.0)
+        self.assertEqual([row[1] for row in database.iter_latest_footprints(["user7", "user2"])], ["user2", "user7"])
+
+    def test_write_queue_commits_per_shard(self):
+        writer = database.FootprintWriteQueue(batch_size=100, flush_ms=10000)
+        for user in self.USERS:
+            writer.put(user, 1, 0, 0, 0, 0, 0, 1, 1.0)
+        writer.close(timeout=5)
+        self.assertEqual(writer.stats()["rows_written"], len(self.USERS))
+        self.assertEqual(sum(self.shard_counts().values()), len(self.USERS))
+
+    def test_rebalance_moves_rows_and_rollups(self):
+        self.save_history()
+        before = {user: database.get_monthly_rollups(user) for user in self.USERS}
+        pages = {user: [row[1:] for row in database.get_footprint_page(user, limit=10)[0]] for user in self.USERS}
+
+        self.assertGreater(database.rebalance_shards(3, chunk_size=2), 0)
+        self.assertEqual(database.shard_count(), 3)
+        self.assertFalse(os.path.exists(database._shard_file(3)))  # Drained shard removed
+        self.assertEqual(sum(self.shard_counts().values()), 36)
+        self.assertEqual((database.get_percentile_rank(2.0), database.get_percentile_rank(3.0)), (0.5, 1.0))  # Sketches follow the moved users
+        for user in self.USERS:
+            self.assertEqual(database.get_monthly_rollups(user), before[user])
+            self.assertEqual([row[1:] for row in database.get_footprint_page(user, limit=10)[0]], pages[user])
+
+        # Back into the main file; the layout is remembered across restarts
+        database.rebalance_shards(0)
+        database.setup_database()
+        self.assertEqual(database.shard_count(), 0)
+        self.assertEqual(database.get_connection().execute("SELECT COUNT(*) FROM footprints").fetchone()[0], 36)
+        self.assertEqual(database.backfill_rollups(), len(self.USERS))
+
+    def test_interrupted_rebalance_blocks_startup_until_finished(self):
+        self.save_history()
+        conn = database.get_connection()
+        with conn:
+            conn.execute("UPDATE shard_layout SET target_count = 2")
+        with self.assertRaises(RuntimeError):
+            database.setup_database()
+        with self.assertRaises(RuntimeError):
+            database.rebalance_shards(5)
+        database.rebalance_shards(2)
+        database.setup_database()
+        self.assertEqual(sum(self.shard_counts().values()), 36)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# tests/test_export.py
+import json
+import os
+import unittest
+import numpy as np
+import database
+from helpers import DatabaseTestCase
+from export import export_footprints, iter_npy_parts
+
+class ExportTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.export_dir = os.path.join(self.tmpdir.name, "export")
+
+    def save(self, count, user="alice"):
+        for index in range(count):
+            database.save_to_db(user, index, 50, 30, 10, 0.5, 1000, 8, 100.0 + index)
+
+class TestExport(ExportTestCase):
+
+    def test_chunks_and_watermark(self):
+        self.save(5)
+        summary = export_footprints(self.export_dir, chunk_size=2)
+        self.assertEqual((summary["rows"], summary["watermark"]), (5, 5))
+        with open(os.path.join(self.export_dir, "manifest.json"), encoding="utf-8") as file:
+            manifest = json.load(file)
+        self.assertEqual([part["rows"] for part in manifest["parts"]], [2, 2, 1])
+
+        # Only rows added since the last export are written by the next run
+        self.save(3, user="bob")
+        self.assertEqual(export_footprints(self.export_dir, chunk_size=2)["rows"], 3)
+        self.assertEqual(export_footprints(self.export_dir, chunk_size=2)["rows"], 0)
+
+        parts = list(iter_npy_parts(self.export_dir))
+        ids = np.concatenate([part["id"] for part in parts])
+        self.assertEqual(ids.tolist(), list(range(1, 9)))
+        self.assertIsInstance(parts[0]["footprint"], np.memmap)
+        users = np.concatenate([part["user_id"] for part in parts])
+        self.assertEqual(users.tolist(), ["alice"] * 5 + ["bob"] * 3)
+        self.assertEqual(parts[0]["electricity"].tolist(), [0.0, 1.0])
+
+    def test_full_export_and_users_snapshot(self):
+        self.save(3)
+        database.register_user("carol", "secret")
+        export_footprints(self.export_dir, chunk_size=2)
+        summary = export_footprints(self.export_dir, chunk_size=10, include_users=True, full=True)
+        self.assertEqual(summary["rows"], 3)
+        self.assertEqual(len(list(iter_npy_parts(self.export_dir))), 1)
+        users_dir = os.path.join(self.export_dir, "users")
+        self.assertEqual(sorted(os.listdir(users_dir)), ["id.npy", "is_admin.npy"])  # No passwords
+        self.assertEqual(np.load(os.path.join(users_dir, "id.npy")).tolist(), ["carol"])
+
+    def test_format_cannot_change_without_full(self):
+        self.save(1)
+        export_footprints(self.export_dir)
+        with self.assertRaises(ValueError):
+            export_footprints(self.export_dir, file_format="arrow")
+        with self.assertRaises(ValueError):
+            export_footprints(self.export_dir, file_format="csv")
+
+class TestShardedExport(ExportTestCase):
+    SHARD_COUNT = 3
+
+    def test_sharded_export_keeps_a_watermark_per_shard(self):
+        for user in ("alice", "bob", "carol", "dave"):
+            self.save(2, user)
+        summary = export_footprints(self.export_dir, chunk_size=10)
+        self.assertEqual(summary["rows"], 8)
+        self.assertEqual(sorted(summary["watermark"]), sorted(
+            os.path.basename(path) for path in {database.shard_path(user) for user in ("alice", "bob", "carol", "dave")}))
+        self.save(1, "bob")
+        self.assertEqual(export_footprints(self.export_dir)["rows"], 1)
+
+        database.rebalance_shards(2)
+        with self.assertRaises(ValueError):
+            export_footprints(self.export_dir)
+        self.assertEqual(export_footprints(self.export_dir, full=True)["rows"], 9)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# tests/test_history.py
+import math
+import unittest
+from datetime import datetime
+import database
+from helpers import DatabaseTestCase
+from calculations import FootprintResult, calculate_footprint
+from history import FootprintHistory, load_history
+
+class TestFootprintResult(unittest.TestCase):
+    def test_matches_the_dictionary(self):
+        inputs = (100, 50, 30, 10, 0.5, 1000, 8)
+        result = FootprintResult.calculate(*inputs)
+        self.assertEqual(result.as_dict(), calculate_footprint(*inputs))
+        self.assertEqual(result["waste_emissions"], result.waste_emissions)
+        self.assertFalse(hasattr(result, "__dict__"))
+        with self.assertRaises(KeyError):
+            result["trees_needed"]
+
+class TestFootprintHistory(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        conn = database.get_connection()
+        rows = []
+        for index in range(30):
+            day = datetime(2025, 1 + index % 3, 1 + index % 20, 12)
+            rows.append((f"user{index % 2}", 100 + index, 50, 30, 10, 0.5, 1000, 8, float(index),
+                         day.strftime("%Y-%m-%d"), database.to_timestamp(day), database.factor_version()))
+        rows.append(("user2", 1, 1, 1, 1, 0.5, 1, 8, None, "2025-03-05",
+                     database.to_timestamp(datetime(2025, 3, 5)), database.factor_version()))
+        with conn:
+            database._insert_footprints(conn, rows)
+
+    def test_aggregates_match_the_rollups(self):
+        history = load_history(["user0", "user1", "user2"], chunk_size=7)
+        self.assertEqual(len(history), 31)
+        self.assertEqual(history.nbytes, 31 * 88)
+        self.assertEqual(history.aggregate("footprint", "sum"), sum(range(30)))
+        self.assertEqual(history.aggregate("footprint", "count"), 30)  # Missing totals are skipped
+        self.assertEqual(history.aggregate("electricity", "max"), 129)
+        self.assertEqual(history.by_user("footprint", "count"), {"user0": 15, "user1": 15, "user2": 0})
+        self.assertEqual(history.by_user("footprint", "mean")["user1"], 15.0)
+        user1 = load_history("user1")
+        self.assertEqual(user1.ts.tolist(), sorted(user1.ts.tolist()))  # Each user's rows in time order
+        for month in database.get_monthly_rollups("user1"):
+            self.assertAlmostEqual(user1.by_month("footprint", "sum")[month["month"]], month["footprint_sum"])
+            self.assertEqual(user1.by_month("footprint", "min")[month["month"]], month["footprint_min"])
+            self.assertEqual(user1.by_month("gas", "count")[month["month"]], month["row_count"])
+        with self.assertRaises(ValueError):
+            history.aggregate("footprint", "median")
+
+    def test_load_everything_and_ranges(self):
+        everything = load_history()
+        self.assertEqual(sorted(everything.ids.tolist()), list(range(1, 32)))
+        january = load_history(start=datetime(2025, 1, 1), end=datetime(2025, 2, 1))
+        self.assertEqual(list(january.by_month("footprint", "count")), ["2025-01"])
+        self.assertEqual(len(load_history(["user0", "user1", "user2"], datetime(2025, 1, 1), datetime(2025, 2, 1))),
+                         len(january))
+        self.assertTrue(math.isnan(FootprintHistory.from_rows([]).aggregate("footprint", "mean")))
+
+    def test_components_recalculate_every_row(self):
+        history = load_history("user0")
+        components = history.components()
+        self.assertEqual(components["energy_emissions"][0],
+                         calculate_footprint(*(history.values[name][0] for name in
+                                               ("electricity", "gas", "fuel", "waste", "recycling", "travel",
+                                                "efficiency")))["energy_emissions"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+# tests/test_history_view.py
+import unittest
+import database
+from helpers import DatabaseTestCase
+from history_view import HistoryPages, read_first_pages, read_pages, row_inputs
+
+class TestHistoryPaging(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        database.save_footprints((f"user{index % 2}", index, 50, 30, 10, 0.25, 1000, 8, float(index))
+                                 for index in range(50))
+
+    def test_keyset_pages_are_newest_first(self):
+        self.assertEqual(database.count_user_footprints("user0"), 25)
+        first = database.get_history_page("user0", limit=10)
+        second = database.get_history_page("user0", first[-1][0], limit=10)
+        self.assertEqual([row[2] for row in first + second], list(range(48, 8, -2)))
+        total, pages = read_first_pages("user0", 5, 10)
+        self.assertEqual((total, sorted(pages), len(pages[2])), (25, [0, 1, 2], 5))  # Stops at the end
+        self.assertEqual(read_pages("user0", 1, first[-1][0], 1, 10), {1: second})
+        with self.assertRaises(ValueError):
+            database.get_history_page("user0", limit=-1)  # SQLite would read it as no limit
+
+    def test_pages_are_requested_around_the_visible_rows(self):
+        pages = HistoryPages(page_size=10, cache_pages=3, prefetch=1)
+        pages.reset(database.count_user_footprints("user0"))
+        self.assertIsNone(pages.row(0))
+        request = pages.next_load(0, 4)
+        self.assertEqual(request, (0, None, 0))
+        self.assertIsNone(pages.next_load(0, 4))  # Page 1 waits for page 0's cursor
+        pages.store(pages.generation, read_pages("user0", *request, 10))
+        pages.release(pages.generation, 0, 0)
+        self.assertEqual(pages.row(0)[2], 48)
+        self.assertEqual(pages.next_load(0, 4)[::2], (1, 1))  # Prefetch of the next page
+        pages.release(pages.generation, 1, 1)  # Its read failed
+
+        # Jumping to the end reads the pages in between, then keeps only the newest cache_pages
+        request = pages.next_load(20, 24)
+        self.assertEqual(request[::2], (1, 2))
+        generation = pages.generation
+        pages.store(generation, read_pages("user0", *request, 10))
+        pages.release(generation, 1, 2)
+        self.assertEqual(pages.row(24)[2], 0)
+        self.assertIsNone(pages.next_load(20, 24))
+
+        pages.reset(26)  # Reads started before a reset are dropped
+        pages.store(generation, read_pages("user0", 0, None, 0, 10))
+        self.assertIsNone(pages.row(0))
+
+    def test_row_inputs_restore_the_entry_texts(self):
+        row = database.get_history_page("user1", limit=1)[0]
+        self.assertEqual(row_inputs(row), ["49", "50", "30", "10", "25", "1000", "8"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+# tests/test_main.py
+import unittest
+from main import compute_footprint, parse_inputs
+
+RAW = ("100", "50", "80", "20", "50", "100", "8")
+
+class TestLiveCalculation(unittest.TestCase):
+    def test_parse_inputs_converts_recycling_to_decimal(self):
+        self.assertEqual(parse_inputs(*RAW), (100.0, 50.0, 80.0, 20.0, 0.5, 100.0, 8.0))
+        with self.assertRaises(ValueError):
+            parse_inputs("100", "50", "80", "20", "150", "100", "8")
+        with self.assertRaises(ValueError):
+            parse_inputs("100", "50", "80", "20", "50", "100", "0")
+        with self.assertRaises(ValueError):
+            parse_inputs("", "50", "80", "20", "50", "100", "8")
+
+    def test_compute_footprint_is_memoized(self):
+        compute_footprint.cache_clear()
+        first = compute_footprint(RAW)
+        second = compute_footprint(RAW)
+        self.assertIs(first, second)
+        self.assertEqual(compute_footprint.cache_info().misses, 1)
+        self.assertAlmostEqual(first[1]["total_emissions"], 2395.455, places=3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# tests/test_metrics.py
+import json
+import os
+import tempfile
+import time
+import unittest
+import metrics
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.stop_profiler()
+        metrics.disable()
+        metrics.reset()
+
+    def test_timed_records_histograms_and_errors(self):
+        @metrics.timed("decorated")
+        def work(value):
+            return value * 2
+
+        self.assertEqual(work(21), 42)
+        with self.assertRaises(ValueError):
+            with metrics.timed("failing"):
+                raise ValueError("boom")
+        metrics.count("saved", 3)
+
+        data = metrics.snapshot()
+        self.assertEqual(data["stages"]["decorated"]["count"], 1)
+        self.assertEqual(data["stages"]["failing"]["buckets"]["+Inf"], 1)
+        self.assertEqual(data["counters"], {"failing_errors": 1, "saved": 3})
+
+    def test_disabled_collects_nothing(self):
+        metrics.disable()
+        with metrics.timed("ignored"):
+            pass
+        metrics.count("ignored")
+        self.assertEqual(metrics.snapshot()["stages"], {})
+        self.assertEqual(metrics.snapshot()["counters"], {})
+
+    def test_quantiles_use_bucket_bounds(self):
+        for seconds in (0.0008, 0.0009, 0.003, 0.2):
+            metrics.observe("stage", seconds)
+        stage = metrics.snapshot()["stages"]["stage"]
+        self.assertEqual(stage["p50"], 0.001)
+        self.assertEqual(stage["p99"], 0.2)
+        self.assertEqual(stage["buckets"]["0.001"], 2)
+
+    def test_write_metrics(self):
+        metrics.observe("calculate", 0.002)
+        with tempfile.TemporaryDirectory() as directory:
+            prom = os.path.join(directory, "metrics.prom")
+            metrics.write_metrics(prom)
+            with open(prom, encoding="utf-8") as file:
+                text = file.read()
+            self.assertIn('carbon_stage_seconds_bucket{stage="calculate",le="0.0025"} 1', text)
+            self.assertIn('carbon_stage_seconds_count{stage="calculate"} 1', text)
+
+            path = os.path.join(directory, "metrics.json")
+            metrics.write_metrics(path)
+            with open(path, encoding="utf-8") as file:
+                self.assertEqual(json.load(file)["stages"]["calculate"]["count"], 1)
+
+    def test_profiler_keeps_the_slowest_requests(self):
+        metrics.start_profiler(interval=0.001, keep=2)
+        for seconds in (0.01, 0.05, 0.03):
+            with metrics.timed("request"):
+                with metrics.timed("inner"):  # Nested stages are part of the outer request
+                    time.sleep(seconds)
+        with tempfile.TemporaryDirectory() as directory:
+            paths = metrics.dump_profiles(directory)
+            self.assertEqual(len(paths), 2)
+            self.assertTrue(os.path.basename(paths[0]).startswith("01_request_"))
+            with open(paths[0], encoding="utf-8") as file:
+                self.assertIn("test_profiler_keeps_the_slowest_requests", file.read())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+# tests/test_recommendations.py
+import unittest
+import numpy as np
+from benchmark import synthetic_rows
+from pdf_generator import report_lines
+from recommendations import (RULES, compile_rules, provide_recommendations, recommend_batch, rule_counts,
+                             rule_messages)
+
+MESSAGES = {name: recommendation for name, _, recommendation in RULES}
+
+class TestRules(unittest.TestCase):
+    def test_rules_follow_the_breakdown(self):
+        # Fuel-heavy, with long trips in an inefficient vehicle
+        lines = provide_recommendations(50, 20, 200, 10, 0.5, 20000, 12)
+        self.assertIn(MESSAGES["public_transport"], lines)
+        self.assertIn(MESSAGES["efficient_vehicle"], lines)
+        self.assertIn(MESSAGES["video_conferencing"], lines)
+        self.assertNotIn(MESSAGES["renewable_electricity"], lines)
+
+        self.assertEqual(provide_recommendations(10, 10, 10, 1, 0.9, 10, 5), [MESSAGES["doing_well"]])
+        # Nothing specific applies to a large footprint: the fallback rule does
+        self.assertEqual(provide_recommendations(0, 0, 149, 0, 0, 6000, 8), [MESSAGES["largest_source"]])
+
+    def test_batch_matches_scalar(self):
+        rows = synthetic_rows(2000) + [(1, 1, 1, 1, 0.5, 1, 0)]  # The last row is invalid
+        masks = recommend_batch(*[np.array(column) for column in zip(*rows)])
+        self.assertEqual(masks.dtype, np.uint64)
+        for row, mask in zip(rows[:-1], masks):
+            self.assertEqual(rule_messages(mask), provide_recommendations(*row))
+        self.assertEqual(masks[-1], 0)
+        counts = rule_counts(masks)
+        self.assertEqual(list(counts), [name for name, _, _ in RULES])
+        self.assertEqual(counts["doing_well"], sum(MESSAGES["doing_well"] in rule_messages(m) for m in masks))
+
+    def test_custom_rules_and_validation(self):
+        rules = compile_rules([("gas_over_electricity", [("gas", ">", "electricity")], "gas"),
+                               ("otherwise", [], "other")])
+        self.assertEqual(provide_recommendations(1, 2, 0, 0, 0, 0, 5, rules=rules), ["gas"])
+        self.assertEqual(rule_messages(recommend_batch([2], [1], [0], [0], [0], [0], [5], rules=rules)[0], rules),
+                         ["other"])
+        with self.assertRaises(ValueError):
+            compile_rules([("typo", [("totl_emissions", ">", 1)], "x")])
+        with self.assertRaises(ValueError):
+            compile_rules([("operator", [("gas", "=>", 1)], "x")])
+
+    def test_reports_default_to_the_rules(self):
+        lines = report_lines("admin", 10, 10, 10, 1, 0.9, 10, 5, 300.0, 290.0, 5.0, 5.0, None)
+        self.assertEqual(lines[-1], MESSAGES["doing_well"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+# tests/test_reports.py
+import io
+import os
+import re
+import unittest
+import zlib
+from PIL import Image
+import database
+from helpers import DatabaseTestCase
+from pdf_generator import ConsolidatedReportWriter
+from reports import export_consolidated_pdf, generate_all_reports
+
+class TestReports(DatabaseTestCase):
+    def test_one_report_per_user_from_latest_row(self):
+        database.save_to_db("admin", 200, 200, 200, 200, 0.02, 2000, 2, 9259.44)
+        database.save_to_db("admin", 100, 50, 30, 10, 0.5, 1000, 8, 1000.0)
+        database.save_to_db("bob/x", 1, 1, 1, 1, 0.1, 1, 1, 36.0)
+        output_dir = os.path.join(self.tmpdir.name, "reports")
+
+        summary = generate_all_reports(output_dir, workers=2, batch_size=1)
+        self.assertEqual(summary["reports"], 2)
+        self.assertEqual(summary["failures"], [])
+        self.assertGreater(summary["stages"]["pdf"], 0)
+        self.assertEqual(sorted(os.listdir(output_dir)), ["admin_report.pdf", "bob_x_report.pdf"])
+
+    def test_consolidated_pdf_embeds_shared_assets_once(self):
+        database.save_to_db("alice", 100, 50, 30, 10, 0.5, 1000, 8, 0.0)
+        database.save_to_db("bob", 200, 100, 60, 20, 0.5, 2000, 8, 0.0)  # Same shares as alice
+        database.save_to_db("carol", 1, 1, 1, 1, 0.1, 1, 1, 0.0)
+        file_path = os.path.join(self.tmpdir.name, "all.pdf")
+
+        summary = export_consolidated_pdf(file_path)
+        self.assertEqual((summary["pages"], summary["failures"]), (3, []))
+        with open(file_path, "rb") as f:
+            data = f.read()
+        self.assertTrue(data.startswith(b"%PDF-1.4") and data.rstrip().endswith(b"%%EOF"))
+        self.assertIn(b"/Count 3", data)
+        self.assertEqual(data.count(b"/Subtype /Image"), 2)
+        self.assertEqual(data.count(b"/BaseFont /Helvetica"), 1)
+
+    def test_long_reports_continue_on_more_pages(self):
+        image = io.BytesIO()
+        Image.new("RGB", (80, 60), "white").save(image, "PNG")
+        file_path = os.path.join(self.tmpdir.name, "long.pdf")
+        with ConsolidatedReportWriter(file_path) as writer:
+            for count in (40, 36):  # 53 lines: chart below the text; 49 lines: chart on a page of its own
+                writer.add_page("alice", 100, 50, 30, 10, 0.5, 1000, 8, 1.0, 1.0, 1.0, 1.0,
+                                [f"Recommendation {index}" for index in range(count)], image.getvalue())
+        self.assertEqual(writer.page_count, 6)
+        with open(file_path, "rb") as f:
+            data = f.read()
+        self.assertIn(b"/Count 6", data)
+        streams = [zlib.decompress(stream) for stream in
+                   re.findall(rb"/Filter /FlateDecode /Length \d+ >>\nstream\n(.*?)\nendstream", data, re.S)]
+        pages = [stream for stream in streams if stream.startswith(b"/Hdr Do")]
+        self.assertEqual([page.count(b" Tj") for page in pages], [25, 25, 3, 25, 24, 0])
+        bottom = 20 * ConsolidatedReportWriter.MM
+        for page in pages:
+            self.assertTrue(all(float(y) > bottom for y in re.findall(rb" ([\d.]+) Tm", page)))
+            for height, y in re.findall(rb"q [\d.]+ 0 0 ([\d.-]+) [\d.]+ ([\d.-]+) cm", page):
+                self.assertGreater(float(height), 0)
+                self.assertGreaterEqual(float(y), 0)
+        self.assertEqual([b"/Im Do" in page for page in pages], [False, False, True, False, False, True])
+
+if __name__ == "__main__":
+    unittest.main()
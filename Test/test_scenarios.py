@@ -0,0 +1,45 @@
+# tests/test_scenarios.py
+import unittest
+import numpy as np
+from calculations import calculate_footprint
+from recommendations import scenario_recommendations
+from scenarios import apply_levers, optimize_reduction, pareto_front, sweep_scenarios
+
+INPUTS = (100, 50, 80, 20, 0.5, 10000, 8)
+
+class TestScenarios(unittest.TestCase):
+    def test_sweep_matches_calculate_footprint(self):
+        sweep = sweep_scenarios(*INPUTS, steps=3)
+        self.assertEqual(len(sweep["total_emissions"]), 27)
+        inputs = dict(zip(["electricity", "gas", "fuel", "waste", "recycling", "travel", "efficiency"], INPUTS))
+        for index in (0, 13, 26):
+            changes = {name: sweep[name][index] for name in ("efficiency", "recycling", "travel")}
+            expected = calculate_footprint(**apply_levers(inputs, changes))["total_emissions"]
+            self.assertAlmostEqual(sweep["total_emissions"][index], expected, places=6)
+
+    def test_pareto_front_drops_dominated_scenarios(self):
+        rng = np.random.default_rng(0)
+        footprints, efforts = rng.random(500), rng.random(500)
+        front = set(pareto_front(footprints, efforts).tolist())
+        for index in range(500):
+            dominated = np.any((footprints <= footprints[index]) & (efforts <= efforts[index]) &
+                               ((footprints < footprints[index]) | (efforts < efforts[index])))
+            self.assertEqual(index in front, not dominated)
+
+    def test_best_scenario_is_the_cheapest_that_meets_the_target(self):
+        baseline = calculate_footprint(*INPUTS)["total_emissions"]
+        result = optimize_reduction(*INPUTS, target=baseline * 0.9)
+        best = result["best"]
+        self.assertLessEqual(best["total_emissions"], baseline * 0.9)
+        sweep = sweep_scenarios(*INPUTS)
+        meets = sweep["total_emissions"] <= baseline * 0.9
+        self.assertAlmostEqual(best["effort"], sweep["effort"][meets].min())
+        self.assertIsNone(optimize_reduction(*INPUTS, target=0)["best"])
+
+    def test_scenario_recommendations(self):
+        self.assertEqual(scenario_recommendations(*INPUTS),
+                         ("- To reach 4203 kgCO2 with the least effort: cut business travel by 38%.",))
+        self.assertEqual(scenario_recommendations(0, 0, 0, 0, 0, 0, 8), ())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# tests/test_server.py
+import asyncio
+import json
+import unittest
+from unittest import mock
+import database
+from helpers import DatabaseTestCase
+from server import FootprintServer
+
+INPUTS = {"electricity": 100, "gas": 50, "fuel": 30, "waste": 10, "recycling": 50, "travel": 1000, "efficiency": 8}
+
+async def request(port, method, path, body=b"", headers=(), chunked=False):
+    """Send one request and return (status, headers, body), decoding chunked responses."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = [f"{method} {path} HTTP/1.1", "Host: localhost", "Connection: close", *headers]
+    if chunked:
+        head.append("Transfer-Encoding: chunked")
+        pieces = [body[i:i + 7] for i in range(0, len(body), 7)]
+        body = b"".join(f"{len(p):x}\r\n".encode() + p + b"\r\n" for p in pieces) + b"0\r\n\r\n"
+    else:
+        head.append(f"Content-Length: {len(body)}")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        response_headers[name.lower()] = value.strip()
+    if response_headers.get("transfer-encoding") == "chunked":
+        data = b""
+        while size := int(await reader.readline(), 16):
+            data += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        data = await reader.readexactly(int(response_headers["content-length"]))
+    writer.close()
+    return status, response_headers, data
+
+class TestServer(DatabaseTestCase, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await FootprintServer("127.0.0.1", 0, chunk_size=2).start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_single_footprint(self):
+        status, _, body = await request(self.server.port, "POST", "/footprint", json.dumps(INPUTS).encode())
+        self.assertEqual(status, 200)
+        result = json.loads(body)
+        self.assertAlmostEqual(result["total_emissions"], 1195.53, places=2)
+        self.assertAlmostEqual(result["trees_needed"], result["total_emissions"] / 21.77)
+
+    async def test_invalid_requests(self):
+        status, _, body = await request(self.server.port, "POST", "/footprint", b"{not json")
+        self.assertEqual(status, 400)
+        status, _, body = await request(self.server.port, "POST", "/footprint",
+                                        json.dumps(dict(INPUTS, recycling=150)).encode())
+        self.assertEqual((status, json.loads(body)["error"]), (400, "Recycling percentage must be between 0 and 100."))
+        self.assertEqual((await request(self.server.port, "GET", "/nowhere"))[0], 404)
+        self.assertEqual((await request(self.server.port, "GET", "/footprint"))[0], 405)
+
+    async def test_batch_streams_results_and_saves(self):
+        lines = [dict(INPUTS, user_id="alice"), dict(INPUTS, efficiency=0), "not json",
+                 dict(INPUTS, travel=0), dict(INPUTS, user_id="alice", fuel=0)]
+        body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines).encode()
+        status, headers, data = await request(self.server.port, "POST", "/footprints/batch?save=1&user=bob", body,
+                                              chunked=True)
+        self.assertEqual((status, headers["transfer-encoding"]), (200, "chunked"))
+        output = [json.loads(line) for line in data.decode().splitlines()]
+        records = [item for item in output if "total_emissions" in item]
+        errors = [item["error"] for item in output if "error" in item]
+        self.assertEqual([record["user_id"] for record in records], ["alice", "bob", "alice"])
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(errors[0].startswith("row 2:"))
+        self.assertTrue(errors[1].startswith("row 3: Invalid JSON"))
+        self.assertEqual(output[-1], {"summary": {"written": 3, "rejected": 2}})
+
+        status, _, data = await request(self.server.port, "GET", "/users/alice/history?limit=1")
+        page = json.loads(data)
+        self.assertEqual(len(page["rows"]), 1)
+        status, _, data = await request(self.server.port, "GET", f"/users/alice/history?limit=1&after={page['next']}")
+        self.assertEqual(json.loads(data)["rows"][0]["fuel"], 0)
+        for limit in ("0", "-1", "1001", "x"):
+            status, _, data = await request(self.server.port, "GET", f"/users/alice/history?limit={limit}")
+            self.assertEqual(status, 400)
+        with mock.patch.object(database, "get_monthly_rollups", side_effect=RuntimeError("boom")), \
+                self.assertLogs(level="ERROR"):
+            status, headers, data = await request(self.server.port, "GET", "/users/alice/rollups",
+                                                  headers=("Connection: keep-alive",))
+        self.assertEqual((status, json.loads(data)["error"]), (500, "Internal error: boom"))
+        self.assertEqual(headers["connection"], "close")
+        status, _, data = await request(self.server.port, "GET", "/users/alice/rollups")
+        self.assertEqual(json.loads(data)[0]["row_count"], 2)
+
+    async def test_report_endpoints_return_pdfs(self):
+        status, headers, data = await request(self.server.port, "POST", "/report", json.dumps(INPUTS).encode())
+        self.assertEqual((status, headers["content-type"]), (200, "application/pdf"))
+        self.assertTrue(data.startswith(b"%PDF"))
+        self.assertEqual((await request(self.server.port, "GET", "/users/nobody/report"))[0], 404)
+
+if __name__ == "__main__":
+    unittest.main()
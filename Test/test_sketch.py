@@ -0,0 +1,59 @@
+# tests/test_sketch.py
+import random
+import unittest
+import database
+import sketch
+from helpers import DatabaseTestCase
+from config import SKETCH_RELATIVE_ACCURACY
+
+class TestBuckets(unittest.TestCase):
+    def test_buckets_are_ordered_and_accurate(self):
+        values = sorted([-5000.0, -2.0, 0.0, 0.5, 3.0, 10.0, 10.1, 2500.0, 1e7])
+        keys = [sketch.bucket(value) for value in values]
+        self.assertEqual(keys, sorted(keys))
+        for value in (3.0, 123.4, 98765.0, -42.0):
+            estimate = sketch.bucket_value(sketch.bucket(value))
+            self.assertLessEqual(abs(estimate - value), SKETCH_RELATIVE_ACCURACY * abs(value) + 1e-9)
+
+class TestRanking(DatabaseTestCase):
+    def sketch_rows(self):
+        return database.get_connection().execute(
+            "SELECT name, bucket, count FROM footprint_sketch WHERE count != 0 ORDER BY name, bucket").fetchall()
+
+    def test_ranks_follow_latest_totals(self):
+        rng = random.Random(7)
+        latest = {}
+        for user in range(200):
+            for _ in range(rng.randint(1, 3)):
+                latest[user] = rng.uniform(100, 20000)
+                database.save_footprints([(f"user{user}", 0, 0, 0, 0, 0, 0, 1, latest[user])])
+        database.save_to_db("user0", 0, 0, 0, 0, 0, 0, 1, 1e6)  # Now the largest
+        latest[0] = 1e6
+
+        values = sorted(latest.values())
+        for value in (500.0, 5000.0, 15000.0):
+            exact = sum(total < value for total in values) / len(values)
+            margin = sum(abs(total - value) <= 2 * SKETCH_RELATIVE_ACCURACY * value for total in values) / len(values)
+            self.assertAlmostEqual(database.get_percentile_rank(value), exact, delta=margin / 2 + 1e-9)
+        self.assertGreater(database.get_percentile_rank(1e6), 0.99)
+
+        median = database.get_sketch_quantile(0.5)
+        exact_median = values[(len(values) - 1) // 2]
+        self.assertLessEqual(abs(median - exact_median), SKETCH_RELATIVE_ACCURACY * exact_median + 1e-9)
+
+        # Incremental updates agree with a rebuild from history
+        incremental = self.sketch_rows()
+        self.assertEqual(database.rebuild_sketches(), 2 * len(latest))
+        self.assertEqual(self.sketch_rows(), incremental)
+
+    def test_annual_totals(self):
+        database.save_footprints([("alice", 0, 0, 0, 0, 0, 0, 1, 100.0), ("alice", 0, 0, 0, 0, 0, 0, 1, 300.0),
+                                  ("bob", 0, 0, 0, 0, 0, 0, 1, 350.0)])
+        year = database.get_annual_totals("alice")[0][0]
+        # Alice's year (400) beats Bob's (350), though her latest (300) does not
+        self.assertEqual(database.get_percentile_rank(400.0, sketch.annual(year)), 0.75)
+        self.assertEqual(database.get_percentile_rank(300.0), 0.25)
+        self.assertIsNone(database.get_percentile_rank(1.0, sketch.annual(1999)))
+
+if __name__ == "__main__":
+    unittest.main()
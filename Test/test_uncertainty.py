@@ -0,0 +1,42 @@
+# tests/test_uncertainty.py
+import unittest
+from calculations import calculate_footprint
+from uncertainty import FACTORS, sample, simulate_footprint
+
+INPUTS = (100, 50, 80, 20, 0.5, 100, 8)
+
+class TestUncertainty(unittest.TestCase):
+    def test_fixed_seed_is_reproducible(self):
+        first = simulate_footprint(*INPUTS, samples=1000, input_uncertainty=0.1, seed=7)
+        second = simulate_footprint(*INPUTS, samples=1000, input_uncertainty=0.1, seed=7)
+        self.assertEqual(first, second)
+
+    def test_fixed_factors_reproduce_the_point_estimate(self):
+        factors = {name: ("fixed", value) for name, value in
+                   zip(FACTORS, (0.0005, 0.0053, 2.32, 0.57, 2.31))}
+        summary = simulate_footprint(*INPUTS, samples=10, factors=factors)
+        expected = calculate_footprint(*INPUTS)
+        for component, value in expected.items():
+            for percentile in summary[component]["percentiles"].values():
+                self.assertAlmostEqual(percentile, value, places=6)
+
+    def test_percentiles_are_ordered_around_the_median(self):
+        summary = simulate_footprint(*INPUTS, samples=20000, percentiles=(5, 50, 95), seed=1)
+        low, median, high = summary["total_emissions"]["percentiles"].values()
+        self.assertLess(low, median)
+        self.assertLess(median, high)
+        self.assertEqual(summary["invalid_samples"], 0)
+
+    def test_non_positive_efficiency_samples_are_dropped(self):
+        summary = simulate_footprint(*INPUTS, samples=1000, inputs={"efficiency": ("uniform", -1, 9)}, seed=3)
+        self.assertGreater(summary["invalid_samples"], 0)
+        self.assertLess(summary["invalid_samples"], 1000)
+
+    def test_invalid_specs(self):
+        with self.assertRaises(ValueError):
+            simulate_footprint(*INPUTS, factors={"co2_per_tree": 1.0})
+        with self.assertRaises(ValueError):
+            sample(None, ("poisson", 3), 10)
+
+if __name__ == "__main__":
+    unittest.main()